@@ -1,4 +1,4 @@
-import { useState, useMemo, useEffect } from "react";
+import { useState, useMemo, useEffect, useRef } from "react";
 import TranslationOptions from "./components/TranslationOptions";
 import TargetContext from "./components/TargetContext";
 import Continue from "./components/Continue";
@@ -23,35 +23,95 @@ type TranslationData = {
   numEvals: number;
 };
 
+type TargetData = {
+  target: TargetContextData;
+  translations: TranslationData[];
+};
+
 type EvaluationData = {
   translationId: number;
   rank: number;
   discarded: boolean;
 };
 
+const API_URL = "http://127.0.0.1:5000";
+
+// Targets kept ready behind the one on screen
+const PREFETCH_SIZE = 3;
+
+// Stable per-browser id, so the API can keep a target reserved for this evaluator
+const getEvaluatorId = (): string => {
+  let id = localStorage.getItem("evaluatorId");
+  if (!id) {
+    id = crypto.randomUUID();
+    localStorage.setItem("evaluatorId", id);
+  }
+  return id;
+};
+
 function App() {
   const [targetContextData, setTargetContextData] =
     useState<TargetContextData | null>(null);
   const [translations, setTranslations] = useState<TranslationData[]>([]);
   const [optionStates, setOptionStates] = useState<OptionState[]>([]);
 
-  const fetchData = async () => {
+  // Prefetched targets, the next one is shown as soon as an evaluation is submitted
+  const queueRef = useRef<TargetData[]>([]);
+  const currentIdRef = useRef<number | null>(null);
+  // Targets whose evaluation is still being submitted, they are leased to us until then
+  const submittingRef = useRef<Set<number>>(new Set());
+  const fetchingRef = useRef(false);
+
+  const showNext = () => {
+    const next = queueRef.current.shift() ?? null;
+    currentIdRef.current = next ? next.target.id : null;
+    setTargetContextData(next ? next.target : null);
+    setTranslations(next ? next.translations : []);
+    setOptionStates(
+      next ? next.translations.map(() => ({ rank: 0, discarded: false })) : []
+    );
+    refillQueue();
+  };
+
+  const refillQueue = async () => {
+    const missing = PREFETCH_SIZE - queueRef.current.length;
+    if (fetchingRef.current || missing <= 0) {
+      return;
+    }
+    fetchingRef.current = true;
+
     try {
-      const response = await fetch("http://127.0.0.1:5000/get_target");
+      // The API returns the targets leased to us first, so ask for those plus the missing ones
+      const held = new Set<number>(submittingRef.current);
+      queueRef.current.forEach((item) => held.add(item.target.id));
+      if (currentIdRef.current !== null) {
+        held.add(currentIdRef.current);
+      }
+
+      const response = await fetch(
+        `${API_URL}/get_targets?n=${held.size + missing}&evaluator=${getEvaluatorId()}`
+      );
       const data = await response.json();
       console.log(data);
-      setTargetContextData(data.target);
-      setTranslations(data.translations);
-      setOptionStates(
-        data.translations.map(() => ({ rank: 0, discarded: false }))
-      );
+      for (const item of data.targets as TargetData[]) {
+        if (!held.has(item.target.id)) {
+          held.add(item.target.id);
+          queueRef.current.push(item);
+        }
+      }
     } catch (error) {
       console.error("Failed to fetch data:", error);
+    } finally {
+      fetchingRef.current = false;
+    }
+
+    if (currentIdRef.current === null && queueRef.current.length > 0) {
+      showNext();
     }
   };
 
   useEffect(() => {
-    fetchData();
+    refillQueue();
   }, []);
 
   const isComplete = useMemo(() => {
@@ -74,8 +134,13 @@ function App() {
 
       console.log(response)
 
+      // Show the next target right away, the submission goes on in the background
+      const targetId = translations[0].targetId;
+      submittingRef.current.add(targetId);
+      showNext();
+
       try {
-        const res = await fetch("http://127.0.0.1:5000/submit_evaluation", {
+        const res = await fetch(`${API_URL}/submit_evaluation?evaluator=${getEvaluatorId()}`, {
           method: "POST",
           headers: {
             "Content-Type": "application/json",
@@ -86,13 +151,14 @@ function App() {
         if (res.ok) {
           const result = await res.json();
           console.log(result.message);
-          fetchData();
         } else {
           const error = await res.json();
           console.error("Error:", error.error);
         }
       } catch (err) {
         console.error("Network error:", err);
+      } finally {
+        submittingRef.current.delete(targetId);
       }
     } else {
       console.log("NOT COMPLETE");
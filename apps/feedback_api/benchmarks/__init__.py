@@ -0,0 +1,3 @@
+from benchmarks.generator import SyntheticCorpus
+
+__all__ = ['SyntheticCorpus']
@@ -0,0 +1,344 @@
+import argparse
+import contextlib
+import copy
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+from typing import Iterable, Optional
+from benchmarks.generator import SyntheticCorpus
+from util import DBManager
+from util.base.manager_base import ROWS_WRITTEN
+
+# Database file in the data folder, never the configured one
+AUDIT_DB = "audit.db"
+
+# Transaction control, connection setup and DDL, not part of any query
+_SKIPPED = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE", "PRAGMA", "ANALYZE", "CREATE", "DROP")
+
+# Assignment settings the workload runs under, every SQL path of QueryMixin is taken once
+_ASSIGNMENT_VARIANTS = (
+    {"backend": "sql", "priority": "evals", "lease_ttl": 0},
+    {"backend": "sql", "priority": "evals", "lease_ttl": 300},
+    {"backend": "sql", "priority": "ranked", "lease_ttl": 0},
+    {"backend": "sql", "priority": "ranked", "lease_ttl": 300},
+    {"backend": "index", "priority": "evals", "lease_ttl": 300},
+)
+
+
+def normalize(sql: str) -> str:
+    return " ".join(sql.split())
+
+
+class StatementLog:
+    """
+    Distinct statements run through pooled cursors, with the parameters of
+    their first execution and the phases ("request", "bulk") they ran in;
+    nothing is recorded while `phase` is None. Install with
+    `db._pool.connection_factory = log.connection_factory()` before the
+    DBManager opens a connection.
+    """
+
+    def __init__(self):
+        self.phase: Optional[str] = None
+        self.statements: dict[str, tuple] = {}
+        self.phases: dict[str, set[str]] = {}
+
+    def record(self, sql: str, parameters) -> None:
+        sql = normalize(sql)
+        if self.phase is not None and not sql.upper().startswith(_SKIPPED):
+            self.statements.setdefault(sql, parameters)
+            self.phases.setdefault(sql, set()).add(self.phase)
+
+    def connection_factory(self) -> type[sqlite3.Connection]:
+        log = self
+
+        class RecordingCursor(sqlite3.Cursor):
+            def execute(self, sql, parameters=()):
+                log.record(sql, parameters)
+                return super().execute(sql, parameters)
+
+            def executemany(self, sql, seq_of_parameters):
+                rows = list(seq_of_parameters)
+                if rows:
+                    log.record(sql, rows[0])
+                return super().executemany(sql, rows)
+
+        class RecordingConnection(sqlite3.Connection):
+            def cursor(self, factory=RecordingCursor):
+                return super().cursor(factory)
+
+        return RecordingConnection
+
+
+def explain(conn: sqlite3.Connection, sql: str, parameters=()) -> list[str]:
+    """EXPLAIN QUERY PLAN details, indented by depth."""
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node] + detail)
+    return lines
+
+
+def findings(plan: Iterable[str]) -> list[str]:
+    """
+    Plan steps worth a look: full table scans and temporary B-trees.
+
+    Scans of json_each (a virtual table holding the bound ids), of constant
+    rows and ordered index scans, which stop at a LIMIT, are not reported.
+    """
+    problems = []
+    for line in plan:
+        detail = line.strip()
+        if detail.startswith("SCAN ") and not any(
+            expected in detail for expected in ("VIRTUAL TABLE", " INDEX ", "CONSTANT ROW")
+        ):
+            problems.append(detail)
+        elif "TEMP B-TREE" in detail:
+            problems.append(detail)
+    return problems
+
+
+def trigger_statements(conn: sqlite3.Connection) -> dict[str, tuple[str, tuple]]:
+    """
+    Trigger name -> (body statement, NULL parameters for its NEW./OLD.
+    references). Triggers with a WHEN clause or several statements get one
+    entry per statement, "name #1", "name #2", ..., the WHEN clause first.
+    """
+    statements = {}
+    for name, sql in conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'"):
+        parts = []
+        when = re.search(r"\bWHEN\b(.*?)\bBEGIN\b", sql, re.S | re.I)
+        if when:
+            parts.append("SELECT " + when.group(1).strip())
+        body = re.search(r"\bBEGIN\b(.*)\bEND\b", sql, re.S | re.I).group(1)
+        parts += [statement.strip() for statement in body.split(";") if statement.strip()]
+        for i, statement in enumerate(parts, start=1):
+            statement, references = re.subn(r"\b(?:NEW|OLD)\.\w+", "?", statement)
+            key = name if len(parts) == 1 else f"{name} #{i}"
+            statements[key] = (normalize(statement), (None,) * references)
+    return statements
+
+
+def audit_plans(db_path: str, log: StatementLog) -> dict:
+    """
+    Explain every recorded statement and trigger body, list indexes no plan
+    uses. Triggers fire on the request path, whole-table reads of bulk
+    statements are by design.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        report = {"statements": [], "triggers": [], "unused_indexes": []}
+        used = set()
+
+        def audited(sql: str, parameters, phases: set[str]) -> dict:
+            plan = explain(conn, sql, parameters)
+            used.update(re.findall(r"USING (?:COVERING )?INDEX (\w+)", "\n".join(plan)))
+            return {"sql": sql, "phases": sorted(phases), "plan": plan, "findings": findings(plan)}
+
+        for sql, parameters in log.statements.items():
+            report["statements"].append(audited(sql, parameters, log.phases[sql]))
+        for name, (sql, parameters) in trigger_statements(conn).items():
+            report["triggers"].append({"trigger": name, **audited(sql, parameters, {"request"})})
+
+        # Unique indexes enforce constraints and are kept whether or not a plan reads them
+        for name, unique in conn.execute(
+            """
+            SELECT name, sql LIKE 'CREATE UNIQUE%'
+            FROM sqlite_master
+            WHERE type = 'index' AND sql IS NOT NULL
+            ORDER BY name
+            """
+        ):
+            if name not in used and not unique:
+                report["unused_indexes"].append(name)
+        return report
+    finally:
+        conn.close()
+
+
+def wal_frames(db: DBManager) -> int:
+    path = db.db_path + "-wal"
+    if not os.path.exists(path):
+        return 0
+    with db.read_only() as cursor:
+        page_size = cursor.execute("PRAGMA page_size").fetchone()[0]
+    # 32-byte WAL header, then a 24-byte header per page frame
+    return max(0, os.path.getsize(path) - 32) // (page_size + 24)
+
+
+def measure_write_amplification(db: DBManager, corpus: SyntheticCorpus, count: int) -> dict:
+    """
+    Rows and pages written per add_evaluation(), each in its own transaction.
+
+    The WAL is emptied first and not checkpointed during the run, so its
+    frames are exactly the pages the evaluations wrote: one per B-tree page
+    (table or index) an evaluation touched.
+    """
+    with contextlib.closing(sqlite3.connect(db.db_path)) as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    with db.pragmas(wal_autocheckpoint=0):
+        frames = wal_frames(db)
+        rows = ROWS_WRITTEN.value()
+        for rankings in corpus.iter_evaluations(count, stream="audit"):
+            if not db.add_evaluation(rankings):
+                raise RuntimeError("Audit evaluation rejected")
+        frames = wal_frames(db) - frames
+        rows = ROWS_WRITTEN.value() - rows
+
+    return {
+        "evaluations": count,
+        "rows_per_evaluation": rows / count,
+        "pages_per_evaluation": frames / count,
+    }
+
+
+def run_workload(db: DBManager, corpus: SyntheticCorpus, batch_size: int, log: StatementLog) -> None:
+    """
+    Call every QueryMixin method, under every assignment setting that
+    changes its SQL, then export, stats and maintenance, so an index is
+    only reported unused when no statement of DBManager reads it.
+
+    Serving targets and single submissions are the "request" phase, the
+    rest (loading, index builds, export, leaderboard, repair) is "bulk".
+    """
+    targets = list(corpus.iter_targets())
+    for start in range(0, len(targets), batch_size):
+        db.add_targets(targets[start:start + batch_size])
+    translations = list(corpus.iter_translations())
+    for start in range(0, len(translations), batch_size):
+        db.add_translations(translations[start:start + batch_size])
+    evaluations = list(corpus.iter_evaluations())
+    for start in range(0, len(evaluations), batch_size):
+        db.add_evaluations(evaluations[start:start + batch_size])
+
+    # Statistics for the planner, as PRAGMA optimize keeps them in production
+    with db.transaction() as cursor:
+        cursor.execute("ANALYZE")
+
+    config = db.config
+    submissions = corpus.iter_evaluations(stream="submissions")
+    try:
+        for assignment in _ASSIGNMENT_VARIANTS:
+            db.config = copy.deepcopy(config)
+            db.config["assignment"].update(assignment)
+            db.invalidate_assignment_index()
+            db.invalidate_payload_cache()
+            if db.assignment_backend == "index":
+                db.build_assignment_index()
+            db.load_seen_targets()
+
+            log.phase = "request"
+            for evaluator in (None, "audit", "audit"):
+                db.get_target_with_translations(evaluator)
+                db.get_targets_with_translations(3, evaluator)
+                db.invalidate_payload_cache()
+                db.get_target_responses(3, evaluator)
+            db.get_cached_target(1)
+            db.add_evaluation(next(submissions))
+            db.add_evaluations([next(submissions), next(submissions)], "audit")
+            log.phase = "bulk"
+    finally:
+        db.config = config
+        log.phase = "bulk"
+
+    for _ in db.export_rankings("jsonl", 0, db.get_export_watermark()):
+        pass
+    db.get_model_stats()
+    db.rebuild_model_stats()
+    db.recount_num_evals()
+    db.checkpoint_seen_targets()
+
+
+def request_findings(report: dict) -> list[dict]:
+    return [
+        entry
+        for entry in report["statements"] + report["triggers"]
+        if entry["findings"] and "request" in entry["phases"]
+    ]
+
+
+def print_report(report: dict, out=sys.stdout) -> None:
+    for entry in report["statements"] + report["triggers"]:
+        title = f"trigger {entry['trigger']}: " if "trigger" in entry else ""
+        mark = "ok" if not entry["findings"] else "!!" if "request" in entry["phases"] else "--"
+        print(f"{mark} [{','.join(entry['phases'])}] {title}{entry['sql'][:160]}", file=out)
+        for line in entry["plan"]:
+            print(f"     {line}", file=out)
+    print(file=out)
+    print(
+        f"{len(request_findings(report))} request path statements scan a table or build a temp B-tree "
+        "(marked !!, bulk ones --)",
+        file=out,
+    )
+    print(f"Unused indexes: {', '.join(report['unused_indexes']) or 'none'}", file=out)
+    amplification = report["write_amplification"]
+    print(
+        f"Per evaluation: {amplification['rows_per_evaluation']:.1f} rows, "
+        f"{amplification['pages_per_evaluation']:.1f} pages written "
+        f"(average of {amplification['evaluations']})",
+        file=out,
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Explain the query plans of DBManager's statements on a synthetic corpus"
+    )
+    parser.add_argument("--targets", type=int, default=20_000)
+    parser.add_argument("--evaluations", type=int, default=50_000)
+    parser.add_argument("--translations-per-target", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=1_000, help="Rows per add_* call")
+    parser.add_argument("--samples", type=int, default=1_000, help="Evaluations for the write amplification")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument(
+        "--strict", action="store_true", help="Exit with status 1 on request path findings or unused indexes"
+    )
+    parser.add_argument("--keep", action="store_true", help="Keep the audit database")
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    args = build_parser().parse_args(argv)
+    corpus = SyntheticCorpus(
+        targets=args.targets,
+        translations_per_target=args.translations_per_target,
+        evaluations=args.evaluations,
+        seed=args.seed,
+    )
+    logging.basicConfig(level=logging.WARNING)
+
+    log = StatementLog()
+    db = DBManager(AUDIT_DB)
+    db._pool.connection_factory = log.connection_factory()
+    try:
+        if not db.initialize_schema():
+            raise SystemExit("Could not initialize the audit database")
+        log.phase = "bulk"
+        run_workload(db, corpus, args.batch_size, log)
+        report = audit_plans(db.db_path, log)
+        report["workload"] = corpus.params
+        report["write_amplification"] = measure_write_amplification(db, corpus, args.samples)
+    finally:
+        db.close()
+        if not args.keep:
+            for suffix in ("", "-wal", "-shm"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(db.db_path + suffix)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    if args.strict and (report["unused_indexes"] or request_findings(report)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
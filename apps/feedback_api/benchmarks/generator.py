@@ -0,0 +1,145 @@
+import math
+import random
+from typing import Iterator, Optional
+
+VOCABULARY = (
+    "the", "a", "house", "river", "old", "light", "morning", "voice", "letter",
+    "road", "window", "quiet", "city", "night", "friend", "stone", "winter",
+    "garden", "music", "train", "was", "is", "had", "saw", "said", "took",
+    "found", "left", "turned", "waited", "slowly", "again", "never", "there",
+    "under", "across", "before", "with", "without", "her", "his", "their",
+)
+
+
+class SyntheticCorpus:
+    """
+    Deterministic synthetic corpus for benchmarks.
+
+    The same parameters and seed always give the same targets, translations
+    and evaluation history. Everything is generated lazily, so corpora with
+    millions of rows never sit in memory.
+
+    Translation ids are those an empty database assigns when the targets and
+    then the translations are added in generation order: target i (from 1)
+    owns ids (i - 1) * translations_per_target + 1 ... i * translations_per_target.
+
+    Usage:
+        corpus = SyntheticCorpus(targets=100_000, evaluations=1_000_000)
+        db.add_targets(list(corpus.iter_targets()))
+    """
+
+    def __init__(
+        self,
+        targets: int = 1_000,
+        translations_per_target: int = 4,
+        models: int = 5,
+        evaluations: int = 10_000,
+        discard_rate: float = 0.1,
+        skill: float = 0.0,
+        seed: int = 0,
+    ):
+        self.targets = targets
+        self.translations_per_target = translations_per_target
+        self.models = models
+        self.evaluations = evaluations
+        self.discard_rate = discard_rate
+        self.skill = skill
+        self.seed = seed
+
+    @property
+    def params(self) -> dict:
+        return {
+            "targets": self.targets,
+            "translations_per_target": self.translations_per_target,
+            "models": self.models,
+            "evaluations": self.evaluations,
+            "discard_rate": self.discard_rate,
+            "skill": self.skill,
+            "seed": self.seed,
+        }
+
+    @property
+    def model_names(self) -> list[str]:
+        return [f"model-{i:02d}" for i in range(self.models)]
+
+    def translation_ids(self, target_id: int) -> range:
+        first = (target_id - 1) * self.translations_per_target + 1
+        return range(first, first + self.translations_per_target)
+
+    def model_of(self, translation_id: int) -> str:
+        target_id, k = divmod(translation_id - 1, self.translations_per_target)
+        return self.model_names[(target_id + 1 + k) % self.models]
+
+    def quality(self, translation_id: int) -> float:
+        """
+        Latent quality of a translation: `skill` per model step (model-00
+        best) plus standard normal noise of its own, so some targets have a
+        clear order and others are close calls.
+        """
+        model = int(self.model_of(translation_id).rsplit("-", 1)[1])
+        noise = self._random(f"quality:{translation_id}").gauss(0.0, 1.0)
+        return self.skill * (self.models - 1 - model) + noise
+
+    def iter_targets(self) -> Iterator[dict]:
+        rnd = self._random("targets")
+        for _ in range(self.targets):
+            yield {
+                "context1": self._sentence(rnd, 8, 30),
+                "target": self._sentence(rnd, 4, 20),
+                "context2": self._sentence(rnd, 8, 30),
+            }
+
+    def iter_translations(self) -> Iterator[dict]:
+        rnd = self._random("translations")
+        names = self.model_names
+        for target_id in range(1, self.targets + 1):
+            # Models rotate over targets, so every model gets the same share
+            for k in range(self.translations_per_target):
+                yield {
+                    "targetId": target_id,
+                    "translation": self._sentence(rnd, 4, 20),
+                    "model": names[(target_id + k) % self.models],
+                }
+
+    def iter_evaluations(
+        self, count: Optional[int] = None, stream: str = "history"
+    ) -> Iterator[list[dict]]:
+        """
+        Rankings lists as accepted by add_evaluation(), for uniformly drawn
+        targets. Translations are ranked in random order, or with `skill` > 0
+        by a Plackett-Luce draw over their quality(); each one is discarded
+        (rank 0) with probability `discard_rate`. Different streams give
+        independent sequences.
+        """
+        rnd = self._random(f"evaluations:{stream}")
+        for _ in range(self.evaluations if count is None else count):
+            target_id = rnd.randint(1, self.targets)
+            ids = list(self.translation_ids(target_id))
+            if self.skill > 0:
+                # Gumbel-max trick: sorting by quality + Gumbel noise draws a Plackett-Luce ranking
+                keys = {t: self.quality(t) - math.log(-math.log(1.0 - rnd.random())) for t in ids}
+                ids.sort(key=keys.__getitem__, reverse=True)
+            else:
+                rnd.shuffle(ids)
+            rankings = []
+            rank = 0
+            for translation_id in ids:
+                discarded = rnd.random() < self.discard_rate
+                if not discarded:
+                    rank += 1
+                rankings.append(
+                    {
+                        "translationId": translation_id,
+                        "rank": 0 if discarded else rank,
+                        "discarded": discarded,
+                    }
+                )
+            yield rankings
+
+    def _random(self, stream: str) -> random.Random:
+        return random.Random(f"{self.seed}:{stream}")
+
+    @staticmethod
+    def _sentence(rnd: random.Random, low: int, high: int) -> str:
+        words = rnd.choices(VOCABULARY, k=rnd.randint(low, high))
+        return " ".join(words).capitalize() + "."
@@ -0,0 +1,229 @@
+import argparse
+import contextlib
+import itertools
+import json
+import logging
+import math
+import os
+import platform
+import sqlite3
+import sys
+import time
+from typing import Callable, Iterable, Iterator, Optional
+from benchmarks.generator import SyntheticCorpus
+from util import DBManager
+
+# Database file in the data folder, never the configured one
+BENCHMARK_DB = "benchmark.db"
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Scale presets, --targets / --evaluations override them
+SCALES = {
+    "small": {"targets": 2_000, "evaluations": 20_000},
+    "medium": {"targets": 100_000, "evaluations": 500_000},
+    "large": {"targets": 1_000_000, "evaluations": 5_000_000},
+}
+
+
+def chunked(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    return values[max(0, math.ceil(p * len(values)) - 1)]
+
+
+def summarize(latencies: list[float], rows: int) -> dict:
+    latencies = sorted(latencies)
+    seconds = sum(latencies)
+    return {
+        "ops": len(latencies),
+        "rows": rows,
+        "seconds": seconds,
+        "ops_per_second": len(latencies) / seconds if seconds else 0.0,
+        "rows_per_second": rows / seconds if seconds else 0.0,
+        "mean_ms": seconds / len(latencies) * 1000,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def timed(operation: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    result = operation()
+    elapsed = time.perf_counter() - start
+    if result is False or result is None:
+        raise RuntimeError(f"Benchmarked operation failed: {operation}")
+    return elapsed
+
+
+def run_benchmarks(db: DBManager, corpus: SyntheticCorpus, batch_size: int, samples: int) -> dict:
+    """
+    Time the DBManager hot paths on the corpus, in an order where every case
+    starts from the state the previous one left: schema init, bulk adds,
+    evaluation history, target assignment, single submissions, export.
+    """
+    results = {}
+
+    latencies = [timed(db.initialize_schema) for _ in range(20)]
+    results["initialize_schema"] = summarize(latencies, 0)
+
+    latencies = [
+        timed(lambda: db.add_targets(chunk)) for chunk in chunked(corpus.iter_targets(), batch_size)
+    ]
+    results["add_targets"] = summarize(latencies, corpus.targets)
+
+    latencies = [
+        timed(lambda: db.add_translations(chunk))
+        for chunk in chunked(corpus.iter_translations(), batch_size)
+    ]
+    results["add_translations"] = summarize(
+        latencies, corpus.targets * corpus.translations_per_target
+    )
+
+    latencies = []
+    for chunk in chunked(corpus.iter_evaluations(), batch_size):
+        start = time.perf_counter()
+        outcomes = db.add_evaluations(chunk)
+        latencies.append(time.perf_counter() - start)
+        failed = [r["error"] for r in outcomes if not r["success"]]
+        if failed:
+            raise RuntimeError(f"Benchmark evaluations rejected: {failed[:3]}")
+    results["add_evaluations"] = summarize(latencies, corpus.evaluations)
+
+    latencies = [
+        timed(lambda: db.get_target_with_translations(f"benchmark-{i}")) for i in range(samples)
+    ]
+    results["get_target_with_translations"] = summarize(latencies, samples)
+
+    latencies = [
+        timed(lambda: db.add_evaluation(rankings))
+        for rankings in corpus.iter_evaluations(samples, stream="submissions")
+    ]
+    results["add_evaluation"] = summarize(latencies, samples)
+
+    until = db.get_export_watermark()
+    lines = 0
+
+    def export() -> bool:
+        nonlocal lines
+        for chunk in db.export_rankings("jsonl", 0, until):
+            lines += chunk.count("\n")
+        return True
+
+    results["export_rankings"] = summarize([timed(export)], lines)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> list[str]:
+    """
+    Describe every case whose median latency exceeds the baseline by more
+    than `tolerance` (relative) and `min_delta_ms` (absolute, keeps sub-ms
+    cases from tripping on timer noise).
+    """
+    if results["workload"] != baseline["workload"]:
+        raise ValueError(
+            f"Baseline was recorded on another workload: {baseline['workload']} != {results['workload']}"
+        )
+    regressions = []
+    for name, current in results["cases"].items():
+        previous = baseline["cases"].get(name)
+        if previous is None:
+            continue
+        limit = max(previous["p50_ms"] * (1 + tolerance), previous["p50_ms"] + min_delta_ms)
+        if current["p50_ms"] > limit:
+            regressions.append(
+                f"{name}: p50 {current['p50_ms']:.3f} ms > {previous['p50_ms']:.3f} ms "
+                f"(+{current['p50_ms'] / previous['p50_ms'] - 1:.0%})"
+            )
+    return regressions
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark DBManager hot paths on a synthetic corpus")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--targets", type=int, help="Overrides the scale preset")
+    parser.add_argument("--evaluations", type=int, help="Overrides the scale preset")
+    parser.add_argument("--translations-per-target", type=int, default=4)
+    parser.add_argument("--models", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=1_000, help="Rows per add_* call")
+    parser.add_argument("--samples", type=int, default=1_000, help="Calls of the single-item cases")
+    parser.add_argument("-o", "--output", help="Write the results here instead of stdout")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p50 slowdown, 0.25 = 25%%")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="Ignore smaller p50 slowdowns")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the baseline")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark database")
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    args = build_parser().parse_args(argv)
+    scale = SCALES[args.scale]
+    corpus = SyntheticCorpus(
+        targets=args.targets or scale["targets"],
+        translations_per_target=args.translations_per_target,
+        models=args.models,
+        evaluations=args.evaluations or scale["evaluations"],
+        seed=args.seed,
+    )
+
+    # Measured with the hot path silenced, as in production
+    logging.basicConfig(level=logging.WARNING)
+
+    db = DBManager(BENCHMARK_DB)
+    try:
+        cases = run_benchmarks(db, corpus, args.batch_size, args.samples)
+    finally:
+        db.close()
+        if not args.keep:
+            for suffix in ("", "-wal", "-shm"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(db.db_path + suffix)
+
+    results = {
+        "workload": {**corpus.params, "batch_size": args.batch_size, "samples": args.samples},
+        "environment": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+        },
+        "cases": cases,
+    }
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            f.write(text + "\n")
+        print(f"Baseline saved to {args.baseline}", file=sys.stderr)
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, nothing to compare", file=sys.stderr)
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    try:
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    if regressions:
+        print("Regressions against the baseline:", file=sys.stderr)
+        for regression in regressions:
+            print(f"  {regression}", file=sys.stderr)
+        raise SystemExit(1)
+    print(f"No regressions against {args.baseline}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
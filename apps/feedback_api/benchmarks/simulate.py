@@ -0,0 +1,224 @@
+import argparse
+import json
+import logging
+import time
+from collections import Counter, deque
+from typing import Optional
+from benchmarks.generator import SyntheticCorpus
+from util import DBManager
+from util.manager_mixins.stats import bradley_terry, pairwise_wins
+from util.samplers import SAMPLERS, make_sampler, preference_probability
+
+
+class History:
+    """
+    Past evaluations to replay: the translations (id -> model) of every
+    target and its evaluations in submission order, each as
+    (translationId, rank, discarded) rows.
+    """
+
+    def __init__(self):
+        self.translations: dict[int, dict[int, str]] = {}
+        self.evaluations: dict[int, list[list[tuple[int, int, bool]]]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(evaluations) for evaluations in self.evaluations.values())
+
+    @classmethod
+    def from_database(cls, db: DBManager) -> "History":
+        history = cls()
+        with db.read_only() as cursor:
+            cursor.execute("SELECT id, targetId, model FROM Translations")
+            for translation_id, target_id, model in cursor:
+                history.translations.setdefault(target_id, {})[translation_id] = model
+            for target_id, rankings in db._iter_past_rankings(cursor):
+                history.evaluations.setdefault(target_id, []).append(rankings)
+        return history
+
+    @classmethod
+    def from_corpus(cls, corpus: SyntheticCorpus) -> "History":
+        history = cls()
+        for target_id in range(1, corpus.targets + 1):
+            history.translations[target_id] = {
+                translation_id: corpus.model_of(translation_id)
+                for translation_id in corpus.translation_ids(target_id)
+            }
+        for rankings in corpus.iter_evaluations():
+            target_id, _ = divmod(rankings[0]["translationId"] - 1, corpus.translations_per_target)
+            history.evaluations.setdefault(target_id + 1, []).append(
+                [(r["translationId"], r["rank"], r["discarded"]) for r in rankings]
+            )
+        return history
+
+    def wins(self) -> Counter:
+        """Pairwise model wins over the whole history."""
+        wins: Counter = Counter()
+        for target_id, evaluations in self.evaluations.items():
+            models = self.translations[target_id]
+            for rankings in evaluations:
+                wins.update(pairwise_wins((models[t], rank, discarded) for t, rank, discarded in rankings))
+        return wins
+
+
+def leaderboard_order(wins: Counter) -> list[str]:
+    """Models by Bradley-Terry strength, best first."""
+    models = sorted({model for pair in wins for model in pair})
+    strengths = bradley_terry(models, [(w, l, count) for (w, l), count in wins.items()])
+    return sorted(models, key=strengths.get, reverse=True)
+
+
+def leaderboard_confidence(wins: Counter, order: list[str]) -> float:
+    """
+    Confidence in a leaderboard order: the lowest posterior probability,
+    over neighbouring models, that the higher one is really preferred, from
+    the rankings that compared the two directly. 0 for fewer than two models.
+    """
+    return min(
+        (
+            preference_probability(1 + wins[(better, worse)], 1 + wins[(worse, better)])
+            for better, worse in zip(order, order[1:])
+        ),
+        default=0.0,
+    )
+
+
+def simulate(
+    history: History,
+    strategy: str,
+    confidence: float,
+    reference: list[str],
+    check_every: int,
+    seed: int = 0,
+) -> dict:
+    """
+    Replay `history` in the order a sampler asks for it: each pick consumes
+    the next past evaluation of the chosen target, targets leave the queue
+    once their history is used up. Stops when the leaderboard has the
+    `reference` order (that of the whole history) with `confidence`, or
+    the history is exhausted.
+    """
+    sampler = make_sampler(strategy, seed)
+    remaining = {target_id: deque(evaluations) for target_id, evaluations in history.evaluations.items()}
+    counts: Counter = Counter()
+    for target_id, translations in history.translations.items():
+        if remaining.get(target_id):
+            sampler.set_translations(target_id, list(translations))
+            sampler.push(target_id, 0)
+
+    wins: Counter = Counter()
+    annotations = 0
+    reached = None
+    current = 0.0
+    pick_seconds = 0.0
+    while reached is None:
+        start = time.perf_counter()
+        target_id = sampler.peek()
+        if target_id is None:
+            break
+        sampler.remove(target_id)
+        pick_seconds += time.perf_counter() - start
+
+        rankings = remaining[target_id].popleft()
+        sampler.observe(target_id, rankings)
+        models = history.translations[target_id]
+        wins.update(pairwise_wins((models[t], rank, discarded) for t, rank, discarded in rankings))
+        annotations += 1
+        counts[target_id] += 1
+        if remaining[target_id]:
+            sampler.push(target_id, counts[target_id])
+
+        if annotations % check_every == 0 or not remaining[target_id] and sampler.peek() is None:
+            order = leaderboard_order(wins)
+            current = leaderboard_confidence(wins, order)
+            if order == reference and current >= confidence:
+                reached = annotations
+
+    return {
+        "strategy": strategy,
+        "annotations": reached,
+        "replayed": annotations,
+        "confidence": current,
+        "targets": len(counts),
+        "pick_us": pick_seconds / annotations * 1e6 if annotations else 0.0,
+    }
+
+
+def print_report(report: dict) -> None:
+    print(
+        f"Replayed {report['history']} evaluations of {report['targets']} targets, "
+        f"target confidence {report['target']:.3f}"
+    )
+    print(
+        f"Leaderboard of the whole history: {' > '.join(report['leaderboard'])}, "
+        f"confidence {report['confidence']:.4f}"
+    )
+    print(f"{'strategy':<12} {'annotations':>11} {'confidence':>10} {'targets':>8} {'pick us':>8}")
+    for result in report["results"]:
+        annotations = result["annotations"] if result["annotations"] is not None else "not reached"
+        print(
+            f"{result['strategy']:<12} {annotations:>11} {result['confidence']:>10.4f} "
+            f"{result['targets']:>8} {result['pick_us']:>8.2f}"
+        )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Replay past rankings to compare how many annotations each sampler needs"
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--db", help="Database in the data folder to replay, defaults to the configured one")
+    source.add_argument("--synthetic", action="store_true", help="Replay a synthetic corpus instead")
+    parser.add_argument("--targets", type=int, default=2_000, help="Synthetic corpus size")
+    parser.add_argument("--evaluations", type=int, default=40_000, help="Synthetic evaluation history")
+    parser.add_argument("--models", type=int, default=5)
+    parser.add_argument("--skill", type=float, default=0.3, help="Synthetic quality gap between models")
+    parser.add_argument("--strategies", nargs="+", choices=sorted(SAMPLERS), default=list(SAMPLERS))
+    parser.add_argument("--confidence", type=float, default=0.95, help="Leaderboard confidence to reach")
+    parser.add_argument("--check-every", type=int, default=50, help="Annotations between confidence checks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.synthetic:
+        history = History.from_corpus(
+            SyntheticCorpus(
+                targets=args.targets,
+                models=args.models,
+                evaluations=args.evaluations,
+                skill=args.skill,
+                seed=args.seed,
+            )
+        )
+    else:
+        db = DBManager(args.db)
+        try:
+            history = History.from_database(db)
+        finally:
+            db.close()
+
+    wins = history.wins()
+    reference = leaderboard_order(wins)
+    report = {
+        "history": len(history),
+        "targets": len(history.evaluations),
+        "target": args.confidence,
+        "leaderboard": reference,
+        "confidence": leaderboard_confidence(wins, reference),
+        "results": [
+            simulate(history, strategy, args.confidence, reference, args.check_every, args.seed)
+            for strategy in args.strategies
+        ],
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
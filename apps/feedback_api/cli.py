@@ -0,0 +1,239 @@
+import argparse
+import json
+import sys
+from typing import Optional
+from util import DBManager, DataLoader, ShardRouter
+from util.config import configure_logging
+from util.migrations import latest_version, pending
+from util.router import DEFAULT_SHARD, UnknownShardError
+
+
+# --project value for commands that cover every shard
+ALL_PROJECTS = "*"
+
+
+def import_data(args: argparse.Namespace) -> None:
+    loader = DataLoader(
+        ShardRouter().get(args.project, create=True),
+        batch_size=args.batch_size,
+        rebuild_indexes=args.rebuild_indexes,
+    )
+    stats = loader.load(args.path, args.format)
+    print(
+        f"Imported {stats['targets']} targets and {stats['translations']} translations "
+        f"({stats['skipped']} skipped) in {stats['seconds']:.2f}s, "
+        f"{stats['rows_per_second']:.0f} rows/s"
+    )
+
+
+def export_data(args: argparse.Namespace) -> None:
+    if args.project == ALL_PROJECTS:
+        export_all(args)
+        return
+
+    db = shard(args.project)
+    if args.snapshot:
+        db = snapshot_of(db, args.snapshot)
+    since = int(args.since or 0)
+    until = db.get_export_watermark()
+
+    if args.format == "parquet":
+        if not args.output:
+            raise SystemExit("Parquet export needs --output")
+        try:
+            written = db.export_parquet(args.output, since, until)
+        except ImportError as e:
+            raise SystemExit(str(e))
+        print(f"Exported {written} rankings", file=sys.stderr)
+    else:
+        write_chunks(args.output, db.export_rankings(args.format, since, until))
+
+    # Watermark for the next incremental export (--since)
+    print(f"Exported evaluations {since + 1}..{until}", file=sys.stderr)
+
+
+def export_all(args: argparse.Namespace) -> None:
+    if args.format == "parquet":
+        raise SystemExit("Parquet export is per project, pass a single --project")
+    if args.snapshot:
+        raise SystemExit("Snapshots are per project, pass a single --project")
+    since = json.loads(args.since) if args.since else {}
+    router = ShardRouter()
+    until = router.get_export_watermarks()
+    write_chunks(args.output, router.export_rankings(args.format, since, until))
+
+    # Watermarks for the next incremental export (--since)
+    print(json.dumps(until), file=sys.stderr)
+
+
+def write_chunks(output: Optional[str], chunks) -> None:
+    out = open(output, "w", newline="") if output else sys.stdout
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if output:
+            out.close()
+
+
+def show_stats(args: argparse.Namespace) -> None:
+    router = ShardRouter()
+    keys = router.keys() if args.project == ALL_PROJECTS else [args.project]
+    if args.snapshot:
+        if args.rebuild or args.project == ALL_PROJECTS:
+            raise SystemExit("--snapshot reads a single project and cannot --rebuild")
+        stats = snapshot_of(shard(args.project, router), args.snapshot).get_model_stats()
+        print(json.dumps(stats, indent=2, ensure_ascii=False))
+        return
+    if args.rebuild:
+        for key in keys:
+            if not shard(key, router).rebuild_model_stats():
+                raise SystemExit(1)
+    if args.project == ALL_PROJECTS:
+        stats = router.get_model_stats()
+    else:
+        stats = shard(args.project, router).get_model_stats()
+    print(json.dumps(stats, indent=2, ensure_ascii=False))
+
+
+def show_agreement(args: argparse.Namespace) -> None:
+    db = shard(args.project)
+    if args.rebuild and not db.rebuild_agreement():
+        raise SystemExit(1)
+    print(json.dumps(db.get_agreement_summary(), indent=2))
+
+
+def migrate(args: argparse.Namespace) -> None:
+    router = ShardRouter()
+    keys = router.keys() if args.project == ALL_PROJECTS else [args.project or DEFAULT_SHARD]
+    for key in keys:
+        if key != DEFAULT_SHARD and key not in router.keys():
+            raise SystemExit(f"Unknown project: {key}")
+        # Not router.get(), which would migrate the shard on open
+        db = DBManager(router.db_name(key))
+        current = db.schema_version()
+        migrations = pending(current, args.to)
+        if args.status:
+            print(f"{key}: schema version {current}, latest {latest_version()}")
+            for migration in migrations:
+                print(f"  pending {migration.version}: {migration.description}")
+            continue
+        if not db.migrate(args.to):
+            raise SystemExit(1)
+        print(f"{key}: schema version {db.schema_version()}, {len(migrations)} migrations applied")
+
+
+def snapshots(args: argparse.Namespace) -> None:
+    router = ShardRouter()
+    keys = router.keys() if args.project == ALL_PROJECTS else [args.project or DEFAULT_SHARD]
+    if args.restore and len(keys) > 1:
+        raise SystemExit("Snapshots are restored per project, pass a single --project")
+    for key in keys:
+        db = shard(key, router)
+        if args.list:
+            for snapshot in db.list_snapshots():
+                print(f"{key}: {snapshot['name']} {snapshot['bytes']} bytes")
+            continue
+        if args.restore:
+            if not db.restore_snapshot(args.restore):
+                raise SystemExit(1)
+            print(f"{key}: restored {args.restore}")
+            continue
+        snapshot = db.create_snapshot()
+        if snapshot is None:
+            raise SystemExit(1)
+        pruned = db.prune_snapshots(args.keep)
+        print(
+            f"{key}: {snapshot['name']} {snapshot['bytes']} bytes in {snapshot['seconds']:.2f}s "
+            f"({snapshot['restarts']} restarts), {pruned} old snapshots pruned"
+        )
+
+
+def snapshot_of(db: DBManager, name: str) -> DBManager:
+    try:
+        return db.open_snapshot(name)
+    except FileNotFoundError as e:
+        raise SystemExit(str(e))
+
+
+def shard(key: Optional[str], router: Optional[ShardRouter] = None) -> DBManager:
+    try:
+        return (router or ShardRouter()).get(key)
+    except UnknownShardError as e:
+        raise SystemExit(e.args[0])
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Feedback API maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    importer = commands.add_parser("import", help="Bulk import targets and translations")
+    importer.add_argument("path", help="JSON, JSONL or CSV file")
+    importer.add_argument("--format", choices=["json", "jsonl", "csv"], help="Defaults to the file extension")
+    importer.add_argument("--batch-size", type=int, default=10_000, help="Rows per transaction")
+    importer.add_argument(
+        "--rebuild-indexes",
+        action="store_true",
+        help="Drop indexes during the import and rebuild them afterwards (for very large loads)",
+    )
+    importer.set_defaults(handler=import_data)
+
+    exporter = commands.add_parser("export", help="Export rankings joined with targets and translations")
+    exporter.add_argument("--format", choices=["jsonl", "csv", "columns", "parquet"], default="jsonl")
+    exporter.add_argument(
+        "--since",
+        help="Only evaluations with a greater evalId, a JSON object of watermarks per project for --project '*'",
+    )
+    exporter.add_argument("--output", "-o", help="Output file, defaults to stdout")
+    exporter.set_defaults(handler=export_data)
+
+    stats = commands.add_parser("stats", help="Show the model leaderboard")
+    stats.add_argument("--rebuild", action="store_true", help="Recompute it from all rankings first (needs NumPy)")
+    stats.set_defaults(handler=show_stats)
+
+    agreement = commands.add_parser("agreement", help="Show active and retired targets")
+    agreement.add_argument(
+        "--rebuild", action="store_true", help="Recompute agreement and retirement from all rankings first"
+    )
+    agreement.set_defaults(handler=show_agreement)
+
+    migrator = commands.add_parser("migrate", help="Apply pending schema migrations")
+    migrator.add_argument("--to", type=int, help="Stop at this version, defaults to the latest")
+    migrator.add_argument("--status", action="store_true", help="Only list the pending migrations")
+    migrator.set_defaults(handler=migrate)
+
+    snapshot = commands.add_parser(
+        "snapshot", help="Snapshot the database online and prune old snapshots, or list and restore them"
+    )
+    snapshot.add_argument("--list", action="store_true", help="Only list the snapshots")
+    snapshot.add_argument("--restore", metavar="NAME", help="Replace the database by a snapshot ('latest' for the newest)")
+    snapshot.add_argument("--keep", type=int, help="Snapshots to keep, defaults to snapshots.keep")
+    snapshot.set_defaults(handler=snapshots)
+
+    for command in (exporter, stats):
+        command.add_argument(
+            "--snapshot",
+            metavar="NAME",
+            help="Read a snapshot ('latest' for the newest) instead of the live database",
+        )
+
+    for command in (importer, exporter, stats, migrator, snapshot):
+        command.add_argument(
+            "--project",
+            help="Project shard, defaults to the configured database"
+            + (" (created if missing)" if command is importer else f", '{ALL_PROJECTS}' for all of them"),
+        )
+    agreement.add_argument("--project", help="Project shard, defaults to the configured database")
+
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    args = build_parser().parse_args(argv)
+    # Logs go to stderr, stdout carries only command output
+    configure_logging()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
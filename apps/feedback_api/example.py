@@ -1,8 +1,10 @@
 import json
 from pprint import pprint
 from util import DBManager
+from util.config import configure_logging
 
 if __name__ == "__main__":
+    configure_logging()
     db = DBManager()
 
     db.initialize_schema()
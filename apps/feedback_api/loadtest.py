@@ -0,0 +1,155 @@
+import argparse
+import http.client
+import json
+import math
+import threading
+import time
+from typing import Optional
+from urllib.parse import quote, urlsplit
+
+ENDPOINTS = ("/get_target", "/submit_evaluation")
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return float("nan")
+    return values[max(0, math.ceil(p * len(values)) - 1)]
+
+
+class Client(threading.Thread):
+    """
+    One simulated evaluator: fetch a target, rank its translations, submit,
+    repeat until `deadline`, or until it has evaluated every target. Keeps
+    one HTTP connection open.
+    """
+
+    def __init__(self, url: str, evaluator: str, deadline: float, project: Optional[str] = None):
+        super().__init__(daemon=True)
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.evaluator = evaluator
+        self.deadline = deadline
+        self.query = f"project={quote(project)}" if project else ""
+        self.latencies: dict[str, list[float]] = {endpoint: [] for endpoint in ENDPOINTS}
+        self.errors = 0
+        # Served every target once already, see SeenMixin
+        self.exhausted = False
+
+    def run(self) -> None:
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            while time.perf_counter() < self.deadline:
+                status, data = self._request(
+                    conn, "GET", f"/get_target?evaluator={self.evaluator}&{self.query}", None
+                )
+                if status == 200 and data is None:
+                    self.exhausted = True
+                    break
+                if status != 200 or not data:
+                    self.errors += 1
+                    continue
+                ranking = [
+                    {"translationId": translation["id"], "rank": rank, "discarded": False}
+                    for rank, translation in enumerate(data["translations"], start=1)
+                ]
+                status, _ = self._request(
+                    conn, "POST", f"/submit_evaluation?evaluator={self.evaluator}&{self.query}", ranking
+                )
+                if status != 200:
+                    self.errors += 1
+        finally:
+            conn.close()
+
+    def _request(self, conn, method: str, path: str, body) -> tuple[int, Optional[dict]]:
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        payload = json.dumps(body) if body is not None else None
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            return 0, None
+        self.latencies[path.split("?")[0]].append(time.perf_counter() - start)
+        return response.status, json.loads(data) if data else None
+
+
+def run_level(
+    url: str, clients: int, duration: float, projects: Optional[list[str]] = None
+) -> dict:
+    """Run `clients` evaluators for `duration` seconds, spread round-robin over `projects`."""
+    deadline = time.perf_counter() + duration
+    # Fresh evaluators every run, earlier runs' evaluators have seen their targets
+    run = int(time.time())
+    threads = [
+        Client(url, f"loadtest-{run}-{clients}-{i}", deadline, projects[i % len(projects)] if projects else None)
+        for i in range(clients)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    result = {
+        "clients": clients,
+        "seconds": elapsed,
+        "errors": sum(t.errors for t in threads),
+        "exhausted": sum(t.exhausted for t in threads),
+    }
+    for endpoint in ENDPOINTS:
+        latencies = sorted(l for t in threads for l in t.latencies[endpoint])
+        result[endpoint] = {
+            "requests": len(latencies),
+            "rps": len(latencies) / elapsed,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+        }
+    return result
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Load test /get_target and /submit_evaluation of a running feedback API"
+    )
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument(
+        "--clients", type=int, nargs="+", default=[1, 16, 128], help="Concurrency levels to run"
+    )
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per level")
+    parser.add_argument(
+        "--projects", nargs="+", help="Project shards to spread the clients over, defaults to the configured database"
+    )
+    parser.add_argument("--json", help="Also write the results to this file")
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    args = build_parser().parse_args(argv)
+
+    results = []
+    print(f"{'clients':>7}  {'endpoint':<18} {'requests':>8} {'rps':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for clients in args.clients:
+        result = run_level(args.url, clients, args.duration, args.projects)
+        results.append(result)
+        for endpoint in ENDPOINTS:
+            r = result[endpoint]
+            print(
+                f"{clients:>7}  {endpoint:<18} {r['requests']:>8} {r['rps']:>8.1f} "
+                f"{r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f}"
+            )
+        if result["errors"]:
+            print(f"{clients:>7}  {result['errors']} failed requests")
+        if result["exhausted"]:
+            print(f"{clients:>7}  {result['exhausted']} clients stopped early, they had evaluated every target")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,78 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
+import argparse
 import json
 import os
-from util import DBManager, DataLoader
+from util import DBManager, DataLoader, ShardRouter
+from util.config import configure_logging
+from util.manager_mixins.export import EXPORT_FORMATS
+from util.metrics import REGISTRY
+from util.router import UnknownShardError
+
+configure_logging()
 
 app = Flask(__name__)
 CORS(app, origins=["http://localhost:5173", "http://127.0.0.1:5173"])
 
-db = DBManager()
+# Every endpoint takes an optional `project` (or language-pair) key, see ShardRouter
+router = ShardRouter()
+
+# Upper bound of `n` in /get_targets
+MAX_TARGETS_PER_REQUEST = 100
+
+# `project` value of /stats/models and /export that reads every shard at once
+ALL_PROJECTS = "*"
+
+
+def project_db() -> DBManager:
+    """Shard of the request's `project`, the configured database without one."""
+    return router.get(request.args.get("project"))
+
+
+@app.errorhandler(UnknownShardError)
+def unknown_project(e: UnknownShardError):
+    return jsonify({"error": e.args[0]}), 404
+
+
+def cached_json(etag: str, body: bytes) -> Response:
+    """Response of a cached payload; 304 without a body when the client already has it."""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    return response
 
 
 @app.route("/get_target", methods=["GET"])
 def get_target_with_trnalsations():
-    res = db.get_target_with_translations()
-    return jsonify(res), 200
+    res = project_db().get_target_responses(1, request.args.get("evaluator"))
+    if not res:
+        return jsonify(None), 200
+    return cached_json(*res[0])
+
+
+@app.route("/get_targets", methods=["GET"])
+def get_targets_with_translations():
+    n = request.args.get("n", 1, type=int)
+    if not 1 <= n <= MAX_TARGETS_PER_REQUEST:
+        return jsonify({"error": f"n must be between 1 and {MAX_TARGETS_PER_REQUEST}"}), 400
+
+    res = project_db().get_target_responses(n, request.args.get("evaluator"))
+    if res is None:
+        return jsonify({"error": "Failed to get targets"}), 500
+    # Cached payloads are joined as they are, nothing is re-encoded
+    body = b'{"targets":[' + b",".join(body for _, body in res) + b"]}"
+    return Response(body, mimetype="application/json")
+
+
+@app.route("/targets/<int:target_id>", methods=["GET"])
+def get_target_by_id(target_id: int):
+    # A cached target is revalidated without touching the DB
+    res = project_db().get_cached_target(target_id)
+    if res is None:
+        return jsonify({"error": f"Unknown target {target_id}"}), 404
+    return cached_json(*res)
 
 
 @app.route("/submit_evaluation", methods=["POST"])
@@ -22,25 +81,134 @@ def submit_evaluation():
     if not data:
         return jsonify({"error": "Missing rankings"}), 400
 
-    success = db.add_evaluation(data)
+    success = project_db().add_evaluation(data, request.args.get("evaluator"))
     if success:
         return jsonify({"message": "Evaluation submitted successfully"}), 200
     else:
         return jsonify({"error": "Failed to submit evaluation"}), 500
 
 
+@app.route("/submit_evaluations", methods=["POST"])
+def submit_evaluations():
+    data = request.get_json()
+    if not data or not isinstance(data, list):
+        return jsonify({"error": "Missing evaluations"}), 400
+
+    results = project_db().add_evaluations(data, request.args.get("evaluator"))
+    return jsonify({"results": results}), 200
+
+
+@app.route("/stats/models", methods=["GET"])
+def get_model_stats():
+    if request.args.get("project") == ALL_PROJECTS:
+        res = router.get_model_stats()
+    else:
+        res = project_db().get_model_stats()
+    if res is None:
+        return jsonify({"error": "Failed to get model stats"}), 500
+    return jsonify(res), 200
+
+
+@app.route("/stats/agreement", methods=["GET"])
+def get_agreement_summary():
+    res = project_db().get_agreement_summary()
+    if res is None:
+        return jsonify({"error": "Failed to get agreement summary"}), 500
+    return jsonify(res), 200
+
+
+@app.route("/search", methods=["GET"])
+def search():
+    # `q` matches words, `match` takes FTS5 query syntax
+    query = request.args.get("match") or request.args.get("q")
+    if not query:
+        return jsonify({"error": "Missing q or match"}), 400
+    max_page_size = router.config["search"]["max_page_size"]
+    limit = request.args.get("limit", router.config["search"]["page_size"], type=int)
+    if not 1 <= limit <= max_page_size:
+        return jsonify({"error": f"limit must be between 1 and {max_page_size}"}), 400
+
+    try:
+        res = project_db().search(
+            query,
+            scope=request.args.get("scope", "targets"),
+            model=request.args.get("model"),
+            min_evals=request.args.get("min_evals", type=int),
+            max_evals=request.args.get("max_evals", type=int),
+            after=request.args.get("after", 0, type=int),
+            limit=limit,
+            raw="match" in request.args,
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if res is None:
+        return jsonify({"error": "Failed to search"}), 500
+    return jsonify(res), 200
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    # Prometheus text exposition format
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/export", methods=["GET"])
+def export_rankings():
+    file_format = request.args.get("format", "jsonl")
+    if file_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"Unknown format {file_format}"}), 400
+
+    # Clients pass X-Export-Until back as `since` on their next export
+    if request.args.get("project") == ALL_PROJECTS:
+        # One watermark per project, `since` and X-Export-Until are JSON objects
+        try:
+            since = json.loads(request.args.get("since", "{}"))
+        except ValueError:
+            return jsonify({"error": "since must be a JSON object of evalIds per project"}), 400
+        if not isinstance(since, dict):
+            return jsonify({"error": "since must be a JSON object of evalIds per project"}), 400
+        until = router.get_export_watermarks()
+        chunks = router.export_rankings(file_format, since, until)
+        watermark = json.dumps(until, separators=(",", ":"))
+    else:
+        db = project_db()
+        since = request.args.get("since", 0, type=int)
+        until = db.get_export_watermark()
+        chunks = db.export_rankings(file_format, since, until)
+        watermark = str(until)
+
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_FORMATS[file_format],
+        headers={"X-Export-Until": watermark},
+    )
+
+
 if __name__ == "__main__":
-    db.initialize_schema()
-    db.load_example_data()
+    parser = argparse.ArgumentParser(description="Run the feedback API with Flask's development server")
+    parser.add_argument(
+        "--example-data",
+        action="store_true",
+        help="Wipe the database and load the example data first",
+    )
+    args = parser.parse_args()
+
+    db = router.default
+    if args.example_data:
+        db.initialize_schema()
+        db.load_example_data()
+
+        # Add targets and translations with 0 evaluations
+        with open("assets/example_target.json") as f:
+            example_targets = json.load(f)
 
-    # Add targets and translations with 0 evaluations
-    with open("assets/example_target.json") as f:
-        example_targets = json.load(f)
+        with open("assets/example_translation.json") as f:
+            example_translations = json.load(f)
 
-    with open("assets/example_translation.json") as f:
-        example_translations = json.load(f)
+        db.add_targets(example_targets)
+        db.add_translations(example_translations)
 
-    db.add_targets(example_targets)
-    db.add_translations(example_translations)
+    if db.assignment_backend == "index":
+        db.build_assignment_index()
 
     app.run(debug=True)
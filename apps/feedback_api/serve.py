@@ -0,0 +1,51 @@
+import argparse
+from typing import Optional
+from main import app, router
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Serve the feedback API in production mode")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=16, help="Request handling threads")
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """
+    Serve the app with waitress, one process with a pool of request threads.
+
+    Reads run on the pooled read-only connections of the request threads,
+    every write goes through the single writer thread of the DB manager,
+    which group-commits concurrent submissions. One process keeps a single
+    writer per database (and the "index" assignment backend valid); SQLite
+    serializes writers anyway, so more processes would not write faster.
+    Each project shard has its own writer thread, so writes to different
+    projects run in parallel. Pending schema migrations are applied when a
+    shard is opened, the data is never wiped. With `snapshots.interval`
+    set, every shard is also snapshotted in the background.
+    """
+    args = build_parser().parse_args(argv)
+
+    try:
+        from waitress import serve
+    except ImportError:
+        raise SystemExit("Production serving requires waitress: pip install waitress")
+
+    try:
+        db = router.default
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+    router.start_writers()
+    router.start_snapshots()
+    if db.assignment_backend == "index":
+        db.build_assignment_index()
+    db.load_seen_targets()
+    try:
+        serve(app, host=args.host, port=args.port, threads=args.threads)
+    finally:
+        router.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import util.config  # noqa: E402
+from util import DBManager  # noqa: E402
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """
+    A copy of the app folder (config.json and the example data) as the
+    working directory, so every test has its own data folder and config.
+    """
+    root = tmp_path / "feedback_api"
+    root.mkdir()
+    shutil.copy(os.path.join(APP_DIR, "config.json"), root)
+    shutil.copytree(os.path.join(APP_DIR, "assets"), root / "assets")
+    monkeypatch.chdir(root)
+    monkeypatch.setattr(util.config, "_config", None)
+    return root
+
+
+@pytest.fixture
+def db(workdir):
+    """A manager on an empty database at the latest schema version."""
+    manager = DBManager()
+    assert manager.initialize_schema()
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def example_db(db):
+    """The database with the example targets, translations and rankings."""
+    assert db.load_example_data()
+    return db
@@ -0,0 +1,134 @@
+import pytest
+
+from util.manager_mixins.agreement import evaluation_scores, kendalls_w
+
+
+def translations_of(db, target_id: int) -> list[int]:
+    with db.read_only() as cursor:
+        cursor.execute("SELECT id FROM Translations WHERE targetId = ? ORDER BY id", (target_id,))
+        return [row[0] for row in cursor.fetchall()]
+
+
+def evaluate(db, translation_ids: list[int]) -> None:
+    """Rank the translations in the given order."""
+    ranking = [
+        {"translationId": translation_id, "rank": rank, "discarded": False}
+        for rank, translation_id in enumerate(translation_ids, start=1)
+    ]
+    assert db.add_evaluation(ranking)
+
+
+def agreement_of(db, target_id: int) -> tuple:
+    with db.read_only() as cursor:
+        cursor.execute(
+            "SELECT agreement, agreementEvals, retired FROM Targets WHERE id = ?", (target_id,)
+        )
+        agreement, evaluations, retired = cursor.fetchone()
+    return agreement, evaluations, bool(retired)
+
+
+@pytest.fixture
+def target(example_db) -> int:
+    """A new target with 4 translations, next to the example data."""
+    assert example_db.add_targets(
+        [{"context1": "Before.", "target": "The sentence.", "context2": "After."}]
+    )
+    with example_db.read_only() as cursor:
+        cursor.execute("SELECT MAX(id) FROM Targets")
+        target_id = cursor.fetchone()[0]
+    assert example_db.add_translations(
+        [
+            {"targetId": target_id, "translation": f"Translation {i}", "model": f"model-{i}"}
+            for i in range(4)
+        ]
+    )
+    return target_id
+
+
+def test_scores_rank_and_midrank():
+    # 4 translations, 2 ranked, 1 discarded, 1 not shown: the last two share positions 3 and 4
+    scores = evaluation_scores([(10, 2, False), (11, 1, False), (12, 1, True)], [10, 11, 12, 13])
+    assert scores == {11: 1, 10: 2, 12: 3.5, 13: 3.5}
+    assert sum(scores.values()) == 4 * 5 / 2
+    # Rankings of unknown translations are ignored
+    assert evaluation_scores([(99, 1, False)], [1, 2]) == {1: 1.5, 2: 1.5}
+
+
+def test_kendalls_w():
+    # 3 raters giving the same ranking of 3 items
+    assert kendalls_w([3, 6, 9], 3) == pytest.approx(1.0)
+    # Two raters with opposite rankings cancel out
+    assert kendalls_w([1 + 3, 2 + 2, 3 + 1], 2) == pytest.approx(0.0)
+    # Textbook example: 4 raters, 3 items, rank sums 5, 8, 11
+    assert kendalls_w([5, 8, 11], 4) == pytest.approx(12 * 18 / (16 * 24))
+    assert kendalls_w([3], 3) is None
+    assert kendalls_w([1, 2], 1) is None
+
+
+def test_agreeing_evaluations_retire_the_target(example_db, target):
+    settings = example_db.config["retirement"]
+    translation_ids = translations_of(example_db, target)
+    for i in range(1, settings["min_evals"]):
+        evaluate(example_db, translation_ids)
+        agreement, evaluations, retired = agreement_of(example_db, target)
+        assert evaluations == i and not retired
+    assert agreement == pytest.approx(1.0)
+
+    evaluate(example_db, translation_ids)
+    assert agreement_of(example_db, target)[2]
+
+    served = {
+        example_db.get_target_with_translations()["target"]["id"] for _ in range(20)
+    }
+    assert target not in served
+    summary = example_db.get_agreement_summary()
+    assert summary["retired"] == 1
+    assert summary["active"] == summary["targets"] - 1
+
+
+def test_disagreeing_evaluations_keep_the_target_active(example_db, target):
+    translation_ids = translations_of(example_db, target)
+    for i in range(2 * example_db.config["retirement"]["min_evals"]):
+        evaluate(example_db, translation_ids if i % 2 else translation_ids[::-1])
+    agreement, _, retired = agreement_of(example_db, target)
+    assert agreement < example_db.config["retirement"]["agreement"]
+    assert not retired
+
+
+def test_new_translation_reactivates_the_target(example_db, target):
+    translation_ids = translations_of(example_db, target)
+    for _ in range(example_db.config["retirement"]["min_evals"]):
+        evaluate(example_db, translation_ids)
+    assert agreement_of(example_db, target)[2]
+
+    assert example_db.add_translations(
+        [{"targetId": target, "translation": "Another one", "model": "late-model"}]
+    )
+    assert agreement_of(example_db, target) == (None, 0, False)
+    with example_db.read_only() as cursor:
+        cursor.execute("SELECT SUM(rankSum) FROM Translations WHERE targetId = ?", (target,))
+        assert cursor.fetchone() == (0,)
+
+
+def test_rebuild_matches_incremental_agreement(example_db, target):
+    translation_ids = translations_of(example_db, target)
+    orders = [translation_ids, translation_ids[::-1], translation_ids[1:] + translation_ids[:1]]
+    for order in orders:
+        evaluate(example_db, order)
+    # A ranking that leaves one translation out
+    evaluate(example_db, translation_ids[:-1])
+    incremental = agreement_of(example_db, target)
+
+    assert example_db.rebuild_agreement()
+    rebuilt = agreement_of(example_db, target)
+    assert rebuilt[0] == pytest.approx(incremental[0])
+    assert rebuilt[1:] == incremental[1:] == (4, False)
+    assert incremental[0] is not None
+
+
+def test_example_rankings_count_towards_agreement(example_db):
+    with example_db.read_only() as cursor:
+        cursor.execute("SELECT id, numEvals, agreementEvals FROM Targets WHERE numEvals > 0")
+        loaded = cursor.fetchall()
+    assert loaded
+    assert all(evals == agreement_evals for _, evals, agreement_evals in loaded)
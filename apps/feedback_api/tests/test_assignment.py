@@ -0,0 +1,104 @@
+import time
+
+import pytest
+
+TARGETS = 10
+
+
+@pytest.fixture(params=["sql", "index"])
+def db(request, db):
+    """Targets with 3 translations each, served by the given backend with leases on."""
+    db.config["assignment"]["backend"] = request.param
+    db.config["assignment"]["lease_ttl"] = 300
+    db.config["retirement"]["min_evals"] = 2
+    assert db.add_targets(
+        [{"context1": "a", "target": f"target {i}", "context2": "b"} for i in range(TARGETS)]
+    )
+    assert db.add_translations(
+        [
+            {"targetId": target_id, "translation": f"{model} {target_id}", "model": model}
+            for target_id in range(1, TARGETS + 1)
+            for model in ("m1", "m2", "m3")
+        ]
+    )
+    return db
+
+
+def served(payloads) -> list[int]:
+    return [payload["target"]["id"] for payload in payloads]
+
+
+def leases(db) -> dict[int, tuple]:
+    """targetId -> (evaluator, expiresAt) of the live leases."""
+    if db.assignment_backend == "index":
+        return dict(db.assignment_index._leases)
+    with db.read_only() as cursor:
+        cursor.execute("SELECT targetId, evaluator, expiresAt FROM Leases WHERE expiresAt > ?", (time.time(),))
+        return {target_id: (evaluator, expires_at) for target_id, evaluator, expires_at in cursor.fetchall()}
+
+
+def evaluate(db, target_id: int, evaluator: str) -> None:
+    with db.read_only() as cursor:
+        cursor.execute("SELECT id FROM Translations WHERE targetId = ? ORDER BY id", (target_id,))
+        ranking = [
+            {"translationId": row[0], "rank": rank, "discarded": False}
+            for rank, row in enumerate(cursor.fetchall(), start=1)
+        ]
+    assert db.add_evaluation(ranking, evaluator)
+
+
+def test_anonymous_callers_take_no_lease(db, monkeypatch):
+    def refuse(operation):
+        raise AssertionError("anonymous request wrote")
+
+    monkeypatch.setattr(db, "write", refuse)
+    for _ in range(3 * TARGETS):
+        assert db.get_target_with_translations() is not None
+    assert len(db.get_targets_with_translations(5)) == 5
+    assert len(db.get_target_responses(5)) == 5
+    assert leases(db) == {}
+
+
+def test_anonymous_callers_skip_leased_targets(db):
+    held = set(served(db.get_targets_with_translations(TARGETS - 2, "alice")))
+    anonymous = set(served(db.get_targets_with_translations(2)))
+    assert len(anonymous) == 2 and not anonymous & held
+    # Everything leased: shared, not empty
+    db.get_targets_with_translations(2, "bob")
+    assert db.get_target_with_translations() is not None
+    assert "alice" in {evaluator for evaluator, _ in leases(db).values()}
+
+
+def test_retired_target_is_not_served_again_to_its_holder(db):
+    # Agreeing evaluations, not enough to retire by the current settings
+    db.config["retirement"]["min_evals"] = 100
+    evaluate(db, 1, "bob")
+    evaluate(db, 1, "carol")
+    assert 1 in served(db.get_targets_with_translations(TARGETS, "alice"))
+
+    # Retired while alice holds it
+    db.config["retirement"]["min_evals"] = 2
+    assert db.rebuild_agreement()
+    assert 1 not in served(db.get_targets_with_translations(TARGETS, "alice"))
+    assert db.get_target_with_translations("alice")["target"]["id"] != 1
+
+
+def test_seen_held_target_is_not_served_again(db):
+    target_id = db.get_target_with_translations("alice")["target"]["id"]
+    # Evaluated by alice through another process, the lease is still held
+    db.seen_targets.add("alice", target_id)
+    assert target_id not in served(db.get_targets_with_translations(3, "alice"))
+
+
+def test_only_returned_leases_are_extended(db):
+    first = served(db.get_targets_with_translations(3, "alice"))
+    expiries = {target_id: lease[1] for target_id, lease in leases(db).items()}
+    time.sleep(0.01)
+
+    again = db.get_target_with_translations("alice")["target"]["id"]
+    assert again in first
+    after = {target_id: lease[1] for target_id, lease in leases(db).items()}
+    assert after[again] > expiries[again]
+    assert {target_id: after[target_id] for target_id in first if target_id != again} == {
+        target_id: expiries[target_id] for target_id in first if target_id != again
+    }
@@ -0,0 +1,52 @@
+from util.migrations import latest_version
+
+
+def evaluate(db, evaluator: str = "alice") -> int:
+    response = db.get_target_with_translations(evaluator)
+    ranking = [
+        {"translationId": t["id"], "rank": i + 1, "discarded": False}
+        for i, t in enumerate(response["translations"])
+    ]
+    assert db.add_evaluation(ranking, evaluator)
+    return response["target"]["id"]
+
+
+def test_migrate_after_drop_all_tables_recreates_the_schema(example_db):
+    db = example_db
+    assert db.drop_all_tables()
+    with db.read_only() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'")
+        assert cursor.fetchall() == []
+    assert db.schema_version() == 0
+
+    assert db.migrate()
+    assert db.schema_version() == latest_version()
+    assert db.clear_all_tables()
+    assert db.load_example_data()
+    evaluate(db)
+
+
+def test_clear_all_tables_keeps_the_schema_and_restarts_ids(example_db):
+    db = example_db
+    evaluate(db)
+    db.checkpoint_seen_targets()
+    assert db.clear_all_tables()
+
+    with db.read_only() as cursor:
+        for table in ("Targets", "Translations", "Rankings", "Evaluations", "Leases", "ModelStats", "SeenTargets"):
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            assert cursor.fetchone()[0] == 0, table
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger'")
+        assert cursor.fetchone()[0] > 0
+    assert db.search("London")["results"] == []
+    assert db.schema_version() == latest_version()
+
+    assert db.add_targets([{"context1": "a", "target": "London again", "context2": "b"}])
+    assert db.add_translations([{"targetId": 1, "translation": "Londres", "model": "m1"}])
+    assert evaluate(db) == 1
+    with db.read_only() as cursor:
+        cursor.execute("SELECT id FROM Evaluations")
+        assert cursor.fetchall() == [(1,)]
+        cursor.execute("SELECT numTranslations, numEvals FROM Targets")
+        assert cursor.fetchone() == (1, 1)
+    assert [r["id"] for r in db.search("London")["results"]] == [1]
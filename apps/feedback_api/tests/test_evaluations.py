@@ -0,0 +1,141 @@
+import threading
+
+import pytest
+
+from util import ShardRouter
+
+
+def translations_of(db, target_id: int) -> list[int]:
+    with db.read_only() as cursor:
+        cursor.execute("SELECT id FROM Translations WHERE targetId = ? ORDER BY id", (target_id,))
+        return [row[0] for row in cursor.fetchall()]
+
+
+def ranking(translation_ids: list[int], ranks: list[int] = None) -> list[dict]:
+    ranks = ranks or list(range(1, len(translation_ids) + 1))
+    return [
+        {"translationId": translation_id, "rank": rank, "discarded": False}
+        for translation_id, rank in zip(translation_ids, ranks)
+    ]
+
+
+def state(db) -> dict:
+    """Stored rows and every counter and summary table the triggers and submissions maintain."""
+    with db.read_only() as cursor:
+        result = {}
+        for name, sql in {
+            "evaluations": "SELECT id, targetId, numRankings, numRanked, evaluator FROM Evaluations ORDER BY id",
+            "rankings": "SELECT evalId, translationId, rank, discarded FROM Rankings ORDER BY id",
+            "targets": "SELECT id, numTranslations, numEvals, numRanked, agreementEvals FROM Targets ORDER BY id",
+            "translations": "SELECT id, numEvals FROM Translations ORDER BY id",
+            "model_stats": "SELECT * FROM ModelStats ORDER BY model",
+            "model_wins": "SELECT * FROM ModelWins ORDER BY winner, loser",
+        }.items():
+            cursor.execute(sql)
+            result[name] = cursor.fetchall()
+        return result
+
+
+def assert_counters_match_a_recount(db) -> None:
+    before = state(db)
+    assert db.recount_num_evals()
+    assert db.rebuild_model_stats()
+    assert db.rebuild_agreement()
+    assert state(db) == before
+
+
+@pytest.fixture(params=[False, True], ids=["transaction", "group-commit"])
+def batch_db(request, example_db):
+    if request.param:
+        example_db.start_writer()
+    yield example_db
+    example_db.stop_writer()
+
+
+def test_invalid_item_is_rolled_back_alone(batch_db):
+    db = batch_db
+    first, second, third = (translations_of(db, target_id) for target_id in (1, 2, 3))
+    before = state(db)
+    results = db.add_evaluations(
+        [
+            ranking(first),
+            # Duplicate rank: fails on the UNIQUE index after its evaluation row is inserted
+            ranking(second, [1, 1, 2]),
+            ranking(second),
+            # Translations of two targets
+            ranking([first[0], third[0]]),
+            [{"translationId": 999_999, "rank": 1, "discarded": False}],
+            ranking(third),
+        ],
+        "alice",
+    )
+
+    assert [r["success"] for r in results] == [True, False, True, False, False, True]
+    assert "UNIQUE" in results[1]["error"]
+    eval_ids = [r["evalId"] for r in results if r["success"]]
+    after = state(db)
+    assert [row[0] for row in after["evaluations"][len(before["evaluations"]):]] == eval_ids
+    assert len(after["rankings"]) == len(before["rankings"]) + len(first) + len(second) + len(third)
+    assert {row[0] for row in after["rankings"][len(before["rankings"]):]} == set(eval_ids)
+    # One more evaluation per valid item on each counter
+    numevals = {row[0]: row[2] for row in after["targets"]}
+    assert numevals == {row[0]: row[2] + (row[0] in (1, 2, 3)) for row in before["targets"]}
+    assert_counters_match_a_recount(db)
+
+
+def test_submit_evaluations_endpoint_reports_each_item(workdir, monkeypatch):
+    import main
+
+    router = ShardRouter()
+    db = router.default
+    assert db.initialize_schema() and db.load_example_data()
+    monkeypatch.setattr(main, "router", router)
+    client = main.app.test_client()
+    try:
+        first, second = translations_of(db, 1), translations_of(db, 2)
+        response = client.post(
+            "/submit_evaluations?evaluator=bob",
+            json=[ranking(first), ranking(second, [2, 2, 1]), ranking(second)],
+        )
+        assert response.status_code == 200
+        results = response.get_json()["results"]
+        assert [r["success"] for r in results] == [True, False, True]
+        assert results[2]["evalId"] == results[0]["evalId"] + 1
+        assert client.post("/submit_evaluations", json={"not": "a list"}).status_code == 400
+        assert_counters_match_a_recount(db)
+    finally:
+        router.close()
+
+
+def test_concurrent_submissions_get_unique_gap_free_eval_ids(batch_db):
+    db = batch_db
+    rankings = [ranking(translations_of(db, target_id)) for target_id in (1, 2, 3)]
+    first_id = db.get_export_watermark() + 1
+    eval_ids, errors = [], []
+    lock = threading.Lock()
+
+    def submit(thread: int) -> None:
+        for i in range(20):
+            batch = [rankings[(thread + i) % 3]]
+            if i % 5 == 0:
+                # Rolled back, must not use up an id
+                batch.append(ranking(translations_of(db, 1), [1, 1, 1]))
+            results = db.add_evaluations(batch, f"evaluator-{thread}")
+            with lock:
+                eval_ids.extend(r["evalId"] for r in results if r["success"])
+                errors.extend(r for r in results if not r["success"])
+
+    threads = [threading.Thread(target=submit, args=(thread,)) for thread in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 8 * 4
+    assert sorted(eval_ids) == list(range(first_id, first_id + 8 * 20))
+    with db.read_only() as cursor:
+        cursor.execute("SELECT id FROM Evaluations WHERE id >= ? ORDER BY id", (first_id,))
+        assert [row[0] for row in cursor.fetchall()] == sorted(eval_ids)
+        cursor.execute("SELECT DISTINCT evalId FROM Rankings WHERE evalId >= ? ORDER BY evalId", (first_id,))
+        assert [row[0] for row in cursor.fetchall()] == sorted(eval_ids)
+    assert_counters_match_a_recount(db)
@@ -0,0 +1,106 @@
+import csv
+import io
+import json
+
+import pytest
+
+from util import ShardRouter
+from util.manager_mixins.export import EXPORT_COLUMNS, format_rankings
+
+
+def evaluate(db, target_id: int, evaluator: str = "alice") -> None:
+    with db.read_only() as cursor:
+        cursor.execute("SELECT id FROM Translations WHERE targetId = ? ORDER BY id", (target_id,))
+        translation_ids = [row[0] for row in cursor.fetchall()]
+    ranking = [
+        {"translationId": translation_id, "rank": rank, "discarded": rank == len(translation_ids)}
+        for rank, translation_id in enumerate(translation_ids, start=1)
+    ]
+    assert db.add_evaluation(ranking, evaluator)
+
+
+def jsonl(chunks) -> list[dict]:
+    return [json.loads(line) for line in "".join(chunks).splitlines()]
+
+
+def test_incremental_exports_only_contain_new_evaluations(example_db):
+    db = example_db
+    first_until = db.get_export_watermark()
+    first = jsonl(db.export_rankings("jsonl", 0, first_until))
+    assert {row["evalId"] for row in first} == set(range(1, first_until + 1))
+
+    evaluate(db, 1)
+    evaluate(db, 2, "bob")
+    second_until = db.get_export_watermark()
+    # Stored after the second export started, left to the next one
+    evaluate(db, 3)
+    second = jsonl(db.export_rankings("jsonl", first_until, second_until))
+    assert {row["evalId"] for row in second} == {first_until + 1, first_until + 2}
+    assert [row["evaluator"] for row in second if row["evalId"] == first_until + 2][0] == "bob"
+
+    third = jsonl(db.export_rankings("jsonl", second_until))
+    assert {row["evalId"] for row in third} == {second_until + 1}
+    assert first + second + third == jsonl(db.export_rankings("jsonl"))
+    assert jsonl(db.export_rankings("jsonl", db.get_export_watermark())) == []
+
+
+def test_export_endpoint_hands_out_the_next_watermark(workdir, monkeypatch):
+    import main
+
+    router = ShardRouter()
+    db = router.default
+    assert db.initialize_schema() and db.load_example_data()
+    monkeypatch.setattr(main, "router", router)
+    client = main.app.test_client()
+    try:
+        response = client.get("/export")
+        assert response.status_code == 200
+        until = int(response.headers["X-Export-Until"])
+        assert {row["evalId"] for row in jsonl([response.get_data(as_text=True)])} == set(range(1, until + 1))
+
+        evaluate(db, 1)
+        response = client.get(f"/export?since={until}")
+        assert [row["evalId"] for row in jsonl([response.get_data(as_text=True)])] == [until + 1] * 3
+        assert response.headers["X-Export-Until"] == str(until + 1)
+        assert client.get("/export?format=xml").status_code == 400
+    finally:
+        router.close()
+
+
+def test_csv_has_the_header_and_quotes_fields(example_db):
+    db = example_db
+    awkward = 'Say "hi", then\nleave'
+    assert db.add_translations([{"targetId": 1, "translation": awkward, "model": "m,1"}])
+    evaluate(db, 1)
+    text = "".join(db.export_rankings("csv"))
+
+    assert text.startswith(",".join(EXPORT_COLUMNS) + "\r\n")
+    assert '"Say ""hi"", then\nleave"' in text
+    rows = list(csv.reader(io.StringIO(text, newline="")))
+    assert rows[0] == EXPORT_COLUMNS
+    assert len(rows) - 1 == len(jsonl(db.export_rankings("jsonl")))
+    awkward_rows = [row for row in rows[1:] if row[EXPORT_COLUMNS.index("translation")] == awkward]
+    assert len(awkward_rows) == 1
+    assert awkward_rows[0][EXPORT_COLUMNS.index("model")] == "m,1"
+
+
+def test_formats_carry_the_same_rows(example_db):
+    db = example_db
+    rows = jsonl(db.export_rankings("jsonl"))
+    assert set(rows[0]) == set(EXPORT_COLUMNS)
+    assert all(isinstance(row["discarded"], bool) for row in rows)
+
+    batches = list(db.iter_rankings(fetch_size=4))
+    assert all(len(batch) <= 4 for batch in batches)
+    lines = list(format_rankings(iter(batches), "columns"))
+    assert len(lines) == len(batches)
+    columns = {name: [] for name in EXPORT_COLUMNS}
+    for line in lines:
+        for name, values in json.loads(line).items():
+            columns[name] += values
+    assert [dict(zip(EXPORT_COLUMNS, values)) for values in zip(*columns.values())] == rows
+
+
+def test_unknown_format_is_refused(example_db):
+    with pytest.raises(ValueError):
+        list(example_db.export_rankings("xml"))
@@ -0,0 +1,113 @@
+import json
+import threading
+
+from util import DataLoader
+
+
+def write_jsonl(path, records) -> str:
+    with open(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    return str(path)
+
+
+def target(key: str, **fields) -> dict:
+    return {"key": key, "context1": "before", "target": f"text of {key}", "context2": "after", **fields}
+
+
+def translation(text: str, **link) -> dict:
+    return {"translation": text, "model": "m1", **link}
+
+
+def counts(db) -> tuple[int, int, int]:
+    with db.read_only() as cursor:
+        cursor.execute(
+            """
+            SELECT
+                (SELECT COUNT(*) FROM Targets),
+                (SELECT COUNT(*) FROM Translations),
+                (SELECT COUNT(*) FROM Translations LEFT JOIN Targets ON Targets.id = Translations.targetId
+                 WHERE Targets.id IS NULL)
+            """
+        )
+        return cursor.fetchone()
+
+
+def test_translations_are_linked_by_nesting_id_and_key(db, tmp_path):
+    path = write_jsonl(
+        tmp_path / "corpus.jsonl",
+        [
+            target("a", translations=[translation("a1"), translation("a2")]),
+            target("b"),
+            translation("b1", targetKey="b"),
+            translation("a3", targetId=1),
+        ],
+    )
+    stats = DataLoader(db, batch_size=2).load(path)
+
+    assert (stats["targets"], stats["translations"], stats["skipped"]) == (2, 4, 0)
+    assert counts(db) == (2, 4, 0)
+    with db.read_only() as cursor:
+        cursor.execute("SELECT externalKey, numTranslations FROM Targets ORDER BY id")
+        assert cursor.fetchall() == [("a", 3), ("b", 1)]
+
+
+def test_translations_of_unknown_targets_are_skipped(db, tmp_path):
+    path = write_jsonl(
+        tmp_path / "corpus.jsonl",
+        [
+            target("a"),
+            translation("known", targetId=1),
+            translation("unknown id", targetId=999),
+            translation("unknown key", targetKey="missing"),
+        ],
+    )
+    stats = DataLoader(db).load(path)
+
+    assert (stats["targets"], stats["translations"], stats["skipped"]) == (1, 1, 2)
+    assert counts(db) == (1, 1, 0)
+
+
+def test_csv_rows_share_their_target(db, tmp_path):
+    path = tmp_path / "corpus.csv"
+    path.write_text(
+        "key,context1,target,context2,translation,model\n"
+        "a,c1,t1,c2,x1,m1\n"
+        "a,c1,t1,c2,x2,m2\n"
+        "b,c1,t2,c2,y1,m1\n"
+    )
+    stats = DataLoader(db).load(str(path))
+
+    assert (stats["targets"], stats["translations"]) == (2, 3)
+    assert counts(db) == (2, 3, 0)
+
+
+def test_imported_rows_are_searchable(db, tmp_path):
+    path = write_jsonl(tmp_path / "corpus.jsonl", [target("a", translations=[translation("lighthouse")])])
+    DataLoader(db).load(path)
+
+    assert len(db.search("lighthouse", scope="translations")["results"]) == 1
+
+
+def test_imports_go_through_the_writer_thread(db, tmp_path, monkeypatch):
+    path = write_jsonl(
+        tmp_path / "corpus.jsonl",
+        [target(str(i), translations=[translation(f"t{i}")]) for i in range(10)],
+    )
+    threads = []
+    transaction = db.transaction
+
+    def recorded_transaction():
+        threads.append(threading.current_thread().name)
+        return transaction()
+
+    monkeypatch.setattr(db, "transaction", recorded_transaction)
+    db.start_writer()
+    stats = DataLoader(db, batch_size=4, rebuild_indexes=True).load(path)
+    assert db.add_targets([{"context1": "", "target": "added", "context2": ""}])
+    assert db.add_translations([{"targetId": 11, "translation": "added", "model": "m1"}])
+    db.stop_writer()
+
+    assert (stats["targets"], stats["translations"]) == (10, 10)
+    assert counts(db) == (11, 11, 0)
+    assert threads and set(threads) == {"sqlite-writer"}
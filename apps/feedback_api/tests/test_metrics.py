@@ -0,0 +1,30 @@
+import pytest
+
+from util.metrics import Counter, Histogram, Registry, _Metric
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    counter = registry.counter("requests_total", "Requests", labels=("path",))
+    histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    counter.inc(path="/a")
+    counter.inc(2, path="/a")
+    histogram.observe(0.5)
+
+    lines = registry.render().splitlines()
+    assert 'requests_total{path="/a"} 3' in lines
+    assert 'latency_seconds_bucket{le="0.1"} 0' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 1' in lines
+    assert "latency_seconds_count 1" in lines
+    # Registering a name again returns the first metric
+    assert registry.counter("requests_total", "Requests", labels=("path",)) is counter
+
+
+def test_incomplete_metric_cannot_be_instantiated():
+    class Gauge(_Metric):
+        kind = "gauge"
+
+    with pytest.raises(TypeError, match="_samples"):
+        Gauge("gauge", "A gauge")
+    assert isinstance(Counter("c", "C"), _Metric)
+    assert isinstance(Histogram("h", "H"), _Metric)
@@ -0,0 +1,284 @@
+import os
+import random
+import sqlite3
+from collections import Counter
+
+from util import DBManager
+from util.manager_mixins.stats import pairwise_wins
+from util.migrations import MIGRATIONS, latest_version
+
+# Schema of initialize_schema() before versioning, as it created databases
+LEGACY_SCHEMA = (
+    """
+    CREATE TABLE Targets (
+        id INTEGER PRIMARY KEY,
+        target TEXT NOT NULL,
+        context1 TEXT NOT NULL,
+        context2 TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE Translations (
+        id INTEGER PRIMARY KEY,
+        targetId INTEGER NOT NULL,
+        translation TEXT NOT NULL,
+        model TEXT NOT NULL,
+        numEvals INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY(targetId) REFERENCES Targets(id)
+    )
+    """,
+    """
+    CREATE TABLE Rankings (
+        id INTEGER PRIMARY KEY,
+        translationId INTEGER NOT NULL,
+        evalId INTEGER NOT NULL,
+        rank INTEGER,
+        discarded BOOLEAN,
+        FOREIGN KEY(translationId) REFERENCES Translations(id)
+    )
+    """,
+    "CREATE INDEX idx_translations_target_id ON Translations(targetId)",
+    "CREATE INDEX idx_translations_num_evals ON Translations(numEvals, id)",
+    "CREATE INDEX idx_rankings_translation_id ON Rankings(translationId)",
+    "CREATE INDEX idx_rankings_eval_id ON Rankings(evalId)",
+    "CREATE INDEX idx_translations_evals_target ON Translations(numEvals, targetId, id)",
+    "CREATE UNIQUE INDEX idx_unique_ranks_per_eval ON Rankings(evalId, rank) WHERE discarded = FALSE;",
+    """
+    CREATE TRIGGER update_translation_evals_insert
+    AFTER INSERT ON Rankings
+    FOR EACH ROW
+    BEGIN
+        UPDATE Translations
+        SET numEvals = (SELECT COUNT(*) FROM Rankings WHERE translationId = NEW.translationId)
+        WHERE id = NEW.translationId;
+    END
+    """,
+    """
+    CREATE TRIGGER update_translation_evals_delete
+    AFTER DELETE ON Rankings
+    FOR EACH ROW
+    BEGIN
+        UPDATE Translations
+        SET numEvals = (SELECT COUNT(*) FROM Rankings WHERE translationId = OLD.translationId)
+        WHERE id = OLD.translationId;
+    END
+    """,
+)
+
+MODELS = ("m1", "m2", "m3")
+
+
+def create_legacy_database(path: str, targets: int = 20, evaluations: int = 60) -> list[list[tuple]]:
+    """A database as the pre-versioning code left it; returns the evaluations as (model, rank, discarded) rows."""
+    rnd = random.Random(7)
+    conn = sqlite3.connect(path, isolation_level=None)
+    for statement in LEGACY_SCHEMA:
+        conn.execute(statement)
+    conn.execute("BEGIN")
+    translations = {}
+    for target_id in range(1, targets + 1):
+        conn.execute(
+            "INSERT INTO Targets(id, target, context1, context2) VALUES (?, ?, ?, ?)",
+            (target_id, f"target {target_id}", "before", "after"),
+        )
+        for model in MODELS:
+            cursor = conn.execute(
+                "INSERT INTO Translations(targetId, translation, model) VALUES (?, ?, ?)",
+                (target_id, f"{model} of {target_id}", model),
+            )
+            translations.setdefault(target_id, []).append((cursor.lastrowid, model))
+
+    history = []
+    for eval_id in range(1, evaluations + 1):
+        options = translations[rnd.randint(1, targets)]
+        ranks = rnd.sample(range(1, len(options) + 1), len(options))
+        rows = []
+        for (translation_id, model), rank in zip(options, ranks):
+            discarded = rnd.random() < 0.2
+            conn.execute(
+                "INSERT INTO Rankings(translationId, evalId, rank, discarded) VALUES (?, ?, ?, ?)",
+                (translation_id, eval_id, rank, discarded),
+            )
+            rows.append((model, rank, discarded))
+        history.append(rows)
+    conn.execute("COMMIT")
+    conn.close()
+    return history
+
+
+def schema(db) -> dict[str, set]:
+    """Tables with their columns, indexes and triggers with their definitions."""
+    with db.read_only() as cursor:
+        cursor.execute(
+            """
+            SELECT type, name, sql FROM sqlite_master
+            WHERE name NOT LIKE 'sqlite_%' AND name NOT LIKE '%Search_%' AND name != 'schema_version'
+            """
+        )
+        entries = cursor.fetchall()
+        tables = {}
+        for kind, name, _ in entries:
+            if kind == "table":
+                cursor.execute(f"SELECT name, type, \"notnull\", dflt_value, pk FROM pragma_table_info('{name}')")
+                tables[name] = sorted(cursor.fetchall())
+    normalized = {
+        (kind, name, " ".join(sql.split()) if sql else None) for kind, name, sql in entries if kind != "table"
+    }
+    return {"tables": tables, "other": normalized}
+
+
+def test_migrations_are_numbered_in_order():
+    assert [m.version for m in MIGRATIONS] == list(range(1, len(MIGRATIONS) + 1))
+
+
+def test_legacy_database_is_upgraded_with_its_data(workdir):
+    os.makedirs("data")
+    history = create_legacy_database(os.path.join("data", "translations.db"))
+
+    db = DBManager()
+    assert db.schema_version() == 0
+    assert db.migrate()
+    assert db.schema_version() == latest_version()
+
+    with db.read_only() as cursor:
+        cursor.execute("SELECT COUNT(*), SUM(numRankings) FROM Evaluations")
+        assert cursor.fetchone() == (len(history), sum(len(rows) for rows in history))
+        cursor.execute("SELECT COUNT(*) FROM Rankings")
+        rankings = cursor.fetchone()[0]
+        cursor.execute("SELECT SUM(numEvals), SUM(numTranslations) FROM Targets")
+        assert cursor.fetchone() == (len(history), 20 * len(MODELS))
+        cursor.execute("SELECT SUM(numEvals) FROM Translations")
+        assert cursor.fetchone()[0] == rankings
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND sql LIKE '%COUNT(*)%'")
+        assert cursor.fetchall() == []
+
+    # Counters match a full recount
+    with db.read_only() as cursor:
+        cursor.execute("SELECT id, numTranslations, numEvals, numRanked FROM Targets ORDER BY id")
+        counters = cursor.fetchall()
+    assert db.recount_num_evals()
+    with db.read_only() as cursor:
+        cursor.execute("SELECT id, numTranslations, numEvals, numRanked FROM Targets ORDER BY id")
+        assert cursor.fetchall() == counters
+
+    # Leaderboard summary tables hold the existing rankings
+    stats = db.get_model_stats()
+    shown = Counter(model for rows in history for model, _, _ in rows)
+    discarded = Counter(model for rows in history for model, _, d in rows if d)
+    rank_sums = Counter()
+    for rows in history:
+        for model, rank, d in rows:
+            if not d:
+                rank_sums[model] += rank
+    wins = Counter()
+    for rows in history:
+        wins.update(pairwise_wins(rows))
+    for entry in stats["models"]:
+        model = entry["model"]
+        assert entry["numShown"] == shown[model]
+        assert entry["numDiscarded"] == discarded[model]
+        assert entry["numRanked"] == shown[model] - discarded[model]
+        assert entry["meanRank"] == rank_sums[model] / (shown[model] - discarded[model])
+    assert {
+        (winner, loser): count for winner, row in stats["wins"].items() for loser, count in row.items()
+    } == dict(wins)
+
+    # Serves and records new evaluations
+    response = db.get_target_with_translations("alice")
+    assert response is not None
+    ranking = [
+        {"translationId": t["id"], "rank": i + 1, "discarded": False}
+        for i, t in enumerate(response["translations"])
+    ]
+    assert db.add_evaluation(ranking, "alice")
+    with db.read_only() as cursor:
+        cursor.execute("SELECT MAX(id), evaluator FROM Evaluations")
+        assert cursor.fetchone() == (len(history) + 1, "alice")
+    assert db.search("target", scope="targets")["results"]
+    db.close()
+
+
+def test_upgraded_schema_matches_a_new_database(workdir):
+    os.makedirs("data")
+    create_legacy_database(os.path.join("data", "legacy.db"))
+    legacy = DBManager("legacy.db")
+    assert legacy.migrate()
+    fresh = DBManager("fresh.db")
+    assert fresh.migrate()
+
+    assert schema(legacy) == schema(fresh)
+    legacy.close()
+    fresh.close()
+
+
+def test_migrate_is_idempotent(db):
+    assert db.migrate()
+    with db.read_only() as cursor:
+        cursor.execute("SELECT version FROM schema_version ORDER BY version")
+        assert [row[0] for row in cursor.fetchall()] == [m.version for m in MIGRATIONS]
+
+
+def test_migrations_apply_in_steps(workdir):
+    db = DBManager()
+    assert db.migrate(target=1)
+    assert db.schema_version() == 1
+    assert db.migrate()
+    assert db.schema_version() == latest_version()
+    assert db.load_example_data()
+    assert db.get_target_with_translations() is not None
+    db.close()
+
+
+def agreement_columns(db) -> tuple[list, list]:
+    with db.read_only() as cursor:
+        cursor.execute("SELECT id, agreement, agreementEvals, retired FROM Targets ORDER BY id")
+        targets = cursor.fetchall()
+        cursor.execute("SELECT id, rankSum FROM Translations ORDER BY id")
+        return targets, cursor.fetchall()
+
+
+def test_upgrade_computes_agreement_of_existing_rankings(workdir):
+    os.makedirs("data")
+    create_legacy_database(os.path.join("data", "translations.db"))
+    db = DBManager()
+    assert db.migrate(3)
+
+    # A target every evaluator ranked the same way, as often as retirement requires
+    evaluations = db.config["retirement"]["min_evals"]
+
+    def add_agreeing_target(cursor) -> int:
+        cursor.execute("INSERT INTO Targets(target, context1, context2) VALUES ('agreed', 'a', 'b')")
+        target_id = cursor.lastrowid
+        translation_ids = []
+        for model in MODELS:
+            cursor.execute(
+                "INSERT INTO Translations(targetId, translation, model) VALUES (?, ?, ?)",
+                (target_id, f"{model} agreed", model),
+            )
+            translation_ids.append(cursor.lastrowid)
+        for _ in range(evaluations):
+            cursor.execute(
+                "INSERT INTO Evaluations(targetId, numRankings, numRanked) VALUES (?, ?, ?)",
+                (target_id, len(MODELS), len(MODELS)),
+            )
+            cursor.executemany(
+                "INSERT INTO Rankings(translationId, evalId, rank, discarded) VALUES (?, ?, ?, FALSE)",
+                [(translation_id, cursor.lastrowid, rank) for rank, translation_id in enumerate(translation_ids, 1)],
+            )
+        return target_id
+
+    agreed = db.write(add_agreeing_target)
+    assert db.migrate()
+
+    targets, translations = agreement_columns(db)
+    by_id = {target_id: row for target_id, *row in targets}
+    assert by_id[agreed][0] == 1.0
+    assert by_id[agreed][1:] == [evaluations, 1]
+    assert sum(row[1] for row in by_id.values()) == 60 + evaluations
+    assert any(row[0] is not None for target_id, row in by_id.items() if target_id != agreed)
+    assert agreed not in {db.get_target_with_translations()["target"]["id"] for _ in range(30)}
+
+    # Same as recomputing from scratch
+    assert db.rebuild_agreement()
+    assert agreement_columns(db) == (targets, translations)
+    db.close()
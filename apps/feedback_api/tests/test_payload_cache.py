@@ -0,0 +1,125 @@
+import json
+
+import pytest
+
+from util import ShardRouter
+from util.payload_cache import PayloadCache
+
+
+def payload(target_id: int, text: str = "text") -> dict:
+    return {"target": {"id": target_id, "target": text}, "translations": []}
+
+
+def test_put_encodes_and_caches():
+    cache = PayloadCache(10)
+    etag, body = cache.put(1, payload(1), cache.token())
+    assert json.loads(body) == payload(1)
+    assert cache.get(1) == (etag, body)
+    # Same bytes, same ETag; changed payload, new ETag
+    assert PayloadCache(10).put(1, payload(1), 0)[0] == etag
+    assert cache.put(1, payload(1, "changed"), cache.token())[0] != etag
+
+
+def test_invalidate_drops_targets():
+    cache = PayloadCache(10)
+    for target_id in (1, 2, 3):
+        cache.put(target_id, payload(target_id), cache.token())
+    cache.invalidate([2])
+    assert cache.get(2) is None
+    assert cache.get(1) is not None and cache.get(3) is not None
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+def test_payload_read_before_invalidation_is_not_cached():
+    cache = PayloadCache(10)
+    token = cache.token()
+    # Target changed while its old payload was being read
+    cache.invalidate([1])
+    entry = cache.put(1, payload(1, "stale"), token)
+    assert entry is not None and cache.get(1) is None
+    # Other targets are not affected
+    cache.put(2, payload(2), token)
+    assert cache.get(2) is not None
+    # Read after the invalidation
+    cache.put(1, payload(1, "fresh"), cache.token())
+    assert json.loads(cache.get(1)[1])["target"]["target"] == "fresh"
+
+
+def test_stale_payload_is_not_cached_once_its_invalidation_is_forgotten():
+    cache = PayloadCache(2)
+    token = cache.token()
+    for target_id in (1, 2, 3):
+        cache.invalidate([target_id])
+    # Invalidation of 1 fell out of the bounded history, any older token is refused
+    cache.put(1, payload(1), token)
+    assert cache.get(1) is None
+
+
+def test_least_recently_used_is_evicted():
+    cache = PayloadCache(2)
+    cache.put(1, payload(1), cache.token())
+    cache.put(2, payload(2), cache.token())
+    cache.get(1)
+    cache.put(3, payload(3), cache.token())
+    assert cache.get(2) is None
+    assert cache.get(1) is not None and cache.get(3) is not None
+
+
+@pytest.fixture
+def client(workdir, monkeypatch):
+    import main
+
+    router = ShardRouter()
+    db = router.default
+    assert db.initialize_schema() and db.load_example_data()
+    monkeypatch.setattr(main, "router", router)
+    yield main.app.test_client(), db
+    router.close()
+
+
+def ranking(db, target_id: int) -> list[dict]:
+    with db.read_only() as cursor:
+        cursor.execute("SELECT id FROM Translations WHERE targetId = ? ORDER BY id", (target_id,))
+        return [
+            {"translationId": row[0], "rank": rank, "discarded": False}
+            for rank, row in enumerate(cursor.fetchall(), start=1)
+        ]
+
+
+def test_unchanged_target_is_revalidated(client):
+    client, db = client
+    response = client.get("/targets/1")
+    assert response.status_code == 200 and response.headers["ETag"]
+    assert response.get_json()["target"]["id"] == 1
+
+    again = client.get("/targets/1", headers={"If-None-Match": response.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.data == b""
+    assert again.headers["ETag"] == response.headers["ETag"]
+    assert client.get("/targets/9999").status_code == 404
+
+
+def test_new_translation_changes_the_etag(client):
+    client, db = client
+    etag = client.get("/targets/1").headers["ETag"]
+    assert db.add_translations([{"targetId": 1, "translation": "New", "model": "new-model"}])
+
+    response = client.get("/targets/1", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert "New" in [t["translation"] for t in response.get_json()["translations"]]
+
+
+def test_evaluation_changes_the_etag(client):
+    client, db = client
+    first = client.get("/targets/1")
+    other = client.get("/targets/2").headers["ETag"]
+    counts = [t["numEvals"] for t in first.get_json()["translations"]]
+    assert client.post("/submit_evaluation", json=ranking(db, 1)).status_code == 200
+
+    response = client.get("/targets/1", headers={"If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 200
+    assert [t["numEvals"] for t in response.get_json()["translations"]] == [c + 1 for c in counts]
+    # Other targets stay cached
+    assert client.get("/targets/2", headers={"If-None-Match": other}).status_code == 304
@@ -0,0 +1,121 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from util.base.pool import ConnectionPool
+
+PRAGMAS = {"mmap_size": 0, "cache_size": -2000}
+
+
+def make_pool(tmp_path, **options) -> ConnectionPool:
+    settings = {"size": 2, "lifetime": 600, "timeout": 1.0, "pragmas": PRAGMAS, **options}
+    return ConnectionPool(str(tmp_path / "pool.db"), **settings)
+
+
+def run_threads(count: int, target) -> None:
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_writer_is_reused_within_a_thread(tmp_path):
+    pool = make_pool(tmp_path)
+    assert pool.writer() is pool.writer()
+    assert len(pool._writers) == 1
+    pool.close()
+
+
+def test_writers_of_exited_threads_are_closed(tmp_path):
+    pool = make_pool(tmp_path)
+    connections = []
+
+    def request():
+        conn = pool.writer()
+        conn.execute("SELECT 1")
+        connections.append(conn)
+
+    run_threads(300, request)
+
+    assert len(pool._writers) == 0
+    for conn in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+    pool.close()
+
+
+def test_short_lived_request_threads_leave_no_writers(example_db):
+    # Leases are on, so every assignment takes the write path
+    assert example_db.config["assignment"]["lease_ttl"] > 0
+    # The writer of this thread, which loaded the data
+    writers = set(example_db._pool._writers)
+    results = []
+
+    def request():
+        results.append(example_db.get_target_with_translations("evaluator"))
+
+    run_threads(300, request)
+
+    assert all(result is not None for result in results)
+    assert example_db._pool._writers == writers
+
+
+def test_expired_writer_is_replaced_and_closed(tmp_path):
+    pool = make_pool(tmp_path, lifetime=0.01)
+    first = pool.writer()
+    time.sleep(0.02)
+    second = pool.writer()
+    assert second is not first
+    assert pool._writers == {second}
+    with pytest.raises(sqlite3.ProgrammingError):
+        first.execute("SELECT 1")
+    pool.close()
+
+
+def test_close_closes_writers_of_live_threads(tmp_path):
+    pool = make_pool(tmp_path)
+    opened = threading.Event()
+    release = threading.Event()
+    connections = []
+
+    def hold():
+        connections.append(pool.writer())
+        opened.set()
+        release.wait()
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    opened.wait()
+    pool.close()
+    assert len(pool._writers) == 0
+    with pytest.raises(sqlite3.ProgrammingError):
+        connections[0].execute("SELECT 1")
+    release.set()
+    thread.join()
+
+
+def test_readers_are_bounded_and_reused(tmp_path):
+    pool = make_pool(tmp_path, size=1, timeout=0.05)
+    pool.writer().execute("CREATE TABLE t (x)")
+    reader = pool.acquire_reader()
+    with pytest.raises(sqlite3.OperationalError):
+        pool.acquire_reader()
+    pool.release_reader(reader)
+    assert pool.acquire_reader() is reader
+    with pytest.raises(sqlite3.OperationalError):
+        reader.execute("INSERT INTO t VALUES (1)")
+    pool.release_reader(reader)
+    pool.close()
+
+
+def test_read_only_pool_has_no_writer(tmp_path):
+    writable = make_pool(tmp_path)
+    writable.writer().execute("CREATE TABLE t (x)")
+    pool = make_pool(tmp_path, read_only=True)
+    with pytest.raises(sqlite3.OperationalError):
+        pool.writer()
+    pool.close()
+    writable.close()
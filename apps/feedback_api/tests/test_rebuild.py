@@ -0,0 +1,105 @@
+import sqlite3
+
+import pytest
+
+from util.manager_mixins.migration import MigrationMixin
+from util.migrations import TableRebuild
+
+REBUILD = TableRebuild(
+    "Items",
+    """
+    CREATE TABLE {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        weight INTEGER NOT NULL DEFAULT 1
+    )
+    """,
+    indexes=("CREATE INDEX idx_items_name_weight ON {table}(name, weight)",),
+)
+
+
+@pytest.fixture
+def cursor():
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    cursor = conn.cursor()
+    MigrationMixin._create_migration_tables(cursor)
+    cursor.execute("CREATE TABLE Items (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL)")
+    cursor.execute("CREATE INDEX idx_items_name ON Items(name)")
+    cursor.execute("CREATE TABLE Log (itemId INTEGER)")
+    cursor.execute(
+        "CREATE TRIGGER log_items AFTER INSERT ON Items BEGIN INSERT INTO Log VALUES (NEW.id); END"
+    )
+    cursor.executemany("INSERT INTO Items (name) VALUES (?)", [(f"item-{i}",) for i in range(1, 26)])
+    yield cursor
+    conn.close()
+
+
+def rows(cursor, table: str = "Items") -> list[tuple]:
+    cursor.execute(f"SELECT id, name FROM {table} ORDER BY id")
+    return cursor.fetchall()
+
+
+def objects(cursor, kind: str) -> set[str]:
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = ? AND tbl_name = 'Items'", (kind,))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def test_rebuild_copies_rows_in_batches(cursor):
+    REBUILD.prepare(cursor)
+    copied = []
+    while rows_copied := REBUILD.copy_batch(cursor, 10):
+        copied.append(rows_copied)
+    assert copied == [10, 10, 5]
+    expected = rows(cursor)
+
+    REBUILD.swap(cursor)
+    assert rows(cursor) == expected
+    cursor.execute("SELECT DISTINCT weight FROM Items")
+    assert cursor.fetchall() == [(1,)]
+    assert objects(cursor, "index") == {"idx_items_name_weight"}
+    cursor.execute("SELECT COUNT(*) FROM schema_rebuilds")
+    assert cursor.fetchone() == (0,)
+
+
+def test_writes_during_the_rebuild_are_mirrored(cursor):
+    REBUILD.prepare(cursor)
+    REBUILD.copy_batch(cursor, 10)
+    # Behind and ahead of the batch cursor
+    cursor.execute("UPDATE Items SET name = 'renamed' WHERE id IN (3, 20)")
+    cursor.execute("DELETE FROM Items WHERE id IN (4, 21)")
+    cursor.execute("INSERT INTO Items (name) VALUES ('new')")
+    while REBUILD.copy_batch(cursor, 10):
+        pass
+    expected = rows(cursor)
+
+    REBUILD.swap(cursor)
+    assert rows(cursor) == expected
+    assert (3, "renamed") in expected and (26, "new") in expected
+
+
+def test_interrupted_rebuild_resumes(cursor):
+    REBUILD.prepare(cursor)
+    REBUILD.copy_batch(cursor, 10)
+    # Restarted: prepare() again keeps the copy and its progress
+    REBUILD.prepare(cursor)
+    cursor.execute("SELECT lastRowid FROM schema_rebuilds WHERE tableName = 'Items'")
+    assert cursor.fetchone() == (10,)
+    assert REBUILD.copy_batch(cursor, 100) == 15
+    REBUILD.swap(cursor)
+    assert len(rows(cursor)) == 25
+
+
+def test_swap_keeps_triggers_and_autoincrement(cursor):
+    cursor.execute("DELETE FROM Items WHERE id > 20")
+    REBUILD.prepare(cursor)
+    while REBUILD.copy_batch(cursor, 10):
+        pass
+    REBUILD.swap(cursor)
+
+    assert objects(cursor, "trigger") == {"log_items"}
+    cursor.execute("DELETE FROM Log")
+    cursor.execute("INSERT INTO Items (name) VALUES ('after')")
+    # Ids 21-25 were handed out before the rebuild
+    assert cursor.lastrowid == 26
+    cursor.execute("SELECT itemId FROM Log")
+    assert cursor.fetchall() == [(26,)]
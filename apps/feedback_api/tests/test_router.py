@@ -0,0 +1,97 @@
+import json
+import sqlite3
+
+import pytest
+
+from util import ShardRouter
+from util.router import UnknownShardError
+
+
+def attach_limit() -> int:
+    conn = sqlite3.connect(":memory:")
+    try:
+        return conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    finally:
+        conn.close()
+
+
+def fill(db, model_pairs: int) -> None:
+    """One target with translations of m1 and m2, evaluated `model_pairs` times with m1 first."""
+    assert db.add_targets([{"context1": "a", "target": "t", "context2": "b"}])
+    assert db.add_translations(
+        [{"targetId": 1, "translation": text, "model": text} for text in ("m1", "m2")]
+    )
+    for _ in range(model_pairs):
+        assert db.add_evaluation(
+            [
+                {"translationId": 1, "rank": 1, "discarded": False},
+                {"translationId": 2, "rank": 2, "discarded": False},
+            ]
+        )
+
+
+@pytest.fixture
+def router(workdir):
+    router = ShardRouter()
+    assert router.default.initialize_schema()
+    yield router
+    router.close()
+
+
+@pytest.fixture
+def many_shards(router):
+    """More projects than SQLite can attach to one connection, each with one evaluation."""
+    keys = [f"p{i:02d}" for i in range(attach_limit() + 2)]
+    for key in keys:
+        fill(router.get(key, create=True), 1)
+    return keys
+
+
+def test_unknown_projects_are_refused(router):
+    with pytest.raises(UnknownShardError):
+        router.get("missing")
+    with pytest.raises(UnknownShardError):
+        router.get("../escape", create=True)
+    with pytest.raises(UnknownShardError):
+        router.get_export_watermarks(["missing"])
+
+
+def test_shards_are_separate_databases(router):
+    fill(router.get("en-fr", create=True), 2)
+    fill(router.get("en-de", create=True), 1)
+
+    assert router.keys() == ["default", "en-de", "en-fr"]
+    assert router.get_export_watermarks() == {"default": 0, "en-de": 1, "en-fr": 2}
+    stats = router.get_model_stats(["en-fr", "en-de"])
+    assert stats["wins"] == {"m1": {"m2": 3}}
+
+
+def test_attach_groups_stay_under_the_limit(router, many_shards):
+    groups = router.attach_groups()
+    assert [key for group in groups for key in group] == router.keys()
+    assert len(groups) == 2
+    assert all(len(group) <= attach_limit() for group in groups)
+
+
+def test_model_stats_over_more_shards_than_can_be_attached(router, many_shards):
+    stats = router.get_model_stats()
+
+    assert stats is not None
+    assert stats["wins"] == {"m1": {"m2": len(many_shards)}}
+    assert {m["model"]: m["numShown"] for m in stats["models"]} == {
+        "m1": len(many_shards),
+        "m2": len(many_shards),
+    }
+
+
+def test_export_over_more_shards_than_can_be_attached(router, many_shards):
+    until = router.get_export_watermarks()
+    assert until == {"default": 0, **{key: 1 for key in many_shards}}
+
+    lines = "".join(router.export_rankings("jsonl", until=until)).splitlines()
+    rows = [json.loads(line) for line in lines]
+    assert sorted({row["project"] for row in rows}) == many_shards
+    assert len(rows) == 2 * len(many_shards)
+
+    # Nothing new since the watermarks
+    assert "".join(router.export_rankings("jsonl", since=until, until=until)) == ""
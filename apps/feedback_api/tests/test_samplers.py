@@ -0,0 +1,144 @@
+import math
+
+import pytest
+
+from util.samplers import (
+    EXACT_COMPARISONS,
+    CountSampler,
+    PosteriorSampler,
+    Sampler,
+    ThompsonSampler,
+    UncertaintySampler,
+    expected_gain,
+    make_sampler,
+    misorder_probability,
+    preference_probability,
+)
+
+
+def ranked(*translation_ids: int) -> list[tuple[int, int, bool]]:
+    """Rankings of an evaluation that ranks the translations in the given order."""
+    return [(translation_id, rank, False) for rank, translation_id in enumerate(translation_ids, start=1)]
+
+
+def test_count_sampler_serves_least_evaluated_then_oldest():
+    sampler = CountSampler()
+    assert sampler.peek() is None
+    for target_id, count in ((1, 2), (2, 0), (3, 1), (4, 0)):
+        sampler.push(target_id, count)
+    assert sampler.peek_many(10) == [2, 4, 3, 1]
+    assert sampler.peek() == 2
+
+    # Requeued with a new count
+    sampler.push(2, 3)
+    assert sampler.peek_many(10) == [4, 3, 1, 2]
+    sampler.remove(4)
+    sampler.remove(99)
+    assert sampler.peek() == 3
+    # A count lower than any seen so far
+    sampler.push(5, -1)
+    assert sampler.peek_many(2) == [5, 3]
+    assert len(sampler) == 4
+
+
+def test_count_sampler_peek_leaves_targets_queued():
+    sampler = CountSampler()
+    sampler.push(1, 0)
+    assert sampler.peek() == sampler.peek() == 1
+    sampler.forget(1)
+    assert sampler.peek() is None and len(sampler) == 0
+
+
+def test_preference_probability():
+    assert preference_probability(1, 1) == pytest.approx(0.5)
+    assert preference_probability(3, 3) == pytest.approx(0.5)
+    assert preference_probability(5, 2) == pytest.approx(1 - preference_probability(2, 5))
+    assert preference_probability(5, 2) > 0.5 > preference_probability(2, 5)
+    # Past EXACT_COMPARISONS the normal approximation is close to the binomial tail
+    alpha, beta = EXACT_COMPARISONS // 2 + 10, EXACT_COMPARISONS // 2 - 5
+    n = alpha + beta - 1
+    exact = sum(math.comb(n, k) for k in range(alpha)) / 2**n
+    assert preference_probability(alpha, beta) == pytest.approx(exact, abs=0.01)
+    assert misorder_probability(9, 1) == pytest.approx(1 - preference_probability(9, 1))
+
+
+def test_expected_gain_shrinks_with_evidence():
+    # Close calls tell less with every comparison, settled pairs nothing
+    assert expected_gain(1, 1) > expected_gain(3, 3) > expected_gain(10, 10) > expected_gain(40, 40) > 0
+    assert expected_gain(10, 1) == pytest.approx(0)
+
+
+def test_uncertainty_sampler_serves_uncompared_pairs_first():
+    sampler = UncertaintySampler()
+    for target_id in (1, 2):
+        sampler.set_translations(target_id, [10 * target_id, 10 * target_id + 1])
+    for _ in range(20):
+        sampler.observe(1, ranked(10, 11))
+    sampler.push(1, 20)
+    sampler.push(2, 20)
+    assert sampler.peek() == 2
+    assert sampler.peek_many(5) == [2, 1]
+
+    # Evaluating target 2 just as much makes the least evaluated one come first
+    for _ in range(20):
+        sampler.observe(2, ranked(21, 20))
+    sampler.push(2, 21)
+    assert sampler.peek_many(5) == [1, 2]
+    assert len(sampler) == 2
+
+
+def test_posterior_sampler_drops_stale_entries():
+    sampler = UncertaintySampler()
+    for target_id in range(100):
+        sampler.set_translations(target_id, [2 * target_id, 2 * target_id + 1])
+    for _ in range(10):
+        for target_id in range(100):
+            sampler.push(target_id, 0)
+    assert len(sampler._heap) <= 2 * len(sampler) + 64
+    peeked = sampler.peek_many(100)
+    assert sorted(peeked) == list(range(100))
+
+    sampler.remove(peeked[0])
+    sampler.forget(peeked[1])
+    assert peeked[0] not in sampler.peek_many(100)
+    assert peeked[1] not in sampler._pairs
+    assert len(sampler) == 98
+
+
+def test_thompson_sampler_is_reproducible_with_a_seed():
+    def order(seed: int) -> list[int]:
+        sampler = ThompsonSampler(seed)
+        for target_id in range(20):
+            sampler.set_translations(target_id, [1, 2, 3])
+            for _ in range(target_id % 4):
+                sampler.observe(target_id, ranked(1, 2, 3))
+            sampler.push(target_id, 0)
+        return sampler.peek_many(20)
+
+    assert order(7) == order(7)
+    assert sorted(order(7)) == list(range(20))
+
+
+def test_make_sampler():
+    assert isinstance(make_sampler("count"), CountSampler)
+    assert isinstance(make_sampler("uncertainty", seed=1), UncertaintySampler)
+    assert make_sampler("thompson").uses_rankings
+    with pytest.raises(ValueError):
+        make_sampler("random")
+
+
+def test_incomplete_samplers_cannot_be_instantiated():
+    class NoPeekMany(Sampler):
+        push = CountSampler.push
+        remove = CountSampler.remove
+        peek = CountSampler.peek
+
+    class NoScore(PosteriorSampler):
+        pass
+
+    with pytest.raises(TypeError, match="peek_many"):
+        NoPeekMany()
+    with pytest.raises(TypeError, match="score"):
+        NoScore()
+    with pytest.raises(TypeError):
+        Sampler()
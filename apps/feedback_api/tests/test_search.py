@@ -0,0 +1,176 @@
+import pytest
+
+from util import ShardRouter
+from util.manager_mixins.search import match_expression
+
+MODELS = ("m1", "m2", "m3", "m4")
+TARGETS = 300
+
+
+@pytest.fixture
+def corpus(db):
+    """Targets mentioning "apple" every third one, translations of 4 models, a few evaluations."""
+    assert db.add_targets(
+        [
+            {
+                "context1": "before",
+                "target": f"target {i} {'apple' if i % 3 == 0 else 'pear'}",
+                "context2": "after",
+            }
+            for i in range(1, TARGETS + 1)
+        ]
+    )
+    assert db.add_translations(
+        [
+            {
+                "targetId": target_id,
+                "translation": f"{'apple' if (target_id + i) % 2 else 'pomme'} by {model}",
+                "model": model,
+            }
+            for target_id in range(1, TARGETS + 1)
+            for i, model in enumerate(MODELS[: 1 + target_id % len(MODELS)])
+        ]
+    )
+    with db.read_only() as cursor:
+        cursor.execute("SELECT targetId, id FROM Translations WHERE targetId % 5 = 0 ORDER BY id")
+        translations = cursor.fetchall()
+    by_target = {}
+    for target_id, translation_id in translations:
+        by_target.setdefault(target_id, []).append(translation_id)
+    for target_id, translation_ids in by_target.items():
+        for _ in range(target_id % 3):
+            assert db.add_evaluation(
+                [
+                    {"translationId": translation_id, "rank": rank, "discarded": False}
+                    for rank, translation_id in enumerate(translation_ids, start=1)
+                ]
+            )
+    return db
+
+
+def all_pages(db, query: str, limit: int, after: int = 0, **options) -> tuple[list[int], int]:
+    """Ids of every result after `after`, following `next`, and the number of pages."""
+    ids, pages = [], 0
+    while True:
+        page = db.search(query, after=after, limit=limit, **options)
+        pages += 1
+        ids += [result["id"] for result in page["results"]]
+        assert len(page["results"]) <= limit
+        if page["next"] is None:
+            return ids, pages
+        after = page["next"]
+
+
+def expected(db, scope: str, model=None, min_evals=None, max_evals=None) -> list[int]:
+    """Ids matching "apple" and the filters, without the search index."""
+    if scope == "targets":
+        sql = "SELECT id FROM Targets WHERE ' ' || target || ' ' LIKE '% apple %'"
+        if model is not None:
+            sql += " AND EXISTS (SELECT 1 FROM Translations WHERE targetId = Targets.id AND model = :model)"
+    else:
+        sql = "SELECT id FROM Translations WHERE translation LIKE 'apple %'"
+        if model is not None:
+            sql += " AND model = :model"
+    if min_evals is not None:
+        sql += " AND numEvals >= :min_evals"
+    if max_evals is not None:
+        sql += " AND numEvals <= :max_evals"
+    with db.read_only() as cursor:
+        cursor.execute(sql + " ORDER BY id", {"model": model, "min_evals": min_evals, "max_evals": max_evals})
+        return [row[0] for row in cursor.fetchall()]
+
+
+@pytest.mark.parametrize(
+    "text, expression",
+    [
+        ("apple pear", '"apple" "pear"'),
+        ('say "hi"', '"say" """hi"""'),
+        ("NEAR(a b)", '"NEAR(a" "b)"'),
+        ("AND OR NOT", '"AND" "OR" "NOT"'),
+        ("appl* -pear", '"appl"* "-pear"'),
+        ("col: word ^start", '"col:" "word" "^start"'),
+        ("- * ... ! apple", '"apple"'),
+    ],
+)
+def test_match_expression_quotes_fts5_syntax(text, expression):
+    assert match_expression(text) == expression
+
+
+@pytest.mark.parametrize("text", ["", "   ", "- * ...", '""'])
+def test_match_expression_rejects_queries_without_words(text):
+    with pytest.raises(ValueError):
+        match_expression(text)
+
+
+def test_operators_in_queries_are_searched_as_text(db):
+    assert db.add_targets(
+        [
+            {"context1": "a", "target": 'He said "NEAR" and left', "context2": "b"},
+            {"context1": "a", "target": "Not this, or that: well-known", "context2": "b"},
+        ]
+    )
+    for query in ('"NEAR"', "NEAR(", "said*", "NOT", "OR", "well-known", "that:", "-left"):
+        assert db.search(query)["results"], query
+    assert [r["id"] for r in db.search("said NEAR")["results"]] == [1]
+    assert db.search("NOT left")["results"] == []
+    # The same syntax is an operator in a raw query
+    assert [r["id"] for r in db.search("said NOT well", raw=True)["results"]] == [1]
+    with pytest.raises(ValueError):
+        db.search("NEAR(", raw=True)
+
+
+@pytest.mark.parametrize("scope", ["targets", "translations"])
+@pytest.mark.parametrize("limit", [1, 7, 100])
+def test_pages_neither_skip_nor_repeat(corpus, scope, limit):
+    ids, pages = all_pages(corpus, "apple", limit, scope=scope)
+    assert ids == expected(corpus, scope)
+    assert pages == -(-len(ids) // limit)
+
+
+def test_rows_added_between_pages_are_found_once(corpus):
+    first = corpus.search("apple", limit=10)
+    assert corpus.add_targets([{"context1": "a", "target": "late apple", "context2": "b"}])
+    rest, _ = all_pages(corpus, "apple", 10, after=first["next"])
+    combined = [r["id"] for r in first["results"]] + rest
+    assert combined == expected(corpus, "targets")
+    assert combined[-1] == TARGETS + 1
+
+
+@pytest.mark.parametrize(
+    "scope, filters",
+    [
+        ("targets", {"model": "m4"}),
+        ("targets", {"min_evals": 1}),
+        ("targets", {"model": "m2", "max_evals": 0}),
+        ("translations", {"model": "m3"}),
+        ("translations", {"model": "m1", "min_evals": 2, "max_evals": 2}),
+        ("translations", {"model": "unknown"}),
+    ],
+)
+@pytest.mark.parametrize("max_scan", [10_000, 40])
+def test_filtered_pages_match_the_unindexed_filter(corpus, scope, filters, max_scan):
+    corpus.config["search"]["max_scan"] = max_scan
+    ids, _ = all_pages(corpus, "apple", 7, scope=scope, **filters)
+    assert ids == expected(corpus, scope, **filters)
+
+
+def test_selective_filter_gives_short_pages_instead_of_scanning_everything(corpus):
+    corpus.config["search"]["max_scan"] = 40
+    page = corpus.search("apple", scope="translations", model="unknown", limit=7)
+    assert page["results"] == [] and page["next"] is not None
+    ids, pages = all_pages(corpus, "apple", 7, scope="translations", model="unknown")
+    assert ids == []
+    assert pages == -(-len(expected(corpus, "translations")) // 40)
+
+
+def test_projects_are_searched_separately(workdir):
+    router = ShardRouter()
+    try:
+        assert router.default.initialize_schema()
+        fruit = router.get("fruit", create=True)
+        assert fruit.add_targets([{"context1": "a", "target": "apple pie", "context2": "b"}])
+        assert router.default.add_targets([{"context1": "a", "target": "apple tart", "context2": "b"}])
+        assert [r["target"] for r in fruit.search("apple")["results"]] == ["<mark>apple</mark> pie"]
+        assert [r["target"] for r in router.default.search("apple")["results"]] == ["<mark>apple</mark> tart"]
+    finally:
+        router.close()
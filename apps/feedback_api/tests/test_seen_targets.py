@@ -0,0 +1,118 @@
+import random
+
+import pytest
+
+from util.seen_targets import ARRAY_MAX, CHUNK_BITS, SMALL_MAX, SeenTargets, TargetBitmap
+
+
+def evaluate(db, target_id: int, evaluator: str) -> None:
+    with db.read_only() as cursor:
+        cursor.execute("SELECT id FROM Translations WHERE targetId = ? ORDER BY id", (target_id,))
+        translation_ids = [row[0] for row in cursor.fetchall()]
+    ranking = [
+        {"translationId": translation_id, "rank": rank, "discarded": False}
+        for rank, translation_id in enumerate(translation_ids, start=1)
+    ]
+    assert db.add_evaluation(ranking, evaluator)
+
+
+def translated_targets(db) -> list[int]:
+    with db.read_only() as cursor:
+        cursor.execute("SELECT id FROM Targets WHERE numTranslations > 0 ORDER BY id")
+        return [row[0] for row in cursor.fetchall()]
+
+
+@pytest.mark.parametrize(
+    "ids",
+    [
+        [],
+        [7],
+        list(range(0, 10 * SMALL_MAX, 10)[:SMALL_MAX]),
+        # One more than fits the small array, spread over chunks
+        [i << CHUNK_BITS | i for i in range(SMALL_MAX + 1)],
+        # An array chunk at its limit and a bitmap chunk just past it
+        list(range(ARRAY_MAX)) + list(range(1 << CHUNK_BITS, (1 << CHUNK_BITS) + ARRAY_MAX + 1)),
+        random.Random(1).sample(range(1 << 24), 20_000),
+    ],
+    ids=["empty", "one", "small", "chunks", "array-and-bitmap", "random"],
+)
+def test_bitmap_matches_a_set_and_round_trips(ids):
+    expected = set(ids)
+    bitmap = TargetBitmap(ids)
+    assert len(bitmap) == len(expected)
+    assert all(target_id in bitmap for target_id in ids)
+    probes = random.Random(2).sample(range(1 << 24), 2_000)
+    assert [p in bitmap for p in probes] == [p in expected for p in probes]
+
+    restored = TargetBitmap.from_bytes(bitmap.to_bytes())
+    assert len(restored) == len(bitmap)
+    assert all(target_id in restored for target_id in ids)
+    assert [p in restored for p in probes] == [p in bitmap for p in probes]
+    assert restored.to_bytes() == bitmap.to_bytes()
+
+
+def test_serialization_does_not_depend_on_insertion_order():
+    ids = list(range(0, 5 * ARRAY_MAX, 3))
+    shuffled = ids[:]
+    random.Random(3).shuffle(shuffled)
+    assert TargetBitmap(ids).to_bytes() == TargetBitmap(shuffled).to_bytes()
+
+
+def test_add_reports_new_ids():
+    bitmap = TargetBitmap()
+    assert bitmap.add(5)
+    assert not bitmap.add(5)
+    for target_id in range(ARRAY_MAX + 1):
+        bitmap.add(target_id)
+    # Now a bitmap chunk
+    assert not bitmap.add(5)
+    assert len(bitmap) == ARRAY_MAX + 1
+
+
+def test_bitmap_chunks_stay_bounded():
+    dense = TargetBitmap(range(1 << CHUNK_BITS))
+    assert len(dense.to_bytes()) <= (1 << CHUNK_BITS) // 8 + 16
+    sparse = TargetBitmap(range(0, 2 * ARRAY_MAX, 2))
+    assert len(sparse.to_bytes()) <= 2 * ARRAY_MAX + 16
+
+
+def test_changed_evaluators_are_taken_once():
+    seen = SeenTargets()
+    seen.add("ana", 1)
+    seen.apply([("ana", 1), ("ben", 2)], eval_id=9)
+    assert seen.eval_id == 9
+    assert seen.pending == 2
+    changed = dict(seen.take_changed())
+    assert set(changed) == {"ana", "ben"}
+    assert list(TargetBitmap.from_bytes(changed["ben"]).to_bytes()) == list(changed["ben"])
+    assert seen.take_changed() == []
+    assert seen.pending == 0
+
+
+def test_seen_targets_survive_a_reload(example_db):
+    first, second, third = translated_targets(example_db)
+    evaluate(example_db, first, "ana")
+    evaluate(example_db, second, "ana")
+    evaluate(example_db, first, "ben")
+    assert example_db.checkpoint_seen_targets()
+    # After the checkpoint, replayed from the evaluations on load
+    evaluate(example_db, third, "ana")
+
+    example_db.invalidate_seen_targets()
+    ana, ben = example_db.seen_by("ana"), example_db.seen_by("ben")
+    assert (len(ana), len(ben)) == (3, 1)
+    assert [target_id in ben for target_id in (first, second, third)] == [True, False, False]
+    assert example_db.seen_by("nobody") is None
+    assert example_db.seen_by(None) is None
+
+
+def test_evaluators_are_not_served_what_they_have_seen(example_db):
+    served = set()
+    for _ in translated_targets(example_db):
+        payload = example_db.get_target_with_translations("ana")
+        target_id = payload["target"]["id"]
+        assert target_id not in served
+        served.add(target_id)
+        evaluate(example_db, target_id, "ana")
+    assert example_db.get_target_with_translations("ana") is None
+    assert example_db.get_target_with_translations("ben") is not None
@@ -0,0 +1,164 @@
+import os
+import sqlite3
+
+import pytest
+
+from test_migrations import create_legacy_database
+from util import DBManager
+from util.manager_mixins.snapshot import PARTIAL_SUFFIX
+from util.migrations import latest_version
+from util.snapshots import SNAPSHOT_FAILURES, SnapshotScheduler
+
+
+def counts(db) -> dict[str, int]:
+    with db.read_only() as cursor:
+        result = {}
+        for table in ("Targets", "Translations", "Evaluations", "Rankings"):
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            result[table] = cursor.fetchone()[0]
+        return result
+
+
+def evaluate(db, target_id: int) -> None:
+    with db.read_only() as cursor:
+        cursor.execute("SELECT id FROM Translations WHERE targetId = ? ORDER BY id", (target_id,))
+        ranking = [
+            {"translationId": row[0], "rank": rank, "discarded": False}
+            for rank, row in enumerate(cursor.fetchall(), start=1)
+        ]
+    assert db.add_evaluation(ranking)
+
+
+def test_restore_brings_back_the_snapshot(example_db):
+    db = example_db
+    before = counts(db)
+    snapshot = db.create_snapshot()
+    assert snapshot is not None and snapshot["bytes"] > 0
+    assert os.stat(snapshot["path"]).st_mode & 0o222 == 0
+
+    evaluate(db, 1)
+    assert db.clear_all_tables()
+    assert counts(db)["Targets"] == 0
+
+    assert db.restore_snapshot()
+    assert counts(db) == before
+    assert db.schema_version() == latest_version()
+    # Still writable, counters maintained
+    evaluate(db, 1)
+    assert counts(db)["Evaluations"] == before["Evaluations"] + 1
+
+
+def test_snapshot_opens_read_only(example_db):
+    db = example_db
+    db.create_snapshot()
+    evaluate(db, 1)
+    snapshot = db.open_snapshot()
+    try:
+        assert counts(snapshot)["Evaluations"] == counts(db)["Evaluations"] - 1
+        with pytest.raises(sqlite3.Error, match="read-only"):
+            with snapshot.transaction() as cursor:
+                cursor.execute("DELETE FROM Targets")
+    finally:
+        snapshot.close()
+
+
+def test_restore_migrates_an_older_snapshot(workdir):
+    os.makedirs("data")
+    history = create_legacy_database(os.path.join("data", "translations.db"))
+    db = DBManager()
+    assert db.schema_version() == 0
+    assert db.create_snapshot() is not None
+
+    assert db.migrate()
+    assert db.clear_all_tables()
+    assert db.restore_snapshot()
+    assert db.schema_version() == latest_version()
+    assert counts(db)["Evaluations"] == len(history)
+    with db.read_only() as cursor:
+        cursor.execute("SELECT SUM(numEvals), SUM(agreementEvals) FROM Targets")
+        assert cursor.fetchone() == (len(history), len(history))
+    db.close()
+
+
+def test_partial_snapshots_are_never_listed(example_db, monkeypatch):
+    db = example_db
+    complete = db.create_snapshot()
+    stray = os.path.join(db.snapshot_dir, "99999999T000000000000Z.db" + PARTIAL_SUFFIX)
+    with open(stray, "wb") as f:
+        f.write(b"incomplete")
+
+    assert [s["name"] for s in db.list_snapshots()] == [complete["name"]]
+    assert db._snapshot_path("latest") == complete["path"]
+    with pytest.raises(FileNotFoundError):
+        db._snapshot_path(os.path.basename(stray))
+
+    # A copy that fails leaves no partial file behind
+    def fail(path: str) -> dict:
+        with open(path, "wb") as f:
+            f.write(b"half")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(db, "_copy_database", fail)
+    assert db.create_snapshot() is None
+    assert sorted(os.listdir(db.snapshot_dir)) == [complete["name"], os.path.basename(stray)]
+
+
+def test_prune_keeps_the_newest(example_db):
+    db = example_db
+    names = [db.create_snapshot()["name"] for _ in range(4)]
+    assert names == sorted(names)
+    assert db.prune_snapshots(2) == 2
+    assert [s["name"] for s in db.list_snapshots()] == names[2:]
+    assert db.prune_snapshots(2) == 0
+    db.config["snapshots"]["keep"] = 1
+    assert db.prune_snapshots() == 1
+    assert [s["name"] for s in db.list_snapshots()] == names[3:]
+
+
+@pytest.mark.parametrize("backend", ["sql", "index"])
+def test_restore_invalidates_cache_and_index(example_db, backend):
+    db = example_db
+    db.config["assignment"]["backend"] = backend
+    db.config["assignment"]["lease_ttl"] = 0
+    db.create_snapshot()
+
+    assert db.add_targets([{"context1": "a", "target": "after the snapshot", "context2": "b"}])
+    new_target = counts(db)["Targets"]
+    assert db.add_translations(
+        [
+            {"targetId": new_target, "translation": "late", "model": "m1"},
+            {"targetId": 1, "translation": "late", "model": "m1"},
+        ]
+    )
+    # Cached and indexed with the new rows
+    assert "late" in db.get_cached_target(1)[1].decode()
+    assert db.get_target_with_translations()["target"]["id"] == new_target
+
+    assert db.restore_snapshot()
+    assert "late" not in db.get_cached_target(1)[1].decode()
+    assert db.get_cached_target(new_target) is None
+    served = {db.get_target_with_translations()["target"]["id"] for _ in range(5)}
+    assert new_target not in served
+
+
+def test_scheduler_snapshots_and_prunes(example_db):
+    db = example_db
+    scheduler = SnapshotScheduler(lambda: [db], interval=3600, keep=2)
+    try:
+        for _ in range(3):
+            scheduler.run_once()
+        assert len(db.list_snapshots()) == 2
+    finally:
+        scheduler.close()
+
+
+def test_scheduler_counts_failures(example_db, monkeypatch):
+    db = example_db
+    monkeypatch.setattr(db, "create_snapshot", lambda: None)
+    failures = SNAPSHOT_FAILURES.value()
+    scheduler = SnapshotScheduler(lambda: [db], interval=3600, keep=2)
+    try:
+        scheduler.run_once()
+    finally:
+        scheduler.close()
+    assert SNAPSHOT_FAILURES.value() == failures + 1
@@ -0,0 +1,99 @@
+import random
+
+import pytest
+
+from util.manager_mixins.stats import pairwise_wins
+
+MODELS = ["model-a", "model-b", "model-c", "model-d"]
+
+
+def summary(db) -> tuple[list, list]:
+    with db.read_only() as cursor:
+        cursor.execute("SELECT * FROM ModelStats ORDER BY model")
+        stats = cursor.fetchall()
+        cursor.execute("SELECT * FROM ModelWins ORDER BY winner, loser")
+        wins = cursor.fetchall()
+    return stats, wins
+
+
+@pytest.fixture
+def evaluated_db(example_db):
+    """
+    The example data plus targets where a model may translate twice, with
+    evaluations that rank some translations and discard the others.
+    """
+    db = example_db
+    rng = random.Random(7)
+    assert db.add_targets(
+        [{"context1": "", "target": f"Sentence {i}.", "context2": ""} for i in range(6)]
+    )
+    with db.read_only() as cursor:
+        cursor.execute("SELECT id FROM Targets ORDER BY id DESC LIMIT 6")
+        target_ids = sorted(row[0] for row in cursor.fetchall())
+    assert db.add_translations(
+        [
+            {"targetId": target_id, "translation": f"Translation {i}.", "model": rng.choice(MODELS)}
+            for target_id in target_ids
+            for i in range(rng.randint(2, 5))
+        ]
+    )
+
+    with db.read_only() as cursor:
+        cursor.execute("SELECT targetId, id FROM Translations ORDER BY id")
+        translations: dict[int, list[int]] = {}
+        for target_id, translation_id in cursor.fetchall():
+            translations.setdefault(target_id, []).append(translation_id)
+
+    for _ in range(60):
+        translation_ids = translations[rng.choice(sorted(translations))]
+        shown = rng.sample(translation_ids, rng.randint(1, len(translation_ids)))
+        ranks = rng.sample(range(1, len(shown) + 1), len(shown))
+        evaluation = [
+            # Discarded translations keep a rank, all of them may share it
+            {"translationId": translation_id, "rank": 1 if discarded else rank, "discarded": discarded}
+            for translation_id, rank in zip(shown, ranks)
+            for discarded in [rng.random() < 0.3]
+        ]
+        assert db.add_evaluation(evaluation, rng.choice(["alice", "bob", None]))
+    return db
+
+
+def test_pairwise_wins():
+    wins = pairwise_wins(
+        [("a", 2, False), ("b", 1, False), ("a", 3, False), ("c", 1, True), ("d", 1, True)]
+    )
+    # a ranked twice only beats the other models, discarded ones tie
+    assert wins == {
+        ("b", "a"): 2,
+        ("a", "c"): 2,
+        ("a", "d"): 2,
+        ("b", "c"): 1,
+        ("b", "d"): 1,
+    }
+
+
+def test_rebuild_matches_incremental_counters(evaluated_db):
+    pytest.importorskip("numpy")
+    db = evaluated_db
+    stats, wins = summary(db)
+    assert {row[0] for row in stats} >= set(MODELS)
+    assert any(row[3] for row in stats)  # Some translations were discarded
+
+    assert db.rebuild_model_stats()
+    assert summary(db) == (stats, wins)
+
+
+def test_rebuild_restores_cleared_counters(evaluated_db):
+    pytest.importorskip("numpy")
+    db = evaluated_db
+    expected = summary(db)
+    leaderboard = db.get_model_stats()
+
+    with db.transaction() as cursor:
+        cursor.execute("DELETE FROM ModelStats")
+        cursor.execute("UPDATE ModelWins SET wins = wins + 1")
+
+    # Fetched in chunks smaller than the table
+    assert db.rebuild_model_stats(fetch_size=7)
+    assert summary(db) == expected
+    assert db.get_model_stats() == leaderboard
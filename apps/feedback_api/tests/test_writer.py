@@ -0,0 +1,168 @@
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from util.writer import _STOP, WriteQueue
+
+
+@pytest.fixture
+def queue(db):
+    db.write(lambda cursor: cursor.execute("CREATE TABLE Items (name TEXT UNIQUE NOT NULL)"))
+    writer = WriteQueue(db, max_batch=64)
+    yield writer
+    writer.close()
+
+
+def hold_writer(queue: WriteQueue) -> tuple[threading.Thread, threading.Event]:
+    """Keep the writer in an operation until the returned event is set."""
+    started, gate = threading.Event(), threading.Event()
+
+    def hold(cursor: sqlite3.Cursor) -> None:
+        started.set()
+        gate.wait(5)
+
+    busy = threading.Thread(target=queue.submit, args=(hold,))
+    busy.start()
+    started.wait(5)
+    return busy, gate
+
+
+def submit_all(queue: WriteQueue, operations: list) -> list:
+    """
+    Submit operations from one thread each, queued while the writer is busy
+    so they are committed as one batch. (result, error) per operation.
+    """
+    outcomes = [None] * len(operations)
+    busy, gate = hold_writer(queue)
+
+    def submit(i: int) -> None:
+        try:
+            outcomes[i] = (queue.submit(operations[i]), None)
+        except Exception as e:
+            outcomes[i] = (None, e)
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(len(operations))]
+    for thread in threads:
+        thread.start()
+    while queue._queue.qsize() < len(operations):
+        time.sleep(0.001)
+    gate.set()
+    for thread in [busy, *threads]:
+        thread.join()
+    return outcomes
+
+
+def insert(*names: str):
+    def operation(cursor: sqlite3.Cursor) -> int:
+        cursor.executemany("INSERT INTO Items (name) VALUES (?)", [(name,) for name in names])
+        return len(names)
+
+    return operation
+
+
+def names(db) -> list[str]:
+    with db.read_only() as cursor:
+        cursor.execute("SELECT name FROM Items ORDER BY name")
+        return [row[0] for row in cursor.fetchall()]
+
+
+def test_operations_return_their_results(queue, db):
+    outcomes = submit_all(queue, [insert(f"item-{i}") for i in range(20)])
+    assert outcomes == [(1, None)] * 20
+    assert len(names(db)) == 20
+
+
+def test_failing_operation_is_rolled_back_alone(queue, db):
+    def fail(cursor: sqlite3.Cursor) -> None:
+        cursor.execute("INSERT INTO Items (name) VALUES ('partial')")
+        raise ValueError("rejected")
+
+    outcomes = submit_all(
+        queue, [insert("a"), fail, insert("b", "c"), insert("a", "d"), insert("e")]
+    )
+
+    assert outcomes[0] == (1, None)
+    assert isinstance(outcomes[1][1], ValueError)
+    assert outcomes[2] == (2, None)
+    # Fails on the duplicate after inserting "d" or before it, either way "d" is undone
+    assert isinstance(outcomes[3][1], sqlite3.IntegrityError)
+    assert outcomes[4] == (1, None)
+    assert names(db) == ["a", "b", "c", "e"]
+
+
+def test_operations_run_in_the_writer_thread(queue):
+    assert queue.submit(lambda cursor: threading.current_thread().name) == "sqlite-writer"
+
+
+def test_submit_from_an_operation_is_refused(queue, db):
+    with pytest.raises(RuntimeError):
+        queue.submit(lambda cursor: queue.submit(insert("nested")))
+    assert names(db) == []
+
+
+def test_close_commits_queued_operations(db):
+    db.write(lambda cursor: cursor.execute("CREATE TABLE Items (name TEXT UNIQUE NOT NULL)"))
+    writer = WriteQueue(db, window=0.05)
+    outcomes = []
+    thread = threading.Thread(target=lambda: outcomes.append(writer.submit(insert("last"))))
+    thread.start()
+    thread.join()
+    writer.close()
+    assert outcomes == [1]
+    assert names(db) == ["last"]
+
+
+def test_manager_write_goes_through_the_queue(db):
+    db.start_writer()
+    try:
+        assert db.write(lambda cursor: threading.current_thread().name) == "sqlite-writer"
+    finally:
+        db.stop_writer()
+    assert db.write(lambda cursor: threading.current_thread().name) == threading.current_thread().name
+
+
+def test_submit_after_close_is_refused(db):
+    writer = WriteQueue(db)
+    writer.close()
+    with pytest.raises(RuntimeError):
+        writer.submit(insert("late"))
+    # Closing again is harmless
+    writer.close()
+
+
+def test_operations_queued_behind_stop_are_committed(queue, db):
+    busy, gate = hold_writer(queue)
+    # What a submit() racing close() used to leave behind the stop marker
+    stranded: Future = Future()
+    queue._queue.put(_STOP)
+    queue._queue.put((insert("stranded"), stranded))
+    gate.set()
+    busy.join()
+    assert stranded.result(timeout=5) == 1
+    assert names(db) == ["stranded"]
+
+
+def test_submissions_racing_close_never_hang(db):
+    db.write(lambda cursor: cursor.execute("CREATE TABLE Items (name TEXT UNIQUE NOT NULL)"))
+    writer = WriteQueue(db, window=0.001)
+    outcomes = []
+
+    def submit(i: int) -> None:
+        for j in range(20):
+            try:
+                outcomes.append(writer.submit(insert(f"{i}-{j}")))
+            except RuntimeError:
+                outcomes.append(None)
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    writer.close()
+    for thread in threads:
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+    assert len(outcomes) == 8 * 20
+    assert len(names(db)) == outcomes.count(1)
@@ -1,4 +1,5 @@
 from util.manager import DBManager
 from util.loader import DataLoader
+from util.router import ShardRouter
 
-__all__ = ['DBManager', 'DataLoader']
\ No newline at end of file
+__all__ = ['DBManager', 'DataLoader', 'ShardRouter']
\ No newline at end of file
@@ -0,0 +1,196 @@
+import heapq
+import threading
+import time
+from typing import Optional
+from util.samplers import CountSampler, Sampler
+from util.seen_targets import TargetBitmap
+
+
+class AssignmentIndex:
+    """
+    In-process index of targets to assign, each with a small integer count
+    (number of evaluations or of non-discarded ranks).
+
+    Provides:
+    - A queue of the unleased targets, ordered by a Sampler (default: a
+      bucket queue, least evaluated first)
+    - A cache of the response payload of every indexed target
+    - Leases held in memory, expired lazily through a heap
+
+    Picking, leasing and updating a target are O(1) amortized with the
+    default sampler, O(log n) with the adaptive ones; no SQL is run.
+    Targets the caller has already evaluated (`seen`) are skipped, each
+    with one lookup in the caller's seen set.
+    The index lives in one process, so it only fits single-process serving.
+    """
+
+    def __init__(self, sampler: Optional[Sampler] = None):
+        self._counts: dict[int, int] = {}
+        self._sampler = sampler if sampler is not None else CountSampler()
+        self._payloads: dict[int, dict] = {}
+
+        self._leases: dict[int, tuple[Optional[str], float]] = {}
+        self._evaluator_leases: dict[str, dict[int, None]] = {}
+        self._expiries: list[tuple[float, int]] = []
+
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def put(self, target_id: int, count: int, payload: dict) -> None:
+        """Add a target or replace its count and payload."""
+        with self._lock:
+            self._payloads[target_id] = payload
+            self._sampler.set_translations(target_id, _translation_ids(payload))
+            self._counts[target_id] = count
+            if target_id not in self._leases:
+                self._sampler.push(target_id, count)
+
+    def remove(self, target_id: int) -> None:
+        with self._lock:
+            if target_id not in self._counts:
+                return
+            if target_id in self._leases:
+                self._drop_lease(target_id)
+            self._sampler.forget(target_id)
+            del self._counts[target_id]
+            del self._payloads[target_id]
+
+    def observe(self, target_id: int, rankings: list[tuple[int, int, bool]]) -> None:
+        """Pass a past evaluation to the sampler, e.g. when building the index from history."""
+        with self._lock:
+            self._sampler.observe(target_id, rankings)
+
+    def record_evaluation(
+        self,
+        target_id: int,
+        count: int,
+        payload: dict,
+        evaluations: list[list[tuple[int, int, bool]]] = (),
+    ) -> None:
+        """
+        Set the count of a target that was just evaluated and release its
+        lease. `evaluations` are the new rankings of the target, as
+        (translationId, rank, discarded) rows, for the sampler.
+        """
+        with self._lock:
+            if target_id not in self._counts:
+                return
+            if target_id in self._leases:
+                self._drop_lease(target_id)
+            for rankings in evaluations:
+                self._sampler.observe(target_id, rankings)
+            self._counts[target_id] = count
+            self._payloads[target_id] = payload
+            self._sampler.set_translations(target_id, _translation_ids(payload))
+            self._sampler.push(target_id, count)
+
+    def acquire(
+        self, evaluator: Optional[str], lease_ttl: float, seen: Optional[TargetBitmap] = None
+    ) -> Optional[dict]:
+        """
+        Get the payload of the next target, the least evaluated one with
+        the default sampler.
+
+        With lease_ttl > 0 the target is taken out of the queue for
+        lease_ttl seconds, or until an evaluation of it is recorded; not for
+        anonymous callers (evaluator None), who get it without a lease.
+        Targets in `seen` are never returned.
+        """
+        payloads = self.acquire_many(evaluator, 1, lease_ttl, seen)
+        return payloads[0] if payloads else None
+
+    def acquire_many(
+        self,
+        evaluator: Optional[str],
+        n: int,
+        lease_ttl: float,
+        seen: Optional[TargetBitmap] = None,
+    ) -> list[dict]:
+        """Get the payloads of up to n distinct targets, leased like in acquire()."""
+        with self._lock:
+            if lease_ttl <= 0:
+                return [self._payloads[target_id] for target_id in self._peek_unseen(n, seen)]
+
+            now = time.time()
+            self._expire(now)
+
+            # Same evaluator asking again keeps its leases, the ones it gets are extended
+            target_ids = []
+            if evaluator is not None:
+                for target_id in list(self._evaluator_leases.get(evaluator, ())):
+                    if len(target_ids) == n:
+                        break
+                    if seen is None or target_id not in seen:
+                        self._lease(target_id, evaluator, now + lease_ttl)
+                        target_ids.append(target_id)
+
+            for target_id in self._peek_unseen(n - len(target_ids), seen):
+                # Anonymous callers take no lease, so polling cannot reserve every target
+                if evaluator is not None:
+                    self._sampler.remove(target_id)
+                    self._lease(target_id, evaluator, now + lease_ttl)
+                target_ids.append(target_id)
+
+            if len(target_ids) < n:
+                # Every target is leased, share the ones released soonest
+                taken = set(target_ids)
+                for expires_at, target_id in sorted(self._expiries):
+                    lease = self._leases.get(target_id)
+                    if lease is None or lease[1] != expires_at or target_id in taken:
+                        continue
+                    if seen is not None and target_id in seen:
+                        continue
+                    target_ids.append(target_id)
+                    taken.add(target_id)
+                    if len(target_ids) == n:
+                        break
+
+            return [self._payloads[target_id] for target_id in target_ids]
+
+    def _peek_unseen(self, n: int, seen: Optional[TargetBitmap]) -> list[int]:
+        """
+        Up to n queued targets in assignment order, those in `seen` skipped.
+        Looks further ahead (4 times) as long as too many were seen; the
+        first n + len(seen) queued targets always hold n unseen ones.
+        """
+        if n <= 0:
+            return []
+        if not seen:
+            return self._sampler.peek_many(n)
+        ahead = n
+        while True:
+            target_ids = self._sampler.peek_many(ahead)
+            unseen = [target_id for target_id in target_ids if target_id not in seen]
+            if len(unseen) >= n or len(target_ids) < ahead or ahead >= n + len(seen):
+                return unseen[:n]
+            ahead = min(ahead * 4, n + len(seen))
+
+    def _lease(self, target_id: int, evaluator: Optional[str], expires_at: float) -> None:
+        self._leases[target_id] = (evaluator, expires_at)
+        if evaluator is not None:
+            self._evaluator_leases.setdefault(evaluator, {})[target_id] = None
+        heapq.heappush(self._expiries, (expires_at, target_id))
+
+    def _drop_lease(self, target_id: int) -> None:
+        evaluator, _ = self._leases.pop(target_id)
+        held = self._evaluator_leases.get(evaluator)
+        if held is not None:
+            held.pop(target_id, None)
+            if not held:
+                del self._evaluator_leases[evaluator]
+
+    def _expire(self, now: float) -> None:
+        while self._expiries and self._expiries[0][0] <= now:
+            expires_at, target_id = heapq.heappop(self._expiries)
+            lease = self._leases.get(target_id)
+            # Heap entries are not removed on renewal or release, skip stale ones
+            if lease is None or lease[1] != expires_at:
+                continue
+            self._drop_lease(target_id)
+            self._sampler.push(target_id, self._counts[target_id])
+
+
+def _translation_ids(payload: Optional[dict]) -> list[int]:
+    return [translation["id"] for translation in payload["translations"]] if payload else []
@@ -1,18 +1,54 @@
+import logging
 import sqlite3
 import os
+import time
 from contextlib import contextmanager
-from typing import Generator
+from typing import Callable, Generator, Optional, TypeVar
 from util.config import get_config_db
+from util.base.pool import ConnectionPool
+from util.metrics import REGISTRY
+from util.writer import WriteQueue
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+TRANSACTION_SECONDS = REGISTRY.histogram(
+    "feedback_db_transaction_seconds",
+    "Duration of write transactions, lock wait included",
+    labels=("outcome",),
+)
+ROWS_WRITTEN = REGISTRY.counter(
+    "feedback_db_rows_written_total",
+    "Rows inserted, updated or deleted by committed transactions, triggers included",
+)
 
 
 class DBManagerBase:
-    def __init__(self):
+    def __init__(self, db_name: Optional[str] = None, read_only: bool = False):
+        """
+        `db_name` selects another database file in the data folder than the
+        configured one. With `read_only` every write fails, see ConnectionPool.
+        """
         self.config = get_config_db()
         self.data_dir = self.config["folder"]
-        self.db_name = self.config["name"]
+        self.db_name = db_name or self.config["name"]
         self.root_dir = self.config["root"]
         self.example_dir = self.config["example"]
 
+        self._validate_working_directory()
+        self._pool = ConnectionPool(
+            self.db_path,
+            size=self.config["pool"]["size"],
+            lifetime=self.config["pool"]["lifetime"],
+            timeout=self.config["pool"]["timeout"],
+            pragmas=self.config["pragmas"],
+            read_only=read_only,
+        )
+        self._writer: Optional[WriteQueue] = None
+        if self.config["writer"]["group_commit"] and not read_only:
+            self.start_writer()
+
     @property
     def db_path(self) -> str:
         """Get full path to database file."""
@@ -23,13 +59,84 @@ class DBManagerBase:
         if not cwd.endswith(self.root_dir):
             raise ValueError(f"Expected cwd to end with {self.root_dir}, got {cwd}")
 
+    def close(self) -> None:
+        """Stop the writer thread, if started, and close all pooled connections."""
+        self.stop_writer()
+        self._pool.close()
+
+    def start_writer(self) -> None:
+        """
+        Route write() through a single writer thread that group-commits
+        concurrent writes, see WriteQueue. Meant for multi-threaded serving,
+        started on construction when `writer.group_commit` is set.
+        """
+        if self._writer is None:
+            self._writer = WriteQueue(
+                self,
+                window=self.config["writer"]["window_ms"] / 1000,
+                max_batch=self.config["writer"]["max_batch"],
+            )
+
+    def stop_writer(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def write(self, operation: Callable[[sqlite3.Cursor], T]) -> T:
+        """
+        Run `operation` in a write transaction and return its result.
+
+        With the writer started the operation is queued and may share its
+        transaction with operations of other threads, under its own savepoint.
+        Otherwise it gets a transaction of its own.
+
+        Raises:
+            sqlite3.Error: For database-related errors
+            RuntimeError: When the writer is stopped before the operation is queued
+        """
+        if self._writer is not None:
+            return self._writer.submit(operation)
+        with self.transaction() as cursor:
+            return operation(cursor)
+
+    @contextmanager
+    def pragmas(self, **values) -> Generator[None, None, None]:
+        """
+        Temporarily override pragmas of the calling thread's write connection.
+
+        With the writer thread started, write() runs on the writer thread's
+        connection, which other threads' writes share: the pragmas are left
+        alone (synchronous cannot change inside its transactions anyway).
+
+        Usage:
+            with db_manager.pragmas(synchronous="OFF"):
+                db_manager.write(lambda cursor: cursor.executemany("INSERT INTO ...", rows))
+        """
+        if self._writer is not None:
+            logger.info("Writer thread started, pragmas %s not applied", values)
+            yield
+            return
+        conn = self._pool.writer()
+        previous = {
+            name: conn.execute(f"PRAGMA {name}").fetchone()[0] for name in values
+        }
+        try:
+            for name, value in values.items():
+                conn.execute(f"PRAGMA {name}={value}")
+            yield
+        finally:
+            for name, value in previous.items():
+                conn.execute(f"PRAGMA {name}={value}")
+
     @contextmanager
     def transaction(self) -> Generator[sqlite3.Cursor, None, None]:
         """
         Context manager for database transactions.
 
         Ensures that:
-        - Connection is properly opened and closed
+        - The calling thread's pooled connection is reused
+        - Write lock is taken up front (BEGIN IMMEDIATE), so reads made
+          inside the transaction cannot be invalidated by concurrent writers
         - Transaction is committed on success
         - Transaction is rolled back on any exception
         - Resources are always cleaned up
@@ -45,24 +152,26 @@ class DBManagerBase:
 
         Raises:
             sqlite3.Error: For database-related errors
-            ValueError: For invalid working directory
         """
-        self._validate_working_directory()
-
         conn = None
         cursor = None
+        start = time.perf_counter()
+        outcome = "rollback"
 
         try:
-            # Open connection and begin transaction
-            conn = sqlite3.connect(self.db_path)
+            # Take pooled connection and begin transaction
+            conn = self._pool.writer()
             cursor = conn.cursor()
-            conn.execute("BEGIN TRANSACTION")
+            changes = conn.total_changes
+            conn.execute("BEGIN IMMEDIATE TRANSACTION")
 
             # Yield cursor for use in with block
             yield cursor
 
             # If we get here, no exception occurred - commit the transaction
             conn.commit()
+            outcome = "commit"
+            ROWS_WRITTEN.inc(conn.total_changes - changes)
 
         except sqlite3.Error as e:
             # Database error - rollback transaction
@@ -71,7 +180,7 @@ class DBManagerBase:
                     conn.rollback()
                 except sqlite3.Error as rollback_error:
                     # Log rollback failure but raise original error
-                    print(f"Warning: Rollback failed: {rollback_error}")
+                    logger.warning("Rollback failed: %s", rollback_error)
             raise sqlite3.Error(f"Transaction failed: {e}") from e
 
         except Exception as e:
@@ -80,17 +189,16 @@ class DBManagerBase:
                 try:
                     conn.rollback()
                 except sqlite3.Error as rollback_error:
-                    print(
-                        f"Warning: Rollback failed during error handling: {rollback_error}"
+                    logger.warning(
+                        "Rollback failed during error handling: %s", rollback_error
                     )
             raise
 
         finally:
-            # Close connection and cursor
+            # Close cursor, connection stays in the pool
             if cursor:
                 cursor.close()
-            if conn:
-                conn.close()
+            TRANSACTION_SECONDS.observe(time.perf_counter() - start, outcome=outcome)
 
     @contextmanager
     def read_only(self) -> Generator[sqlite3.Cursor, None, None]:
@@ -98,7 +206,7 @@ class DBManagerBase:
         Context manager for read-only database access.
 
         Ensures:
-        - Connection is properly opened and closed
+        - Connection is taken from and returned to the pool
         - No transaction is committed
         - Cursor can be used for read operations
 
@@ -111,15 +219,12 @@ class DBManagerBase:
 
         Raises:
             sqlite3.Error: For database-related errors
-            ValueError: For invalid working directory
         """
-        self._validate_working_directory()
-
         conn = None
         cursor = None
 
         try:
-            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)  # mode=ro via URI to enforce read-only access
+            conn = self._pool.acquire_reader()  # mode=ro via URI to enforce read-only access
             cursor = conn.cursor()
             yield cursor
         except sqlite3.Error as e:
@@ -128,4 +233,4 @@ class DBManagerBase:
             if cursor:
                 cursor.close()
             if conn:
-                conn.close()
+                self._pool.release_reader(conn)
@@ -0,0 +1,188 @@
+import sqlite3
+import threading
+import time
+import weakref
+from queue import Empty, LifoQueue
+from util.metrics import REGISTRY
+
+CONNECTIONS_OPENED = REGISTRY.counter(
+    "feedback_db_connections_opened_total", "SQLite connections opened", labels=("mode",)
+)
+CONNECTIONS_CLOSED = REGISTRY.counter(
+    "feedback_db_connections_closed_total", "SQLite connections closed", labels=("mode",)
+)
+
+
+class _WriterSlot:
+    """
+    A thread's read-write connection, kept in the pool's thread-local.
+    Python clears a thread's locals when it exits, which drops the slot and
+    closes the connection through its finalizer.
+    """
+
+    __slots__ = ("conn", "created", "close", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection, writers: set, lock: threading.Lock):
+        self.conn = conn
+        self.created = time.monotonic()
+        # Not bound to the pool, which must not be kept alive by its threads
+        self.close = weakref.finalize(self, _close_writer, conn, writers, lock)
+
+
+def _close_writer(conn: sqlite3.Connection, writers: set, lock: threading.Lock) -> None:
+    """Close a writer once, whichever comes first: its thread exits, it expires or the pool closes."""
+    with lock:
+        if conn not in writers:
+            return
+        writers.discard(conn)
+    conn.close()
+    CONNECTIONS_CLOSED.inc(mode="writer")
+
+
+class ConnectionPool:
+    """
+    Pool of long-lived SQLite connections.
+
+    Provides:
+    - One reusable read-write connection per thread, closed when the
+      thread exits (e.g. the per-request threads of Flask's dev server)
+    - A bounded set of read-only connections shared between threads
+    - Pragmas applied once, when a connection is created
+    - Recycling of connections older than `lifetime` seconds
+
+    With `read_only`, e.g. for snapshots, there is no read-write connection:
+    writer() raises sqlite3.OperationalError.
+
+    `connection_factory` is passed to sqlite3.connect(), e.g. to record the
+    executed statements (see benchmarks.audit); set it before first use.
+    """
+
+    connection_factory: type[sqlite3.Connection] = sqlite3.Connection
+
+    def __init__(
+        self,
+        db_path: str,
+        size: int,
+        lifetime: float,
+        timeout: float,
+        pragmas: dict,
+        read_only: bool = False,
+    ):
+        self.db_path = db_path
+        self.size = size
+        self.lifetime = lifetime
+        self.timeout = timeout
+        self.pragmas = pragmas
+        self.read_only = read_only
+
+        self._readers: LifoQueue = LifoQueue(maxsize=size)
+        self._reader_slots = threading.BoundedSemaphore(size)
+        self._local = threading.local()
+        self._writers: set[sqlite3.Connection] = set()
+        self._checked_out: dict[int, float] = {}  # id(conn) -> creation time
+        self._lock = threading.Lock()
+
+    def writer(self) -> sqlite3.Connection:
+        """Get the read-write connection of the calling thread."""
+        if self.read_only:
+            raise sqlite3.OperationalError(f"{self.db_path} is opened read-only")
+        slot = getattr(self._local, "writer", None)
+
+        if slot is not None and not slot.conn.in_transaction and self._expired(slot.created):
+            slot.close()
+            slot = None
+
+        if slot is None:
+            conn = self._connect(self.db_path, uri=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            CONNECTIONS_OPENED.inc(mode="writer")
+            with self._lock:
+                self._writers.add(conn)
+            slot = self._local.writer = _WriterSlot(conn, self._writers, self._lock)
+
+        return slot.conn
+
+    def acquire_reader(self) -> sqlite3.Connection:
+        """
+        Take a read-only connection out of the pool.
+
+        Blocks while all `size` readers are in use.
+
+        Raises:
+            sqlite3.OperationalError: If no reader is released within `timeout`
+        """
+        if not self._reader_slots.acquire(timeout=self.timeout):
+            raise sqlite3.OperationalError(
+                f"Connection pool exhausted: {self.size} readers in use"
+            )
+
+        try:
+            while True:
+                try:
+                    conn, created = self._readers.get_nowait()
+                except Empty:
+                    conn = self._connect(f"file:{self.db_path}?mode=ro", uri=True)
+                    created = time.monotonic()
+                    CONNECTIONS_OPENED.inc(mode="reader")
+                    break
+                if not self._expired(created):
+                    break
+                self._close_reader(conn)
+        except Exception:
+            self._reader_slots.release()
+            raise
+
+        self._checked_out[id(conn)] = created
+        return conn
+
+    def release_reader(self, conn: sqlite3.Connection) -> None:
+        """Return a read-only connection to the pool."""
+        created = self._checked_out.pop(id(conn), 0.0)
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            if self._expired(created):
+                self._close_reader(conn)
+            else:
+                self._readers.put_nowait((conn, created))
+        except Exception:
+            self._close_reader(conn)
+        finally:
+            self._reader_slots.release()
+
+    def close(self) -> None:
+        """Close all idle readers and every thread's writer."""
+        while True:
+            try:
+                conn, _ = self._readers.get_nowait()
+            except Empty:
+                break
+            self._close_reader(conn)
+
+        with self._lock:
+            writers = list(self._writers)
+        for conn in writers:
+            _close_writer(conn, self._writers, self._lock)
+        self._local = threading.local()
+
+    def _connect(self, database: str, uri: bool) -> sqlite3.Connection:
+        # isolation_level=None: transactions are opened explicitly by the caller
+        conn = sqlite3.connect(
+            database,
+            uri=uri,
+            timeout=self.timeout,
+            isolation_level=None,
+            check_same_thread=False,
+            factory=self.connection_factory,
+        )
+        conn.execute(f"PRAGMA mmap_size={int(self.pragmas['mmap_size'])}")
+        conn.execute(f"PRAGMA cache_size={int(self.pragmas['cache_size'])}")
+        return conn
+
+    def _close_reader(self, conn: sqlite3.Connection) -> None:
+        conn.close()
+        CONNECTIONS_CLOSED.inc(mode="reader")
+
+    def _expired(self, created: float) -> bool:
+        return self.lifetime > 0 and time.monotonic() - created > self.lifetime
@@ -1,11 +1,35 @@
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 _config = None
 
-def get_config_db():
+DEFAULT_LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+def _load_config():
     global _config
     if _config is None:
         with open('config.json') as f:
-            _config = json.load(f)["database"]
-    print(f"Accessing db with configuration: {_config}")
-    return _config
\ No newline at end of file
+            _config = json.load(f)
+    return _config
+
+def get_config_db():
+    config = _load_config()["database"]
+    logger.debug("Accessing db with configuration: %s", config)
+    return config
+
+def configure_logging():
+    """
+    Set up logging from the "logging" section of config.json.
+
+    "level" applies to everything, "levels" overrides it per logger, e.g.
+    {"util.manager_mixins.query": "CRITICAL"} silences the request path.
+    """
+    settings = _load_config().get("logging", {})
+    logging.basicConfig(
+        level=settings.get("level", "INFO"),
+        format=settings.get("format", DEFAULT_LOG_FORMAT),
+    )
+    for name, level in settings.get("levels", {}).items():
+        logging.getLogger(name).setLevel(level)
@@ -1,5 +1,331 @@
-import sqlite3
+import csv
+import json
+import logging
 import os
+import time
+from typing import Iterator, Optional, TextIO
+from util.manager import DBManager
+from util.manager_mixins.query import unknown_targets
+from util.manager_mixins.search import index_search_rows
+
+logger = logging.getLogger(__name__)
+
+# Pragmas of the write connection while a bulk import runs
+IMPORT_PRAGMAS = {
+    "synchronous": "OFF",
+    "temp_store": "MEMORY",
+    "cache_size": -262144,  # 256 MiB
+}
+
+# Indexes needed while importing, never dropped by rebuild_indexes
+KEEP_INDEXES = {"idx_targets_external_key"}
+
 
 class DataLoader:
-    pass
\ No newline at end of file
+    """
+    Streaming bulk importer for targets and translations.
+
+    Reads JSON, JSONL and CSV files record by record, so memory stays bounded
+    by the batch size, and inserts each batch with executemany in its own
+    write (see DBManagerBase.write()), so imports into a serving database
+    queue behind the writer thread instead of competing for the lock.
+
+    Records:
+    - Target: {"key"?, "id"?, "context1", "target", "context2", "translations"?: [...]}
+    - Translation: {"targetId" | "targetKey", "translation", "model"}
+
+    Translations nested in a target are linked to it directly, others are
+    linked through targetId or through the external key of a target imported
+    earlier (Targets.externalKey). Those of unknown targets are skipped and
+    counted, not stored without a target. A JSON file is either an array of
+    records or an object of arrays, e.g. {"targets": [...], "translations": [...]}.
+    CSV rows may carry both a target and one of its translations; consecutive
+    rows with the same key share the target.
+
+    Usage:
+        loader = DataLoader(db, batch_size=50_000)
+        stats = loader.load("corpus.jsonl")
+    """
+
+    def __init__(
+        self,
+        db: Optional[DBManager] = None,
+        batch_size: int = 10_000,
+        rebuild_indexes: bool = False,
+        read_size: int = 1 << 20,
+    ):
+        self.db = db if db is not None else DBManager()
+        self.batch_size = batch_size
+        self.rebuild_indexes = rebuild_indexes
+        self.read_size = read_size
+
+    def load(self, path: str, file_format: Optional[str] = None) -> dict:
+        """
+        Import a file and return counts and throughput.
+
+        Raises:
+            ValueError: For unknown formats or malformed records
+            sqlite3.Error: For database-related errors, batches committed
+                before the failing one are kept
+        """
+        file_format = file_format or os.path.splitext(path)[1].lstrip(".").lower()
+        readers = {"json": self._iter_json, "jsonl": self._iter_jsonl, "csv": self._iter_csv}
+        if file_format not in readers:
+            raise ValueError(f"Unknown import format: {file_format}")
+
+        stats = {"targets": 0, "translations": 0, "skipped": 0}
+        start = time.perf_counter()
+
+        dropped = self._drop_indexes() if self.rebuild_indexes else []
+        try:
+            with self.db.pragmas(**IMPORT_PRAGMAS):
+                with open(path, newline="" if file_format == "csv" else None) as f:
+                    batch: list[dict] = []
+                    size = 0
+                    for record in readers[file_format](f):
+                        batch.append(record)
+                        size += 1 + len(record.get("translations", ()))
+                        if size >= self.batch_size:
+                            self._insert_batch(batch, stats)
+                            batch, size = [], 0
+                    if batch:
+                        self._insert_batch(batch, stats)
+        finally:
+            if dropped:
+                self._create_indexes(dropped)
+
+        self.db.write(lambda cursor: cursor.execute("PRAGMA optimize"))
+        self.db.invalidate_assignment_index()
+        self.db.invalidate_payload_cache()
+
+        stats["seconds"] = time.perf_counter() - start
+        rows = stats["targets"] + stats["translations"]
+        stats["rows_per_second"] = rows / stats["seconds"] if stats["seconds"] else 0.0
+        return stats
+
+    def _insert_batch(self, batch: list[dict], stats: dict) -> None:
+        def operation(cursor) -> tuple[int, int, int]:
+            targets = []
+            nested_translations = []
+            translations_by_id = []
+            translations_by_key = []
+
+            # Ids are assigned here so nested translations can reference them,
+            # the write lock of the transaction keeps them from being taken
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM Translations")
+            last_translation_id = cursor.fetchone()[0]
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM Targets")
+            next_id = max(
+                [cursor.fetchone()[0]]
+                + [int(r["id"]) for r in batch if "target" in r and r.get("id") is not None]
+            ) + 1
+
+            for record in batch:
+                if "target" in record:
+                    target_id = record.get("id")
+                    if target_id is None:
+                        target_id, next_id = next_id, next_id + 1
+                    targets.append(
+                        (
+                            int(target_id),
+                            record.get("key"),
+                            record["context1"],
+                            record["target"],
+                            record["context2"],
+                        )
+                    )
+                    for translation in record.get("translations", ()):
+                        nested_translations.append(
+                            self._translation_row(int(target_id), translation)
+                        )
+                elif record.get("targetId") is not None:
+                    translations_by_id.append(
+                        self._translation_row(int(record["targetId"]), record)
+                    )
+                elif record.get("targetKey") is not None:
+                    translations_by_key.append(
+                        self._translation_row(str(record["targetKey"]), record)
+                    )
+                else:
+                    raise ValueError(f"Got not proper record: {record}")
+
+            cursor.executemany(
+                "INSERT INTO Targets(id, externalKey, context1, target, context2) VALUES (?, ?, ?, ?, ?)",
+                targets,
+            )
+            # Ids without a target would leave orphan translations, they are counted as skipped
+            if translations_by_id:
+                missing = set(unknown_targets(cursor, (row[0] for row in translations_by_id)))
+                orphans = len(translations_by_id)
+                translations_by_id = [row for row in translations_by_id if row[0] not in missing]
+                orphans -= len(translations_by_id)
+            else:
+                orphans = 0
+            cursor.executemany(
+                "INSERT INTO Translations(targetId, translation, model) VALUES (?, ?, ?)",
+                nested_translations + translations_by_id,
+            )
+            # Unknown keys select nothing, they are counted as skipped
+            cursor.executemany(
+                """
+                INSERT INTO Translations(targetId, translation, model)
+                SELECT id, ?, ? FROM Targets WHERE externalKey = ?
+                """,
+                [(row[1], row[2], row[0]) for row in translations_by_key],
+            )
+            linked = cursor.rowcount if translations_by_key else 0
+            # Explicit target ids may fill gaps below the largest one
+            index_search_rows(cursor, "Targets", ids=[row[0] for row in targets])
+            index_search_rows(cursor, "Translations", after=last_translation_id)
+            return (
+                len(targets),
+                len(nested_translations) + len(translations_by_id) + linked,
+                orphans + len(translations_by_key) - linked,
+            )
+
+        targets, translations, skipped = self.db.write(operation)
+        stats["targets"] += targets
+        stats["translations"] += translations
+        stats["skipped"] += skipped
+
+    @staticmethod
+    def _translation_row(target, record: dict) -> tuple:
+        return (target, record["translation"], record["model"])
+
+    def _drop_indexes(self) -> list[tuple[str, str]]:
+        """Drop secondary indexes of Targets and Translations, returning their definitions."""
+
+        def operation(cursor) -> list[tuple[str, str]]:
+            cursor.execute(
+                """
+                SELECT name, sql FROM sqlite_master
+                WHERE type = 'index' AND sql IS NOT NULL
+                    AND tbl_name IN ('Targets', 'Translations')
+                """
+            )
+            indexes = [row for row in cursor.fetchall() if row[0] not in KEEP_INDEXES]
+            for name, _ in indexes:
+                cursor.execute(f"DROP INDEX {name}")
+            return indexes
+
+        indexes = self.db.write(operation)
+        logger.info("Dropped %d indexes for import", len(indexes))
+        return indexes
+
+    def _create_indexes(self, indexes: list[tuple[str, str]]) -> None:
+        def operation(cursor) -> None:
+            for _, sql in indexes:
+                cursor.execute(sql)
+
+        self.db.write(operation)
+        logger.info("Rebuilt %d indexes", len(indexes))
+
+    def _iter_jsonl(self, f: TextIO) -> Iterator[dict]:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+    def _iter_csv(self, f: TextIO) -> Iterator[dict]:
+        # Rows with a target start a new one unless they repeat the previous key
+        current: Optional[dict] = None
+        for row in csv.DictReader(f):
+            row = {k: v for k, v in row.items() if v not in (None, "")}
+            if "target" in row:
+                if current is None or row.get("key") is None or row.get("key") != current.get("key"):
+                    if current is not None:
+                        yield current
+                    current = {
+                        k: row[k]
+                        for k in ("id", "key", "context1", "target", "context2")
+                        if k in row
+                    }
+                    current["translations"] = []
+                if "translation" in row:
+                    current["translations"].append(row)
+            elif "translation" in row:
+                yield row
+        if current is not None:
+            yield current
+
+    def _iter_json(self, f: TextIO) -> Iterator[dict]:
+        """Stream the elements of a top-level array, or of the arrays of a top-level object."""
+        decoder = json.JSONDecoder()
+        buffer = _Buffer(f, self.read_size)
+
+        opening = buffer.expect("[{")
+        if opening == "[":
+            yield from self._iter_json_array(buffer, decoder, section=None)
+            return
+
+        while buffer.expect('"}') == '"':
+            buffer.pos -= 1
+            section = buffer.decode(decoder)
+            buffer.expect(":")
+            buffer.expect("[")
+            yield from self._iter_json_array(buffer, decoder, section)
+            if buffer.expect(",}") == "}":
+                return
+
+    def _iter_json_array(self, buffer, decoder: json.JSONDecoder, section: Optional[str]) -> Iterator[dict]:
+        if buffer.peek() == "]":
+            buffer.pos += 1
+            return
+        while True:
+            record = buffer.decode(decoder)
+            if section in (None, "targets", "translations"):
+                yield record
+            if buffer.expect(",]") == "]":
+                return
+
+
+class _Buffer:
+    """Sliding window over a text file for incremental JSON decoding."""
+
+    def __init__(self, f: TextIO, read_size: int):
+        self.f = f
+        self.read_size = read_size
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(self.read_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON input")
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if char not in chars:
+            raise ValueError(f"Expected one of {chars!r} in JSON input, got {char!r}")
+        self.pos += 1
+        return char
+
+    def decode(self, decoder: json.JSONDecoder):
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.text, self.pos)
+                # A value ending exactly at the buffer end may be a truncated number
+                if end < len(self.text) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
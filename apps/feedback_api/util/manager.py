@@ -1,5 +1,34 @@
 from util.base.manager_base import DBManagerBase
-from util.manager_mixins import InitMixin, DropMixin, QueryMixin 
+from util.manager_mixins import (
+    InitMixin,
+    DropMixin,
+    QueryMixin,
+    MaintenanceMixin,
+    AssignmentMixin,
+    ExportMixin,
+    StatsMixin,
+    CacheMixin,
+    MigrationMixin,
+    AgreementMixin,
+    SearchMixin,
+    SnapshotMixin,
+    SeenMixin,
+)
 
-class DBManager(DBManagerBase, InitMixin, DropMixin, QueryMixin):
+class DBManager(
+    DBManagerBase,
+    InitMixin,
+    DropMixin,
+    QueryMixin,
+    MaintenanceMixin,
+    AssignmentMixin,
+    ExportMixin,
+    StatsMixin,
+    CacheMixin,
+    MigrationMixin,
+    AgreementMixin,
+    SearchMixin,
+    SnapshotMixin,
+    SeenMixin,
+):
     pass
@@ -1,3 +1,13 @@
 from util.manager_mixins.initialization import InitMixin
 from util.manager_mixins.drop import DropMixin
 from util.manager_mixins.query import QueryMixin
+from util.manager_mixins.maintenance import MaintenanceMixin
+from util.manager_mixins.assignment import AssignmentMixin
+from util.manager_mixins.export import ExportMixin
+from util.manager_mixins.stats import StatsMixin
+from util.manager_mixins.cache import CacheMixin
+from util.manager_mixins.migration import MigrationMixin
+from util.manager_mixins.agreement import AgreementMixin
+from util.manager_mixins.search import SearchMixin
+from util.manager_mixins.snapshot import SnapshotMixin
+from util.manager_mixins.seen import SeenMixin
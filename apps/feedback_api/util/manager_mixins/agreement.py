@@ -0,0 +1,207 @@
+import logging
+import sqlite3
+from itertools import groupby
+from typing import Optional
+from util.metrics import timed_query
+
+logger = logging.getLogger(__name__)
+
+
+def evaluation_scores(
+    rankings: list[tuple[int, int, bool]], translation_ids: list[int]
+) -> dict[int, float]:
+    """
+    Rank scores one evaluation gives every translation of its target: the
+    ranked ones their position among the non-discarded (1, 2, ...), the
+    discarded and the unshown ones the midrank of the remaining positions.
+    Scores always sum to n(n + 1) / 2 for n translations.
+    """
+    known = set(translation_ids)
+    ranked = sorted(
+        (rank, translation_id)
+        for translation_id, rank, discarded in rankings
+        if not discarded and translation_id in known
+    )
+    midrank = (len(ranked) + 1 + len(translation_ids)) / 2
+    scores = {translation_id: midrank for translation_id in translation_ids}
+    for position, (_, translation_id) in enumerate(ranked, start=1):
+        scores[translation_id] = position
+    return scores
+
+
+def kendalls_w(rank_sums: list[float], evaluations: int) -> Optional[float]:
+    """
+    Kendall's coefficient of concordance from the per-item sums of rank
+    scores over `evaluations` raters: 1 when every rater gives the same
+    ranking, 0 when they cancel out. None for fewer than 2 items or raters.
+    Not corrected for ties, which only lowers it.
+    """
+    n = len(rank_sums)
+    if n < 2 or evaluations < 2:
+        return None
+    mean = evaluations * (n + 1) / 2
+    spread = sum((rank_sum - mean) ** 2 for rank_sum in rank_sums)
+    return 12 * spread / (evaluations * evaluations * (n**3 - n))
+
+
+class AgreementMixin:
+    """
+    Mixin for the agreement of evaluators per target and the retirement of
+    targets they agree on.
+
+    Agreement is Kendall's W over the evaluations of a target, see
+    evaluation_scores() and kendalls_w(). Translations.rankSum keeps the
+    sums of the scores and Targets.agreementEvals the number of evaluations,
+    so a submission updates W in O(translations of the target).
+
+    A target with at least `retirement.min_evals` evaluations and a W of at
+    least `retirement.agreement` is retired: it is left out of the partial
+    selection indexes and the in-process index, so assignment only walks
+    targets that still need work. Adding a translation to a target restarts
+    its agreement and makes it active again (see migration 4).
+
+    Requires host class to provide:
+    - config: dict: Database configuration
+    - transaction() -> Generator[sqlite3.Cursor, None, None]: Context manager for DB transactions
+    - read_only() -> Generator[sqlite3.Cursor, None, None]: Context manager for read-only DB access
+    - invalidate_assignment_index() -> None: Drop the in-process assignment index
+    """
+
+    @timed_query()
+    def get_agreement_summary(self) -> Optional[dict]:
+        """Counts of active and retired targets and the mean agreement of those that have one."""
+        try:
+            with self.read_only() as cursor:
+                cursor.execute(
+                    """
+                    SELECT
+                        COUNT(*),
+                        COALESCE(SUM(retired), 0),
+                        COUNT(agreement),
+                        AVG(agreement)
+                    FROM Targets
+                    """
+                )
+                targets, retired, measured, mean = cursor.fetchone()
+            return {
+                "targets": targets,
+                "active": targets - retired,
+                "retired": retired,
+                "withAgreement": measured,
+                "meanAgreement": mean,
+                "threshold": self.config["retirement"]["agreement"],
+                "minEvals": self.config["retirement"]["min_evals"],
+            }
+
+        except Exception as e:
+            logger.error("Error getting agreement summary: %s", e)
+            return None
+
+    def rebuild_agreement(self) -> bool:
+        """
+        Recompute rank sums, agreement and retirement of every target from
+        all its rankings, e.g. after changing the `retirement` settings.
+        Targets are retired or reactivated by the current settings.
+        """
+        try:
+            with self.transaction() as cursor:
+                targets, retired = self._rebuild_agreement(cursor)
+
+            self.invalidate_assignment_index()
+            logger.info("Agreement rebuilt for %d targets, %d retired", targets, retired)
+            return True
+
+        except Exception as e:
+            logger.error("Error rebuilding agreement: %s", e)
+            return False
+
+    def _rebuild_agreement(self, cursor: sqlite3.Cursor) -> tuple[int, int]:
+        """
+        Body of rebuild_agreement(), also run by migration 4 so upgraded
+        databases start with the agreement of their existing rankings; must
+        run in a write transaction.
+
+        Returns:
+            (targets with evaluations, retired targets)
+        """
+        cursor.execute("UPDATE Translations SET rankSum = 0 WHERE rankSum != 0")
+        cursor.execute("UPDATE Targets SET agreement = NULL, agreementEvals = 0, retired = FALSE")
+
+        rankings = cursor.connection.cursor()
+        rankings.execute(
+            """
+            SELECT Evaluations.targetId, Rankings.evalId, Rankings.translationId, Rankings.rank, Rankings.discarded
+            FROM Evaluations
+            JOIN Rankings ON Rankings.evalId = Evaluations.id
+            ORDER BY Evaluations.targetId, Rankings.evalId
+            """
+        )
+        targets = retired = 0
+        for target_id, rows in groupby(rankings, key=lambda row: row[0]):
+            cursor.execute("SELECT id FROM Translations WHERE targetId = ?", (target_id,))
+            rank_sums = {row[0]: 0.0 for row in cursor.fetchall()}
+            evaluations = 0
+            for _, evaluation in groupby(rows, key=lambda row: row[1]):
+                scores = evaluation_scores(
+                    [(row[2], row[3], bool(row[4])) for row in evaluation], list(rank_sums)
+                )
+                for translation_id, score in scores.items():
+                    rank_sums[translation_id] += score
+                evaluations += 1
+
+            cursor.executemany(
+                "UPDATE Translations SET rankSum = ? WHERE id = ?",
+                [(rank_sum, translation_id) for translation_id, rank_sum in rank_sums.items()],
+            )
+            agreement = kendalls_w(list(rank_sums.values()), evaluations)
+            converged = self._converged(agreement, evaluations)
+            cursor.execute(
+                "UPDATE Targets SET agreement = ?, agreementEvals = ?, retired = ? WHERE id = ?",
+                (agreement, evaluations, converged, target_id),
+            )
+            targets += 1
+            retired += converged
+        rankings.close()
+        return targets, retired
+
+    def _update_agreement(
+        self, cursor: sqlite3.Cursor, target_id: int, rankings: list[tuple[int, int, bool]]
+    ) -> bool:
+        """
+        Add one evaluation, given as (translationId, rank, discarded) rows, to
+        the agreement of its target and retire the target once it converges;
+        must run in the transaction that inserts the evaluation.
+
+        Returns:
+            Whether the target is retired
+        """
+        cursor.execute("SELECT id, rankSum FROM Translations WHERE targetId = ?", (target_id,))
+        rank_sums = dict(cursor.fetchall())
+        scores = evaluation_scores(rankings, list(rank_sums))
+        cursor.executemany(
+            "UPDATE Translations SET rankSum = rankSum + ? WHERE id = ?",
+            [(score, translation_id) for translation_id, score in scores.items()],
+        )
+
+        cursor.execute("SELECT agreementEvals, retired FROM Targets WHERE id = ?", (target_id,))
+        evaluations, retired = cursor.fetchone()
+        evaluations += 1
+        agreement = kendalls_w(
+            [rank_sum + scores[translation_id] for translation_id, rank_sum in rank_sums.items()],
+            evaluations,
+        )
+        retired = bool(retired) or self._converged(agreement, evaluations)
+        cursor.execute(
+            "UPDATE Targets SET agreement = ?, agreementEvals = ?, retired = ? WHERE id = ?",
+            (agreement, evaluations, retired, target_id),
+        )
+        return retired
+
+    def _converged(self, agreement: Optional[float], evaluations: int) -> bool:
+        settings = self.config["retirement"]
+        return (
+            agreement is not None
+            and settings["agreement"] is not None
+            and evaluations >= settings["min_evals"]
+            and agreement >= settings["agreement"]
+        )
@@ -0,0 +1,322 @@
+import json
+import logging
+import sqlite3
+import time
+from itertools import groupby
+from typing import Optional
+from util.assignment_index import AssignmentIndex
+from util.samplers import make_sampler
+from util.seen_targets import TargetBitmap
+
+logger = logging.getLogger(__name__)
+
+# Priority -> (Targets counter used by the index backend, ORDER BY of the sql backend)
+# Each ORDER BY is served by a partial index on Targets (WHERE numTranslations > 0 AND retired = FALSE)
+_PRIORITIES = {
+    # Fewest evaluations first
+    "evals": ("numEvals", "numEvals ASC, id ASC"),
+    # Fewest non-discarded ranks first, favours targets whose translations keep getting discarded
+    "ranked": ("numRanked", "numRanked ASC, numEvals ASC, id ASC"),
+}
+
+
+class AssignmentMixin:
+    """
+    Mixin for choosing which target an evaluator gets next.
+
+    Without leases every caller gets the least evaluated target. With
+    leases (`assignment.lease_ttl` > 0) a target is reserved for the caller
+    for `lease_ttl` seconds, so concurrent callers are spread over the
+    least evaluated targets. Expired leases are returned to the pool.
+    Anonymous callers (no evaluator) take no lease: they get what a lease
+    would pick, read-only, so polling cannot reserve every target.
+    "Least evaluated" is set by `assignment.priority`, see _PRIORITIES.
+    Retired targets (see AgreementMixin) are never assigned, nor are
+    targets to an evaluator who has already evaluated them (see SeenMixin).
+
+    With `assignment.backend` set to "index" targets are served from an
+    in-process AssignmentIndex instead of SQL, leases included. Its order
+    is set by `assignment.sampler` (see util.samplers): "count" follows the
+    priority, "uncertainty" and "thompson" favour targets whose ranking of
+    translations is still unclear.
+
+    Requires host class to provide:
+    - config: dict: Database configuration
+    - read_only() -> Generator[sqlite3.Cursor, None, None]: Context manager for read-only DB access
+    - _transform_to_dict(target, translations) -> Optional[dict]: Response payload builder
+    - seen_by(evaluator, cursor=None) -> Optional[TargetBitmap]: Targets the evaluator has evaluated
+    """
+
+    @property
+    def lease_ttl(self) -> float:
+        return self.config["assignment"]["lease_ttl"]
+
+    @property
+    def assignment_priority(self) -> str:
+        return self.config["assignment"]["priority"]
+
+    @property
+    def _priority_column(self) -> str:
+        return _PRIORITIES[self.assignment_priority][0]
+
+    @property
+    def _priority_order(self) -> str:
+        return _PRIORITIES[self.assignment_priority][1]
+
+    @property
+    def assignment_backend(self) -> str:
+        return self.config["assignment"]["backend"]
+
+    @property
+    def assignment_sampler(self) -> str:
+        return self.config["assignment"]["sampler"]
+
+    @property
+    def assignment_index(self) -> AssignmentIndex:
+        """In-process index, built from the DB on first use."""
+        if getattr(self, "_assignment_index", None) is None:
+            self.build_assignment_index()
+        return self._assignment_index
+
+    def build_assignment_index(self) -> bool:
+        """(Re)build the in-process index from the DB; targets without translations are left out."""
+        try:
+            sampler = make_sampler(self.assignment_sampler)
+            index = AssignmentIndex(sampler)
+            with self.read_only() as cursor:
+                if sampler.uses_rankings:
+                    for target_id, rankings in self._iter_past_rankings(cursor):
+                        index.observe(target_id, rankings)
+                for target_id, count, payload in self._iter_index_entries(cursor):
+                    index.put(target_id, count, payload)
+            self._assignment_index = index
+            logger.info(
+                "Assignment index built with %d targets (%s sampler)",
+                len(index),
+                self.assignment_sampler,
+            )
+            return True
+        except Exception as e:
+            logger.error("Error building assignment index: %s", e)
+            return False
+
+    def invalidate_assignment_index(self) -> None:
+        # Rebuilt lazily on next use
+        self._assignment_index = None
+
+    def _refresh_assignment_index(self, target_ids: list[int]) -> None:
+        """Re-read the given targets into the index, if it is in use."""
+        index = self._active_assignment_index()
+        if index is None or not target_ids:
+            return
+        with self.read_only() as cursor:
+            for target_id, count, payload in self._iter_index_entries(cursor, target_ids):
+                index.put(target_id, count, payload)
+
+    def _active_assignment_index(self) -> Optional[AssignmentIndex]:
+        if self.assignment_backend != "index":
+            return None
+        return getattr(self, "_assignment_index", None)
+
+    def _iter_index_entries(
+        self, cursor: sqlite3.Cursor, target_ids: Optional[list[int]] = None
+    ):
+        """Yield (targetId, priority counter, payload) for active targets that have translations."""
+        filter_ids = "AND Targets.id IN (SELECT value FROM json_each(?))"
+        params = (json.dumps(target_ids),) if target_ids is not None else ()
+
+        cursor.execute(
+            f"""
+            SELECT
+                Targets.id,
+                Targets.context1,
+                Targets.target,
+                Targets.context2,
+                Targets.{self._priority_column}
+            FROM Targets
+            WHERE retired = FALSE {filter_ids if target_ids is not None else ""}
+            """,
+            params,
+        )
+        targets = {row[0]: row for row in cursor.fetchall()}
+
+        cursor.execute(
+            f"""
+            SELECT 
+                Translations.id,
+                Translations.targetId,
+                Translations.translation,
+                Translations.model,
+                Translations.numEvals
+            FROM Translations
+            JOIN Targets ON Targets.id = Translations.targetId
+            WHERE Targets.retired = FALSE {filter_ids if target_ids is not None else ""}
+            ORDER BY Translations.targetId, Translations.id
+            """,
+            params,
+        )
+        for target_id, translations in groupby(cursor, key=lambda row: row[1]):
+            target = targets[target_id]
+            yield target_id, target[4], self._transform_to_dict(target[:4], list(translations))
+
+    @staticmethod
+    def _iter_past_rankings(cursor: sqlite3.Cursor):
+        """Yield (targetId, [(translationId, rank, discarded), ...]) for every evaluation."""
+        cursor.execute(
+            """
+            SELECT Evaluations.targetId, Rankings.evalId, Rankings.translationId, Rankings.rank, Rankings.discarded
+            FROM Rankings
+            JOIN Evaluations ON Evaluations.id = Rankings.evalId
+            ORDER BY Rankings.evalId
+            """
+        )
+        for (target_id, _), rows in groupby(cursor, key=lambda row: row[:2]):
+            yield target_id, [(row[2], row[3], bool(row[4])) for row in rows]
+
+    def _available_target(
+        self, cursor: sqlite3.Cursor, seen: Optional[TargetBitmap] = None
+    ) -> Optional[tuple]:
+        """Target row for a caller that takes no lease, see _available_targets()."""
+        targets = self._available_targets(cursor, 1, seen)
+        return targets[0] if targets else None
+
+    def _select_targets(
+        self, cursor: sqlite3.Cursor, limit: int, seen: Optional[TargetBitmap] = None
+    ) -> list[tuple]:
+        """The `limit` least evaluated target rows not in `seen`, read in order from the priority index."""
+        return self._unseen_targets(cursor, "numTranslations > 0 AND retired = FALSE", limit, seen)
+
+    def _available_targets(
+        self, cursor: sqlite3.Cursor, limit: int, seen: Optional[TargetBitmap] = None
+    ) -> list[tuple]:
+        """
+        Targets for a caller that takes no lease, leases disabled or an
+        anonymous caller: the least evaluated ones that nobody holds, shared
+        ones only when every target is leased. Read-only.
+        """
+        if self.lease_ttl <= 0:
+            return self._select_targets(cursor, limit, seen)
+        return self._with_shared(cursor, self._unleased_targets(cursor, limit, seen), limit, seen)
+
+    def _unleased_targets(
+        self, cursor: sqlite3.Cursor, limit: int, seen: Optional[TargetBitmap]
+    ) -> list[tuple]:
+        """The `limit` least evaluated targets without a live lease; walks the priority index."""
+        return self._unseen_targets(
+            cursor,
+            """
+            numTranslations > 0 AND retired = FALSE AND NOT EXISTS (
+                SELECT 1 FROM Leases WHERE Leases.targetId = Targets.id AND Leases.expiresAt > ?
+            )
+            """,
+            limit,
+            seen,
+            (time.time(),),
+        )
+
+    def _with_shared(
+        self, cursor: sqlite3.Cursor, targets: list[tuple], limit: int, seen: Optional[TargetBitmap]
+    ) -> list[tuple]:
+        """`targets` topped up to `limit` with the least evaluated leased ones, when every target is leased."""
+        if len(targets) >= limit:
+            return targets
+        taken = {target[0] for target in targets}
+        shared = [
+            target
+            for target in self._select_targets(cursor, limit + len(taken), seen)
+            if target[0] not in taken
+        ]
+        return targets + shared[: limit - len(targets)]
+
+    def _unseen_targets(
+        self,
+        cursor: sqlite3.Cursor,
+        condition: str,
+        limit: int,
+        seen: Optional[TargetBitmap],
+        params: tuple = (),
+    ) -> list[tuple]:
+        """
+        The first `limit` target rows matching `condition` in priority order,
+        those in `seen` skipped. Reads further ahead (4 times) as long as too
+        many were seen; the first limit + len(seen) rows always hold enough.
+        """
+        ahead = limit
+        while True:
+            cursor.execute(
+                f"""
+                SELECT id, context1, target, context2
+                FROM Targets
+                WHERE {condition}
+                ORDER BY {self._priority_order}
+                LIMIT ?
+                """,
+                (*params, ahead),
+            )
+            targets = cursor.fetchall()
+            if not seen:
+                return targets
+            unseen = [target for target in targets if target[0] not in seen]
+            if len(unseen) >= limit or len(targets) < ahead or ahead >= limit + len(seen):
+                return unseen[:limit]
+            ahead = min(ahead * 4, limit + len(seen))
+
+    def _lease_target(
+        self, cursor: sqlite3.Cursor, evaluator: Optional[str]
+    ) -> Optional[tuple]:
+        """Reserve a target for `evaluator` and return its row; must run in a write transaction."""
+        targets = self._lease_targets(cursor, evaluator, 1)
+        return targets[0] if targets else None
+
+    def _lease_targets(
+        self, cursor: sqlite3.Cursor, evaluator: Optional[str], limit: int
+    ) -> list[tuple]:
+        """
+        Reserve up to `limit` distinct targets for `evaluator` and return their
+        rows; must run in a write transaction.
+
+        Targets the evaluator already holds come first, then unleased ones in
+        priority order. Only when every target is leased are leased ones shared.
+        Targets the evaluator has evaluated, and retired ones, are skipped;
+        held leases are extended only for the targets returned. Anonymous
+        callers take no lease, see _available_targets().
+        """
+        seen = self.seen_by(evaluator, cursor)
+        if evaluator is None:
+            return self._available_targets(cursor, limit, seen)
+        now = time.time()
+        expires_at = now + self.lease_ttl
+
+        cursor.execute("DELETE FROM Leases WHERE expiresAt <= ?", (now,))
+
+        # Same evaluator asking again keeps its leases, the ones it gets are extended
+        cursor.execute(
+            f"""
+            SELECT id, context1, target, context2
+            FROM Targets
+            WHERE id IN (SELECT targetId FROM Leases WHERE evaluator = ?)
+                AND numTranslations > 0 AND retired = FALSE
+            ORDER BY {self._priority_order}
+            """,
+            (evaluator,),
+        )
+        targets = [target for target in cursor.fetchall() if not seen or target[0] not in seen]
+        targets = targets[:limit]
+        cursor.executemany(
+            "UPDATE Leases SET expiresAt = ? WHERE targetId = ?",
+            [(expires_at, target[0]) for target in targets],
+        )
+        if len(targets) >= limit:
+            return targets
+
+        # Walks the priority index, skipping only targets that are leased (or seen)
+        leased = self._unleased_targets(cursor, limit - len(targets), seen)
+        cursor.executemany(
+            "INSERT INTO Leases(targetId, evaluator, expiresAt) VALUES (?, ?, ?)",
+            [(target[0], evaluator, expires_at) for target in leased],
+        )
+        # Every target is leased, share the least evaluated ones
+        return self._with_shared(cursor, targets + leased, limit, seen)
+
+    def _release_lease(self, cursor: sqlite3.Cursor, target_id: int) -> None:
+        cursor.execute("DELETE FROM Leases WHERE targetId = ?", (target_id,))
@@ -0,0 +1,63 @@
+import sqlite3
+from typing import Optional
+from util.payload_cache import PayloadCache
+
+
+class CacheMixin:
+    """
+    Mixin for serving target payloads as cached, pre-encoded JSON.
+
+    Payloads are cached per targetId in a PayloadCache bounded by
+    `cache.size` entries. Writes that change a target's translations or
+    counts invalidate it, bulk operations invalidate everything. The cache
+    lives in one process, like the assignment index.
+
+    Requires host class to provide:
+    - config: dict: Database configuration
+    - read_only() -> Generator[sqlite3.Cursor, None, None]: Context manager for read-only DB access
+    - _build_payloads(cursor, targets) -> list[dict]: Payloads of target rows
+    - _get_target_payload(cursor, target_id) -> Optional[dict]: Payload of one target
+    """
+
+    @property
+    def payload_cache(self) -> PayloadCache:
+        if getattr(self, "_payload_cache", None) is None:
+            self._payload_cache = PayloadCache(self.config["cache"]["size"])
+        return self._payload_cache
+
+    def invalidate_payload_cache(self, target_ids: Optional[list[int]] = None) -> None:
+        """Drop the cached payloads of the given targets, or all of them."""
+        self.payload_cache.invalidate(target_ids)
+
+    def get_cached_target(self, target_id: int) -> Optional[tuple[str, bytes]]:
+        """(ETag, JSON bytes) of a target by id, read from the DB only on a cache miss."""
+        cached = self.payload_cache.get(target_id)
+        if cached is not None:
+            return cached
+
+        token = self.payload_cache.token()
+        with self.read_only() as cursor:
+            payload = self._get_target_payload(cursor, target_id)
+        return self.payload_cache.put(target_id, payload, token) if payload else None
+
+    def _cached_responses(
+        self, cursor: sqlite3.Cursor, targets: list[tuple], token: int
+    ) -> list[tuple[str, bytes]]:
+        """(ETag, JSON bytes) per target row; translations are read for cache misses only."""
+        cache = self.payload_cache
+        cached = {target[0]: cache.get(target[0]) for target in targets}
+        misses = [target for target in targets if cached[target[0]] is None]
+        if misses:
+            for target, payload in zip(misses, self._build_payloads(cursor, misses)):
+                cached[target[0]] = cache.put(target[0], payload, token)
+        return [cached[target[0]] for target in targets]
+
+    def _cached_payloads(self, payloads: list[dict], token: int) -> list[tuple[str, bytes]]:
+        """(ETag, JSON bytes) of payloads that are already built, e.g. by the assignment index."""
+        cache = self.payload_cache
+        responses = []
+        for payload in payloads:
+            target_id = payload["target"]["id"]
+            cached = cache.get(target_id)
+            responses.append(cached if cached is not None else cache.put(target_id, payload, token))
+        return responses
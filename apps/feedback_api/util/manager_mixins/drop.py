@@ -1,31 +1,77 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Tables holding data, those referencing others first
+DATA_TABLES = ("SeenTargets", "ModelWins", "ModelStats", "Leases", "Rankings", "Evaluations", "Translations", "Targets")
+
+
 class DropMixin:
     """
     Mixin for dropping tables.
     
     Requires host class to provide:
     - transaction() -> Generator[sqlite3.Cursor, None, None]: Context manager for DB transactions
+    - invalidate_assignment_index() -> None: Drop the in-process assignment index
+    - invalidate_payload_cache(target_ids=None) -> None: Drop cached target payloads
+    - invalidate_seen_targets() -> None: Drop the in-process seen targets
     """
 
     def drop_all_tables(self) -> bool:
+        """
+        Drop every table: data, full-text indexes, leftovers of interrupted
+        rebuilds and the migration bookkeeping, so the next migrate()
+        creates the schema from scratch.
+        """
         try:
             with self.transaction() as cursor:
-                cursor.execute("DROP TABLE IF EXISTS Rankings")
-                cursor.execute("DROP TABLE IF EXISTS Translations")
-                cursor.execute("DROP TABLE IF EXISTS Targets")
-                print("All tables dropped.")
-                return True
+                # Full-text indexes first, they drop their own shadow tables
+                cursor.execute(
+                    """
+                    SELECT name FROM sqlite_master
+                    WHERE type = 'table' AND name NOT LIKE 'sqlite_%'
+                    ORDER BY sql LIKE 'CREATE VIRTUAL TABLE%' DESC
+                    """
+                )
+                for (name,) in cursor.fetchall():
+                    cursor.execute(f'DROP TABLE IF EXISTS "{name}"')
+                logger.info("All tables dropped")
+            self.invalidate_assignment_index()
+            self.invalidate_payload_cache()
+            self.invalidate_seen_targets()
+            return True
         except Exception as e:
-            print(f"Error dropping database: {e}")
+            logger.error("Error dropping database: %s", e)
             return False
 
     def clear_all_tables(self) -> bool:
+        """
+        Delete every row and restart the ids at 1, keeping the schema. The
+        triggers on the tables are dropped meanwhile and recreated, so each
+        DELETE truncates its table instead of firing them row by row.
+        """
         try:
             with self.transaction() as cursor:
-                cursor.execute("TRUNCATE TABLE Rankings RESTART IDENTITY CASCADE")
-                cursor.execute("TRUNCATE TABLE Translations RESTART IDENTITY CASCADE")
-                cursor.execute("TRUNCATE TABLE Targets RESTART IDENTITY CASCADE")
-                print("All table data cleared.")
-                return True
+                placeholders = ", ".join("?" * len(DATA_TABLES))
+                cursor.execute(
+                    f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name IN ({placeholders})",
+                    DATA_TABLES,
+                )
+                triggers = cursor.fetchall()
+                for name, _ in triggers:
+                    cursor.execute(f"DROP TRIGGER {name}")
+                for table in DATA_TABLES:
+                    cursor.execute(f"DELETE FROM {table}")
+                for index in ("TranslationsSearch", "TargetsSearch"):
+                    cursor.execute(f"INSERT INTO {index}({index}) VALUES ('delete-all')")
+                cursor.execute(f"DELETE FROM sqlite_sequence WHERE name IN ({placeholders})", DATA_TABLES)
+                for _, sql in triggers:
+                    cursor.execute(sql)
+                logger.info("All table data cleared")
+            self.invalidate_assignment_index()
+            self.invalidate_payload_cache()
+            self.invalidate_seen_targets()
+            return True
         except Exception as e:
-            print(f"Error clearing database: {e}")
+            logger.error("Error clearing database: %s", e)
             return False
@@ -0,0 +1,183 @@
+import csv
+import io
+import json
+from typing import Iterator
+
+EXPORT_COLUMNS = [
+    "evalId",
+    "submittedAt",
+    "evaluator",
+    "targetId",
+    "context1",
+    "target",
+    "context2",
+    "translationId",
+    "model",
+    "translation",
+    "rank",
+    "discarded",
+]
+
+EXPORT_FORMATS = {
+    "jsonl": "application/x-ndjson",
+    "csv": "text/csv",
+    "columns": "application/x-ndjson",
+}
+
+# `schema` prefixes every table, e.g. "shard_1." for an ATTACHed database (see ShardRouter)
+EXPORT_QUERY = """
+    SELECT
+        Rankings.evalId,
+        Evaluations.submittedAt,
+        Evaluations.evaluator,
+        Targets.id,
+        Targets.context1,
+        Targets.target,
+        Targets.context2,
+        Translations.id,
+        Translations.model,
+        Translations.translation,
+        Rankings.rank,
+        Rankings.discarded
+    FROM {schema}Rankings AS Rankings
+    JOIN {schema}Evaluations AS Evaluations ON Evaluations.id = Rankings.evalId
+    JOIN {schema}Translations AS Translations ON Translations.id = Rankings.translationId
+    JOIN {schema}Targets AS Targets ON Targets.id = Translations.targetId
+    WHERE Rankings.evalId > ? AND Rankings.evalId <= ?
+    ORDER BY Rankings.evalId, Rankings.id
+"""
+
+
+def format_rankings(
+    batches: Iterator[list[tuple]], file_format: str, columns: list[str] = EXPORT_COLUMNS
+) -> Iterator[str]:
+    """
+    Stream batches of export rows as text chunks.
+
+    Formats:
+    - jsonl: one JSON object per ranking
+    - csv: header line, then one line per ranking
+    - columns: one JSON object of column arrays per batch of rankings
+
+    Raises:
+        ValueError: For unknown formats
+    """
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {file_format}")
+
+    if file_format == "csv":
+        yield ",".join(columns) + "\r\n"
+
+    for rows in batches:
+        if file_format == "jsonl":
+            yield "".join(
+                json.dumps(_export_row(columns, row), ensure_ascii=False) + "\n"
+                for row in rows
+            )
+        elif file_format == "csv":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            yield buffer.getvalue()
+        else:
+            data = {name: [row[i] for row in rows] for i, name in enumerate(columns)}
+            data["discarded"] = [bool(value) for value in data["discarded"]]
+            yield json.dumps(data, ensure_ascii=False) + "\n"
+
+
+def _export_row(columns: list[str], row: tuple) -> dict:
+    res = dict(zip(columns, row))
+    res["discarded"] = bool(res["discarded"])
+    return res
+
+
+class ExportMixin:
+    """
+    Mixin for exporting collected rankings.
+
+    Rows join Rankings with their Evaluations, Translations and Targets and
+    are streamed from a single cursor with fetchmany, so memory does not
+    depend on the size of the export.
+
+    Requires host class to provide:
+    - read_only() -> Generator[sqlite3.Cursor, None, None]: Context manager for read-only DB access
+    """
+
+    def get_export_watermark(self) -> int:
+        """Highest evalId currently stored, the `until` of an export started now."""
+        with self.read_only() as cursor:
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM Evaluations")
+            return cursor.fetchone()[0]
+
+    def iter_rankings(
+        self, since: int = 0, until: int = None, fetch_size: int = 1000
+    ) -> Iterator[list[tuple]]:
+        """
+        Yield batches of export rows for evaluations with since < evalId <= until.
+
+        `since` is the watermark of the previous export, so incremental
+        exports only read new evaluations.
+        """
+        if until is None:
+            until = self.get_export_watermark()
+
+        with self.read_only() as cursor:
+            cursor.execute(EXPORT_QUERY.format(schema=""), (since, until))
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                yield rows
+
+    def export_rankings(
+        self, file_format: str = "jsonl", since: int = 0, until: int = None
+    ) -> Iterator[str]:
+        """
+        Stream the export as text chunks, see format_rankings() for the formats.
+
+        Raises:
+            ValueError: For unknown formats
+        """
+        yield from format_rankings(self.iter_rankings(since, until), file_format)
+
+    def export_parquet(self, path: str, since: int = 0, until: int = None) -> int:
+        """
+        Write the export to a Parquet file, one row group per batch.
+
+        Requires the optional pyarrow package.
+
+        Returns:
+            Number of rankings written
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet export requires pyarrow (pip install pyarrow)") from e
+
+        schema = pa.schema(
+            [
+                ("evalId", pa.int64()),
+                ("submittedAt", pa.string()),
+                ("evaluator", pa.string()),
+                ("targetId", pa.int64()),
+                ("context1", pa.string()),
+                ("target", pa.string()),
+                ("context2", pa.string()),
+                ("translationId", pa.int64()),
+                ("model", pa.string()),
+                ("translation", pa.string()),
+                ("rank", pa.int64()),
+                ("discarded", pa.bool_()),
+            ]
+        )
+
+        written = 0
+        with pq.ParquetWriter(path, schema) as writer:
+            for rows in self.iter_rankings(since, until, fetch_size=65536):
+                columns = list(zip(*rows))
+                columns[-1] = [bool(value) for value in columns[-1]]
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(column) for column in columns], schema=schema
+                ))
+                written += len(rows)
+        return written
@@ -1,5 +1,10 @@
 import os
 import json
+import logging
+from itertools import groupby
+from util.manager_mixins.search import index_search_rows
+
+logger = logging.getLogger(__name__)
 
 
 class InitMixin:
@@ -8,120 +13,28 @@ class InitMixin:
     
     Requires host class to provide:
     - transaction() -> Generator[sqlite3.Cursor, None, None]: Context manager for DB transactions
+    - drop_all_tables() -> bool: Drop every table, schema bookkeeping included
+    - migrate(target=None) -> bool: Apply pending schema migrations
+    - invalidate_assignment_index() -> None: Drop the in-process assignment index
+    - invalidate_payload_cache(target_ids=None) -> None: Drop cached target payloads
+    - _update_model_stats(cursor, rankings) -> None: Add an evaluation to the leaderboard
+    - _rebuild_agreement(cursor) -> tuple[int, int]: Recompute agreement from all rankings
     - data_dir: str: Path to directory where database should be stored
     - example_dir: str: Path to example data JSON file
     """
 
     def initialize_schema(self) -> bool:
+        """Drop every table and create the latest schema, see migrate()."""
         try:
             os.makedirs(self.data_dir, exist_ok=True)
 
-            with self.transaction() as cursor:
-                # Drop existing tables
-                cursor.execute("DROP TABLE IF EXISTS Rankings")
-                cursor.execute("DROP TABLE IF EXISTS Translations")
-                cursor.execute("DROP TABLE IF EXISTS Targets")
-
-                # Create tables
-                cursor.execute(
-                    """
-                    CREATE TABLE Targets (
-                        id INTEGER PRIMARY KEY,
-                        target TEXT NOT NULL,
-                        context1 TEXT NOT NULL,
-                        context2 TEXT NOT NULL
-                    )
-                """
-                )
-
-                cursor.execute(
-                    """
-                    CREATE TABLE Translations (
-                        id INTEGER PRIMARY KEY,
-                        targetId INTEGER NOT NULL,
-                        translation TEXT NOT NULL,
-                        model TEXT NOT NULL,
-                        numEvals INTEGER NOT NULL DEFAULT 0,
-                        FOREIGN KEY(targetId) REFERENCES Targets(id)
-                    )
-                """
-                )
-
-                cursor.execute(
-                    """
-                    CREATE TABLE Rankings (
-                        id INTEGER PRIMARY KEY,
-                        translationId INTEGER NOT NULL,
-                        evalId INTEGER NOT NULL,
-                        rank INTEGER,
-                        discarded BOOLEAN,
-                        FOREIGN KEY(translationId) REFERENCES Translations(id)
-                    )
-                """
-                )
-
-                # Indexes
-                cursor.execute(
-                    "CREATE INDEX idx_translations_target_id ON Translations(targetId)"
-                )
-                cursor.execute(
-                    "CREATE INDEX idx_translations_num_evals ON Translations(numEvals, id)"
-                )
-                cursor.execute(
-                    "CREATE INDEX idx_rankings_translation_id ON Rankings(translationId)"
-                )
-                cursor.execute(
-                    "CREATE INDEX idx_rankings_eval_id ON Rankings(evalId)"
-                )
-                cursor.execute(
-                    "CREATE INDEX idx_translations_evals_target ON Translations(numEvals, targetId, id)"
-                )
-
-                cursor.execute(
-                    "CREATE UNIQUE INDEX idx_unique_ranks_per_eval ON Rankings(evalId, rank) WHERE discarded = FALSE;"
-                )
-
-                # Triggers 
-                cursor.execute(
-                    """
-                    CREATE TRIGGER update_translation_evals_insert
-                    AFTER INSERT ON Rankings
-                    FOR EACH ROW
-                    BEGIN
-                        UPDATE Translations 
-                        SET numEvals = (
-                            SELECT COUNT(*) 
-                            FROM Rankings 
-                            WHERE translationId = NEW.translationId
-                        )
-                        WHERE id = NEW.translationId;
-                    END
-                """
-                )
-
-                cursor.execute(
-                    """
-                    CREATE TRIGGER update_translation_evals_delete
-                    AFTER DELETE ON Rankings
-                    FOR EACH ROW
-                    BEGIN
-                        UPDATE Translations 
-                        SET numEvals = (
-                            SELECT COUNT(*) 
-                            FROM Rankings 
-                            WHERE translationId = OLD.translationId
-                        )
-                        WHERE id = OLD.translationId;
-                    END
-                """
-                )
-
-
-            print("Database schema initialized successfully.")
+            if not self.drop_all_tables() or not self.migrate():
+                return False
+            logger.info("Database schema initialized successfully")
             return True
 
         except Exception as e:
-            print(f"Error initializing database: {e}")
+            logger.error("Error initializing database: %s", e)
             return False
 
     def load_example_data(
@@ -135,48 +48,90 @@ class InitMixin:
 
             with self.transaction() as cursor:
                 # Targets
-                for target in example_data["targets"]:
-                    cursor.execute(
-                        "INSERT INTO Targets(id, context1, target, context2) VALUES (?, ?, ?, ?)",
+                cursor.executemany(
+                    "INSERT INTO Targets(id, context1, target, context2) VALUES (?, ?, ?, ?)",
+                    [
                         (
                             target["id"],
                             target["context1"],
                             target["target"],
                             target["context2"],
-                        ),
-                    )
+                        )
+                        for target in example_data["targets"]
+                    ],
+                )
+                index_search_rows(cursor, "Targets", ids=[target["id"] for target in example_data["targets"]])
 
                 # Translations if enabled
+                # numEvals is counted by the triggers when rankings are loaded too
                 if include_translations:
-                    for translation in example_data["translations"]:
-                        cursor.execute(
-                            "INSERT INTO Translations(id, targetId, translation, model, numEvals) VALUES (?, ?, ?, ?, ?)",
+                    cursor.executemany(
+                        "INSERT INTO Translations(id, targetId, translation, model, numEvals) VALUES (?, ?, ?, ?, ?)",
+                        [
                             (
                                 translation["id"],
                                 translation["targetId"],
                                 translation["translation"],
                                 translation["model"],
-                                translation["numEvals"],
-                            ),
-                        )
+                                0 if include_rankings else translation["numEvals"],
+                            )
+                            for translation in example_data["translations"]
+                        ],
+                    )
+                    index_search_rows(
+                        cursor,
+                        "Translations",
+                        ids=[translation["id"] for translation in example_data["translations"]],
+                    )
 
                 # Rankings if enabled
                 if include_rankings:
-                    for ranking in example_data["rankings"]:
-                        cursor.execute(
-                            "INSERT INTO Rankings(id, evalId, translationId, rank, discarded) VALUES (?, ?, ?, ?, ?)",
+                    cursor.executemany(
+                        "INSERT INTO Rankings(id, evalId, translationId, rank, discarded) VALUES (?, ?, ?, ?, ?)",
+                        [
                             (
                                 ranking["id"],
                                 ranking["evalId"],
                                 ranking["translationId"],
                                 ranking["rank"],
                                 ranking["discarded"],
-                            ),
-                        )
+                            )
+                            for ranking in example_data["rankings"]
+                        ],
+                    )
+
+                    # Evaluations are derived from the rankings they group
+                    cursor.execute(
+                        """
+                        INSERT INTO Evaluations(id, targetId, numRankings, numRanked)
+                        SELECT
+                            Rankings.evalId,
+                            MIN(Translations.targetId),
+                            COUNT(*),
+                            SUM(NOT Rankings.discarded)
+                        FROM Rankings
+                        JOIN Translations ON Translations.id = Rankings.translationId
+                        GROUP BY Rankings.evalId
+                        """
+                    )
+
+                    cursor.execute(
+                        """
+                        SELECT Rankings.evalId, Translations.model, Rankings.rank, Rankings.discarded
+                        FROM Rankings
+                        JOIN Translations ON Translations.id = Rankings.translationId
+                        ORDER BY Rankings.evalId
+                        """
+                    )
+                    for _, rows in groupby(cursor.fetchall(), key=lambda row: row[0]):
+                        self._update_model_stats(cursor, [row[1:] for row in rows])
+                    self._rebuild_agreement(cursor)
 
-            print("Example data loaded successfully.")
+            self.invalidate_assignment_index()
+            self.invalidate_payload_cache()
+            logger.info("Example data loaded successfully")
             return True
 
         except Exception as e:
-            print(f"Error loading example data: {e}")
+            logger.error("Error loading example data: %s", e)
             return False
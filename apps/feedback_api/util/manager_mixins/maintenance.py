@@ -0,0 +1,81 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MaintenanceMixin:
+    """
+    Mixin for repairing denormalized data.
+
+    Requires host class to provide:
+    - transaction() -> Generator[sqlite3.Cursor, None, None]: Context manager for DB transactions
+    - invalidate_assignment_index() -> None: Drop the in-process assignment index
+    - invalidate_payload_cache(target_ids=None) -> None: Drop cached target payloads
+    """
+
+    def recount_num_evals(self) -> bool:
+        """
+        Rebuild Translations.numEvals from Rankings and the Targets counters
+        (numTranslations, numEvals, numRanked) from Translations and Evaluations.
+
+        Triggers maintain the counters incrementally, this is meant for
+        repair after bulk loads that bypass or disable them.
+        """
+        try:
+            with self.transaction() as cursor:
+                cursor.execute(
+                    """
+                    WITH counts AS (
+                        SELECT Translations.id AS id, COUNT(Rankings.id) AS n
+                        FROM Translations
+                        LEFT JOIN Rankings ON Rankings.translationId = Translations.id
+                        GROUP BY Translations.id
+                    )
+                    UPDATE Translations
+                    SET numEvals = counts.n
+                    FROM counts
+                    WHERE counts.id = Translations.id AND Translations.numEvals != counts.n
+                    """
+                )
+                cursor.execute("SELECT changes()")
+                translations_fixed = cursor.fetchone()[0]
+
+                cursor.execute(
+                    """
+                    WITH counts AS (
+                        SELECT
+                            Targets.id AS id,
+                            (SELECT COUNT(*) FROM Translations WHERE targetId = Targets.id) AS numTranslations,
+                            COUNT(Evaluations.id) AS numEvals,
+                            COALESCE(SUM(Evaluations.numRanked), 0) AS numRanked
+                        FROM Targets
+                        LEFT JOIN Evaluations ON Evaluations.targetId = Targets.id
+                        GROUP BY Targets.id
+                    )
+                    UPDATE Targets
+                    SET
+                        numTranslations = counts.numTranslations,
+                        numEvals = counts.numEvals,
+                        numRanked = counts.numRanked
+                    FROM counts
+                    WHERE counts.id = Targets.id AND (
+                        Targets.numTranslations != counts.numTranslations
+                        OR Targets.numEvals != counts.numEvals
+                        OR Targets.numRanked != counts.numRanked
+                    )
+                    """
+                )
+                cursor.execute("SELECT changes()")
+                targets_fixed = cursor.fetchone()[0]
+
+                logger.info(
+                    "numEvals recounted, %d translations and %d targets corrected",
+                    translations_fixed,
+                    targets_fixed,
+                )
+            self.invalidate_assignment_index()
+            self.invalidate_payload_cache()
+            return True
+        except Exception as e:
+            logger.error("Error recounting numEvals: %s", e)
+            return False
@@ -0,0 +1,127 @@
+import logging
+import os
+import time
+from typing import Optional
+from util.migrations import Migration, pending
+
+logger = logging.getLogger(__name__)
+
+
+class MigrationMixin:
+    """
+    Mixin for bringing the schema to the latest version.
+
+    Applied versions are recorded in schema_version. On an up-to-date
+    database migrate() is a single read, so it runs on every startup.
+
+    Requires host class to provide:
+    - config: dict: Database configuration
+    - db_path: str: Path to the database file
+    - data_dir: str: Path to directory where database should be stored
+    - write(operation) -> T: Run an operation in a write transaction
+    - read_only() -> Generator[sqlite3.Cursor, None, None]: Context manager for read-only DB access
+    - invalidate_assignment_index() -> None: Drop the in-process assignment index
+    - invalidate_payload_cache(target_ids=None) -> None: Drop cached target payloads
+    - invalidate_seen_targets() -> None: Drop the in-process seen targets
+    - The methods named in Migration.backfills, e.g. _rebuild_agreement(cursor)
+    """
+
+    def schema_version(self) -> int:
+        """Latest applied migration, 0 for an empty database."""
+        if not os.path.exists(self.db_path):
+            return 0
+        with self.read_only() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+            )
+            if cursor.fetchone() is None:
+                return 0
+            cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+            return cursor.fetchone()[0]
+
+    def migrate(self, target: Optional[int] = None) -> bool:
+        """Apply the pending migrations up to `target` (default: the latest)."""
+        try:
+            start = time.perf_counter()
+            current = self.schema_version()
+            migrations = pending(current, target)
+            if not migrations:
+                logger.info(
+                    "Schema at version %d, up to date (%.1f ms)",
+                    current,
+                    (time.perf_counter() - start) * 1000,
+                )
+                return True
+
+            os.makedirs(self.data_dir, exist_ok=True)
+            for migration in migrations:
+                self._apply_migration(migration)
+            self.invalidate_assignment_index()
+            self.invalidate_payload_cache()
+            self.invalidate_seen_targets()
+            logger.info(
+                "Schema migrated from version %d to %d in %.2fs",
+                current,
+                migrations[-1].version,
+                time.perf_counter() - start,
+            )
+            return True
+
+        except Exception as e:
+            logger.error("Error migrating database: %s", e)
+            return False
+
+    def _apply_migration(self, migration: Migration) -> None:
+        logger.info("Applying migration %d: %s", migration.version, migration.description)
+        self.write(self._create_migration_tables)
+
+        batch_size = self.config["migrations"]["batch_size"]
+        pause = self.config["migrations"]["pause_ms"] / 1000
+        for rebuild in migration.rebuilds:
+            self.write(rebuild.prepare)
+            copied = 0
+            # One short transaction per batch, other writers get the lock in between
+            while rows := self.write(lambda cursor: rebuild.copy_batch(cursor, batch_size)):
+                copied += rows
+                time.sleep(pause)
+            logger.info("Rebuilt %s, %d rows copied", rebuild.table, copied)
+
+        def finish(cursor) -> None:
+            cursor.execute(
+                "SELECT 1 FROM schema_version WHERE version = ?", (migration.version,)
+            )
+            if cursor.fetchone() is not None:
+                raise RuntimeError(f"Migration {migration.version} was applied concurrently")
+            for rebuild in migration.rebuilds:
+                rebuild.swap(cursor)
+            for statement in migration.statements:
+                cursor.execute(statement)
+            for backfill in migration.backfills:
+                getattr(self, backfill)(cursor)
+            cursor.execute(
+                "INSERT INTO schema_version(version, description) VALUES (?, ?)",
+                (migration.version, migration.description),
+            )
+
+        self.write(finish)
+
+    @staticmethod
+    def _create_migration_tables(cursor) -> None:
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                appliedAt TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        # Progress of online table rebuilds, see TableRebuild
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_rebuilds (
+                tableName TEXT PRIMARY KEY,
+                lastRowid INTEGER NOT NULL
+            )
+            """
+        )
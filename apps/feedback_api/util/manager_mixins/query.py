@@ -1,4 +1,26 @@
-from typing import Optional
+import json
+import logging
+import sqlite3
+from itertools import groupby
+from typing import Iterable, Optional
+from util.manager_mixins.search import index_search_rows
+from util.metrics import timed_query
+
+logger = logging.getLogger(__name__)
+
+
+def unknown_targets(cursor: sqlite3.Cursor, target_ids: Iterable[int]) -> list[int]:
+    """Ids among `target_ids` that have no target, found with a single query."""
+    cursor.execute(
+        """
+        SELECT ids.value
+        FROM json_each(?) AS ids
+        LEFT JOIN Targets ON Targets.id = ids.value
+        WHERE Targets.id IS NULL
+        """,
+        (json.dumps(sorted(set(target_ids))),),
+    )
+    return [row[0] for row in cursor.fetchall()]
 
 
 class QueryMixin:
@@ -6,131 +28,394 @@ class QueryMixin:
     Mixin for running specific queries.
 
     Requires host class to provide:
-    - transaction() -> Generator[sqlite3.Cursor, None, None]: Context manager for DB transactions
+    - write(operation) -> Any: Run operation(cursor) in a (possibly group-committed) write transaction
     - read_only() -> Generator[sqlite3.Cursor, None, None]: Context manager for read-only DB access
+    - lease_ttl: float: Seconds a target stays reserved, 0 disables leases
+    - _available_target(cursor, seen=None) -> Optional[tuple]: Selection without a lease
+    - _lease_target(cursor, evaluator) -> Optional[tuple]: Leased target selection
+    - _available_targets(cursor, limit, seen=None) -> list[tuple]: Selection of several targets without leases
+    - _lease_targets(cursor, evaluator, limit) -> list[tuple]: Leased selection of several targets
+    - _release_lease(cursor, target_id) -> None: Return a target to the pool
+    - assignment_backend: str: "sql" or "index"
+    - _priority_column: str: Targets counter the index is keyed by
+    - assignment_index: AssignmentIndex: In-process index used by the "index" backend
+    - _active_assignment_index() -> Optional[AssignmentIndex]: Index to keep in sync, if built
+    - _refresh_assignment_index(target_ids) -> None: Re-read targets into the index
+    - _update_model_stats(cursor, rankings) -> None: Add an evaluation to the leaderboard
+    - _update_agreement(cursor, target_id, rankings) -> bool: Add an evaluation to its target's agreement
+    - payload_cache: PayloadCache: Pre-encoded target payloads
+    - invalidate_payload_cache(target_ids=None) -> None: Drop cached target payloads
+    - _cached_responses(cursor, targets, token) -> list[tuple[str, bytes]]: Encoded payloads of target rows
+    - _cached_payloads(payloads, token) -> list[tuple[str, bytes]]: Encoded built payloads
+    - seen_by(evaluator, cursor=None) -> Optional[TargetBitmap]: Targets the evaluator has evaluated
+    - _record_seen(evaluated) -> None: Add committed (evaluator, targetId) evaluations to the seen targets
     """
 
-    def get_target_with_translations(self) -> Optional[dict]:
+    @timed_query()
+    def get_target_with_translations(
+        self, evaluator: Optional[str] = None
+    ) -> Optional[dict]:
         try:
-            with self.read_only() as cursor:
-                # Get the least evaluated translation
-                cursor.execute(
-                    """
-                    SELECT 
-                        id,
-                        targetId,
-                        translation,
-                        model,
-                        numEvals
-                    FROM Translations
-                    ORDER BY numEvals ASC, id ASC
-                    LIMIT 1
-                    """
+            if self.assignment_backend == "index":
+                res = self.assignment_index.acquire(
+                    evaluator, self.lease_ttl, self.seen_by(evaluator)
                 )
-                row = cursor.fetchone()
-                if not row:
-                    print("No translations found.")
-                    return None
-                targetId = row[1]
-
-                # Find corresponding target
-                cursor.execute(
-                    """
-                    SELECT 
-                        id,
-                        context1,
-                        target,
-                        context2
-                    FROM Targets
-                    WHERE id=?
-                    """,
-                    (targetId,),
-                )
-                target = cursor.fetchone()
-                if not target:
-                    print(f"No target found for targetId {targetId}.")
-                    return None
-
-                # Get all translations for this target
-                cursor.execute(
-                    """
-                    SELECT 
-                        id,
-                        targetId,
-                        translation,
-                        model,
-                        numEvals
-                    FROM Translations
-                    WHERE targetId = ?
-                    """,
-                    (targetId,),
+            elif self.lease_ttl > 0 and evaluator is not None:
+                res = self.write(
+                    lambda cursor: self._build_payload(
+                        cursor, self._lease_target(cursor, evaluator)
+                    )
                 )
-                translations = cursor.fetchall()
-                print(f"Found {len(translations)} translations")
+            else:
+                with self.read_only() as cursor:
+                    target = self._available_target(cursor, self.seen_by(evaluator, cursor))
+                    res = self._build_payload(cursor, target)
 
-            res = self._transform_to_dict(target, translations)
             return res if res else None
 
         except Exception as e:
-            print(f"Error getting resulting dict: {e}")
+            logger.error("Error getting resulting dict: %s", e)
+            return None
+
+    @timed_query()
+    def get_targets_with_translations(
+        self, n: int, evaluator: Optional[str] = None
+    ) -> Optional[list[dict]]:
+        """
+        Get up to n distinct targets with their translations, picked and
+        leased by the same rules as get_target_with_translations(), so a
+        client can prefetch the items it will show next.
+        """
+        try:
+            if self.assignment_backend == "index":
+                return self.assignment_index.acquire_many(
+                    evaluator, n, self.lease_ttl, self.seen_by(evaluator)
+                )
+            elif self.lease_ttl > 0 and evaluator is not None:
+                return self.write(
+                    lambda cursor: self._build_payloads(
+                        cursor, self._lease_targets(cursor, evaluator, n)
+                    )
+                )
+            else:
+                with self.read_only() as cursor:
+                    targets = self._available_targets(cursor, n, self.seen_by(evaluator, cursor))
+                    return self._build_payloads(cursor, targets)
+
+        except Exception as e:
+            logger.error("Error getting resulting dicts: %s", e)
+            return None
+
+    @timed_query()
+    def get_target_responses(
+        self, n: int, evaluator: Optional[str] = None
+    ) -> Optional[list[tuple[str, bytes]]]:
+        """
+        The targets get_targets_with_translations() would pick, as
+        (ETag, JSON bytes) pairs served from the payload cache. Translations
+        are only read and encoded for targets that are not cached.
+        """
+        try:
+            token = self.payload_cache.token()
+            if self.assignment_backend == "index":
+                payloads = self.assignment_index.acquire_many(
+                    evaluator, n, self.lease_ttl, self.seen_by(evaluator)
+                )
+                return self._cached_payloads(payloads, token)
+            elif self.lease_ttl > 0 and evaluator is not None:
+                return self.write(
+                    lambda cursor: self._cached_responses(
+                        cursor, self._lease_targets(cursor, evaluator, n), token
+                    )
+                )
+            else:
+                with self.read_only() as cursor:
+                    targets = self._available_targets(cursor, n, self.seen_by(evaluator, cursor))
+                    return self._cached_responses(cursor, targets, token)
+
+        except Exception as e:
+            logger.error("Error getting cached responses: %s", e)
             return None
 
+    @timed_query()
     def add_targets(self, targets: list[dict]) -> bool:
         try:
-            with self.transaction() as cursor:
-                for target in targets:
-                    cursor.execute(
-                        "INSERT INTO Targets(context1, target, context2) VALUES (?, ?, ?)",
+
+            def operation(cursor: sqlite3.Cursor) -> list[int]:
+                # Ids are assigned explicitly so the index can be refreshed
+                cursor.execute("SELECT COALESCE(MAX(id), 0) FROM Targets")
+                first_id = cursor.fetchone()[0] + 1
+                target_ids = list(range(first_id, first_id + len(targets)))
+                cursor.executemany(
+                    "INSERT INTO Targets(id, context1, target, context2) VALUES (?, ?, ?, ?)",
+                    [
                         (
+                            target_id,
                             target["context1"],
                             target["target"],
                             target["context2"],
-                        ),
-                    )
-            print("Targets added")
+                        )
+                        for target_id, target in zip(target_ids, targets)
+                    ],
+                )
+                index_search_rows(cursor, "Targets", after=first_id - 1)
+                return target_ids
+
+            target_ids = self.write(operation)
+            self._refresh_assignment_index(target_ids)
+            logger.debug("Added %d targets", len(targets))
+            return True
         except Exception as e:
-            print(f"Error adding targets: {e}")
+            logger.error("Error adding targets: %s", e)
             return False
 
+    @timed_query()
     def add_translations(self, translations: list[dict]) -> bool:
         try:
-            self._validate_translations(translations)
-            with self.transaction() as cursor:
-                for translation in translations:
-                    cursor.execute(
-                        "INSERT INTO Translations(targetId, translation, model, numEvals) VALUES (?, ?, ?, 0)",
+
+            def operation(cursor: sqlite3.Cursor) -> None:
+                self._validate_translations(cursor, translations)
+                cursor.execute("SELECT COALESCE(MAX(id), 0) FROM Translations")
+                last_id = cursor.fetchone()[0]
+                cursor.executemany(
+                    "INSERT INTO Translations(targetId, translation, model, numEvals) VALUES (?, ?, ?, 0)",
+                    [
                         (
                             translation["targetId"],
                             translation["translation"],
                             translation["model"],
-                        ),
-                    )
-            print("Translations added")
+                        )
+                        for translation in translations
+                    ],
+                )
+                index_search_rows(cursor, "Translations", after=last_id)
+
+            self.write(operation)
+            target_ids = sorted({int(translation["targetId"]) for translation in translations})
+            self._refresh_assignment_index(target_ids)
+            self.invalidate_payload_cache(target_ids)
+            logger.debug("Added %d translations", len(translations))
+            return True
         except Exception as e:
-            print(f"Error adding translations: {e}")
+            logger.error("Error adding translations: %s", e)
             return False
 
-    def add_evaluation(self, options_ranking: list[dict]) -> bool:
+    def add_evaluation(
+        self, options_ranking: list[dict], evaluator: Optional[str] = None
+    ) -> bool:
+        logger.debug("Adding evaluation %s", options_ranking)
+        result = self.add_evaluations([options_ranking], evaluator)[0]
+        if result["success"]:
+            logger.debug("Evaluation added")
+        else:
+            logger.warning("Error adding evaluation: %s", result["error"])
+        return result["success"]
+
+    @timed_query()
+    def add_evaluations(
+        self, evaluations: list[list[dict]], evaluator: Optional[str] = None
+    ) -> list[dict]:
+        """
+        Validate and insert many evaluations in a single transaction, shared
+        with concurrent writes when the writer is started. `evaluator`, who
+        submitted them, is stored with each evaluation, and its targets are
+        no longer assigned to them.
+
+        Translations of all evaluations are validated with one query. Each
+        evaluation is inserted under its own savepoint, so a failing one is
+        rolled back alone.
+
+        Returns:
+            One result per evaluation, in order:
+            {"success": True, "evalId": int, "targetId": int} or
+            {"success": False, "error": str}
+        """
         try:
-            print(options_ranking)
-            self._validate_rankings(options_ranking)
-            new_eval_id = self._get_new_eval_id()
-            with self.transaction() as cursor:
-                for eval in options_ranking:
-                    cursor.execute(
-                        "INSERT INTO Rankings (translationId, evalId, rank, discarded) VALUES (?, ?, ?, ?)",
+            index = self._active_assignment_index()
+
+            def operation(cursor: sqlite3.Cursor) -> tuple[list[dict], list[tuple]]:
+                results = self._insert_evaluations(cursor, evaluations, evaluator)
+                index_updates = []
+                if index is not None:
+                    evaluated: dict[int, list[list[tuple]]] = {}
+                    for result, options_ranking in zip(results, evaluations):
+                        if result["success"]:
+                            evaluated.setdefault(result["targetId"], []).append(
+                                [
+                                    (int(eval["translationId"]), int(eval["rank"]), bool(eval["discarded"]))
+                                    for eval in options_ranking
+                                ]
+                            )
+                    for target_id, rankings in evaluated.items():
+                        cursor.execute(
+                            f"SELECT {self._priority_column}, retired FROM Targets WHERE id = ?",
+                            (target_id,),
+                        )
+                        count, retired = cursor.fetchone()
+                        payload = None if retired else self._get_target_payload(cursor, target_id)
+                        index_updates.append((target_id, count, payload, rankings))
+                return results, index_updates
+
+            results, index_updates = self.write(operation)
+
+            # Index and cache are only touched once the evaluations are committed,
+            # the index first so the cache cannot be refilled from a stale index
+            for target_id, count, payload, rankings in index_updates:
+                if payload is None:
+                    # Retired
+                    index.remove(target_id)
+                else:
+                    index.record_evaluation(target_id, count, payload, rankings)
+            self.invalidate_payload_cache(
+                sorted({r["targetId"] for r in results if r["success"]})
+            )
+            if evaluator is not None:
+                self._record_seen([(evaluator, r["targetId"]) for r in results if r["success"]])
+            return results
+
+        except Exception as e:
+            logger.error("Error adding evaluations: %s", e)
+            return [{"success": False, "error": str(e)} for _ in evaluations]
+
+    def _insert_evaluations(
+        self,
+        cursor: sqlite3.Cursor,
+        evaluations: list[list[dict]],
+        evaluator: Optional[str] = None,
+    ) -> list[dict]:
+        translation_ids = []
+        for options_ranking in evaluations:
+            try:
+                translation_ids.extend(int(eval["translationId"]) for eval in options_ranking)
+            except (KeyError, TypeError, ValueError):
+                pass  # Reported by _validate_rankings below
+        translations = self._get_translations_info(cursor, translation_ids)
+
+        results = []
+        for options_ranking in evaluations:
+            cursor.execute("SAVEPOINT evaluation")
+            try:
+                target_id = self._validate_rankings(options_ranking, translations)
+                new_eval_id = self._add_evaluation_row(
+                    cursor,
+                    target_id,
+                    len(options_ranking),
+                    sum(not eval["discarded"] for eval in options_ranking),
+                    evaluator,
+                )
+                self._release_lease(cursor, target_id)
+                rankings = [
+                    (int(eval["translationId"]), int(eval["rank"]), bool(eval["discarded"]))
+                    for eval in options_ranking
+                ]
+                cursor.executemany(
+                    "INSERT INTO Rankings (translationId, evalId, rank, discarded) VALUES (?, ?, ?, ?)",
+                    [
                         (
                             int(eval["translationId"]),
                             new_eval_id,
                             int(eval["rank"]),
                             eval["discarded"],
-                        ),
-                    )
-            print("Evaluation added")
-            return True
-        except Exception as e:
-            print(f"Error adding evaluation: {e}")
-            return False
+                        )
+                        for eval in options_ranking
+                    ],
+                )
+                self._update_model_stats(
+                    cursor,
+                    [
+                        (
+                            translations[int(eval["translationId"])][1],
+                            int(eval["rank"]),
+                            eval["discarded"],
+                        )
+                        for eval in options_ranking
+                    ],
+                )
+                self._update_agreement(cursor, target_id, rankings)
+                cursor.execute("RELEASE evaluation")
+                results.append(
+                    {"success": True, "evalId": new_eval_id, "targetId": target_id}
+                )
+            except Exception as e:
+                cursor.execute("ROLLBACK TO evaluation")
+                cursor.execute("RELEASE evaluation")
+                results.append({"success": False, "error": str(e)})
+        return results
+
+    def _get_target_payload(
+        self, cursor: sqlite3.Cursor, target_id: int
+    ) -> Optional[dict]:
+        # Find corresponding target
+        cursor.execute(
+            """
+            SELECT 
+                id,
+                context1,
+                target,
+                context2
+            FROM Targets
+            WHERE id=?
+            """,
+            (target_id,),
+        )
+        target = cursor.fetchone()
+        if not target:
+            logger.debug("No target found for targetId %s", target_id)
+            return None
+        return self._build_payload(cursor, target)
+
+    def _build_payload(
+        self, cursor: sqlite3.Cursor, target: Optional[tuple]
+    ) -> Optional[dict]:
+        if target is None:
+            logger.debug("No translations found")
+            return None
+
+        # Get all translations for this target
+        cursor.execute(
+            """
+            SELECT 
+                id,
+                targetId,
+                translation,
+                model,
+                numEvals
+            FROM Translations
+            WHERE targetId = ?
+            """,
+            (target[0],),
+        )
+        translations = cursor.fetchall()
+        logger.debug("Found %d translations", len(translations))
+
+        return self._transform_to_dict(target, translations)
+
+    def _build_payloads(
+        self, cursor: sqlite3.Cursor, targets: list[tuple]
+    ) -> list[dict]:
+        """Payloads of several targets, their translations read with one query."""
+        cursor.execute(
+            """
+            SELECT 
+                id,
+                targetId,
+                translation,
+                model,
+                numEvals
+            FROM Translations
+            WHERE targetId IN (SELECT value FROM json_each(?))
+            ORDER BY targetId, id
+            """,
+            (json.dumps([target[0] for target in targets]),),
+        )
+        translations = {
+            target_id: list(rows)
+            for target_id, rows in groupby(cursor.fetchall(), key=lambda row: row[1])
+        }
+        return [
+            self._transform_to_dict(target, translations.get(target[0], []))
+            for target in targets
+        ]
 
     def _transform_to_dict(self, target: tuple, translations: tuple) -> Optional[dict]:
         try:
@@ -154,69 +439,77 @@ class QueryMixin:
                 )
             return res if res else None
         except Exception as e:
-            print(f"Error creating dict from a target and translations: {e}")
+            logger.error("Error creating dict from a target and translations: %s", e)
             return None
 
-    def _validate_rankings(self, options_ranking: list[dict]) -> None:
+    def _validate_rankings(
+        self, options_ranking: list[dict], translations: dict[int, tuple[int, str]]
+    ) -> int:
+        """Check one ranking list against prefetched translations info, return its target."""
         # Uniqueness of ranks is verified by db index, so here only translations are verified
         if not options_ranking:
             raise ValueError(f"Got not proper ranking dict: it is empty")
 
-        unique_translations = [eval["translationId"] for eval in options_ranking]
-        target = self._get_target_id(unique_translations[0])
-        for tr in unique_translations[1:]:
-            if target != self._get_target_id(tr):
-                raise ValueError(
-                    f"Got not proper ranking dict: rankings for different targets"
-                )
+        try:
+            translation_ids = [int(eval["translationId"]) for eval in options_ranking]
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Got not proper ranking dict: bad translationId ({e!r})")
+        if len(set(translation_ids)) != len(translation_ids):
+            raise ValueError(
+                f"Got not proper ranking dict: rankings for same translations"
+            )
+
+        missing = [tr for tr in translation_ids if tr not in translations]
+        if missing:
+            raise ValueError(
+                f"Got not proper ranking dict: unknown translations {missing}"
+            )
 
-        if not (len(unique_translations) == len(options_ranking)):
+        targets = {translations[tr][0] for tr in translation_ids}
+        if len(targets) > 1:
             raise ValueError(
-                f"Got not proper ranking dict: rankings for same trnalsations"
+                f"Got not proper ranking dict: rankings for different targets {sorted(targets)}"
             )
+        return targets.pop()
 
-    def _validate_translations(self, translations) -> None:
+    def _validate_translations(
+        self, cursor: sqlite3.Cursor, translations: list[dict]
+    ) -> None:
         if not translations:
             raise ValueError(f"Got not proper tranlsations dict: it is empty")
 
-        for translation in translations:
-            try:
-                with self.read_only() as cursor:
-                    cursor.execute(
-                        "SELECT * from Targets WHERE id=?", (translation["targetId"],)
-                    )
-                    res = cursor.fetchone()
-                    if not res:
-                        raise ValueError(
-                            "Got not proper translations dict: target is not known"
-                        )
-            except:
-                raise ValueError(
-                    "Got not proper translations dict: imossible to validate"
-                )
-
-    def _get_new_eval_id(self) -> Optional[int]:
-        try:
-            with self.read_only() as cursor:
-                cursor.execute(
-                    "SELECT evalId from Rankings ORDER BY evalId DESC LIMIT 1"
-                )
-                row = cursor.fetchone()
-                return row[0] + 1 if row else 1
-
-        except Exception as e:
-            print(f"Error getting new evaluation id: {e}")
-            return None
+        missing = unknown_targets(cursor, (int(translation["targetId"]) for translation in translations))
+        if missing:
+            raise ValueError(
+                f"Got not proper translations dict: unknown targets {missing}"
+            )
 
-    def _get_target_id(self, translation_id: int) -> Optional[int]:
-        try:
-            with self.read_only() as cursor:
-                cursor.execute(
-                    "SELECT targetId from Translations WHERE id = ?", (translation_id,)
-                )
-                target_id = cursor.fetchone()
-                return target_id[0] if target_id else None
+    def _add_evaluation_row(
+        self,
+        cursor: sqlite3.Cursor,
+        target_id: int,
+        num_rankings: int,
+        num_ranked: int,
+        evaluator: Optional[str] = None,
+    ) -> int:
+        """Allocate a new evalId; must run in the write transaction that inserts its rankings."""
+        # Insert trigger bumps Targets.numEvals / numRanked
+        cursor.execute(
+            "INSERT INTO Evaluations (targetId, numRankings, numRanked, evaluator) VALUES (?, ?, ?, ?)",
+            (target_id, num_rankings, num_ranked, evaluator),
+        )
+        return cursor.lastrowid
 
-        except Exception as e:
-            print(f"Error getting getting target id: {e}")
-            return None
+    def _get_translations_info(
+        self, cursor: sqlite3.Cursor, translation_ids: list[int]
+    ) -> dict[int, tuple[int, str]]:
+        """Map translation ids to (targetId, model) with a single query; unknown ids are left out."""
+        cursor.execute(
+            """
+            SELECT Translations.id, Translations.targetId, Translations.model
+            FROM json_each(?) AS ids
+            JOIN Translations ON Translations.id = ids.value
+            """,
+            (json.dumps(sorted(set(translation_ids))),),
+        )
+        return {row[0]: row[1:] for row in cursor.fetchall()}
@@ -0,0 +1,285 @@
+import logging
+import sqlite3
+from typing import Optional
+from util.metrics import timed_query
+
+logger = logging.getLogger(__name__)
+
+# Table -> its FTS5 index and the indexed columns, see migration 5
+SEARCH_INDEXES = {
+    "Targets": ("TargetsSearch", ("target", "context1", "context2")),
+    "Translations": ("TranslationsSearch", ("translation",)),
+}
+
+# What search() looks in: FTS5 index and its content table
+SEARCH_SCOPES = {
+    "targets": ("TargetsSearch", "Targets"),
+    "translations": ("TranslationsSearch", "Translations"),
+}
+
+# Largest SQLite rowid, the upper id bound of pages without filters
+MAX_ROWID = (1 << 63) - 1
+
+# Matches a filtered page looks at first, each further range is 8 times larger
+SCAN_STEP = 256
+
+
+def match_expression(text: str) -> str:
+    """
+    FTS5 query matching rows that contain every word of `text`, in any
+    order. Words are quoted, so operators and punctuation are searched as
+    text; a trailing * keeps its meaning of a prefix search. Words without
+    letters or digits are left out, the index has no tokens for them.
+
+    Raises:
+        ValueError: For text without words
+    """
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*")
+        if any(char.isalnum() for char in word):
+            terms.append('"' + word.replace('"', '""') + '"' + ("*" if prefix else ""))
+    if not terms:
+        raise ValueError("Empty search query")
+    return " ".join(terms)
+
+
+def index_search_rows(
+    cursor: sqlite3.Cursor,
+    table: str,
+    after: Optional[int] = None,
+    ids: Optional[list[int]] = None,
+) -> None:
+    """
+    Add rows of Targets or Translations to their search index: those with
+    an id above `after`, or those in `ids`. Run in the transaction that
+    inserted them; every insert must be indexed exactly once.
+    """
+    index, columns = SEARCH_INDEXES[table]
+    names = ", ".join(columns)
+    insert = f"INSERT INTO {index}(rowid, {names}) SELECT id, {names} FROM {table}"
+    if after is not None:
+        cursor.execute(insert + " WHERE id > ?", (after,))
+    if ids:
+        cursor.executemany(insert + " WHERE id = ?", [(row_id,) for row_id in ids])
+
+
+class SearchMixin:
+    """
+    Mixin for full-text search over targets, their contexts and translations.
+
+    Uses the FTS5 indexes of migration 5. Triggers keep them in sync with
+    updates and deletes of Targets and Translations, the inserting methods
+    (add_targets(), add_translations(), DataLoader, ...) index their rows
+    with index_search_rows(). Results
+    come in id order and pages continue after the last id of the previous
+    one, so every page is a range scan of the index, however deep.
+
+    Filters are checked on the matches in id order. A page with filters
+    looks at no more than `search.max_scan` matches, so a filter that
+    rejects most of them gives short (even empty) pages with a `next`,
+    instead of a scan of every match.
+
+    Requires host class to provide:
+    - config: dict: Database configuration
+    - transaction() -> Generator[sqlite3.Cursor, None, None]: Context manager for DB transactions
+    - read_only() -> Generator[sqlite3.Cursor, None, None]: Context manager for read-only DB access
+    """
+
+    def rebuild_search_index(self) -> bool:
+        """Reindex every target and translation, e.g. after inserting rows with plain SQL."""
+        try:
+            with self.transaction() as cursor:
+                for index, _ in SEARCH_INDEXES.values():
+                    cursor.execute(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+            logger.info("Search index rebuilt")
+            return True
+
+        except Exception as e:
+            logger.error("Error rebuilding search index: %s", e)
+            return False
+
+    @timed_query()
+    def search(
+        self,
+        query: str,
+        scope: str = "targets",
+        model: Optional[str] = None,
+        min_evals: Optional[int] = None,
+        max_evals: Optional[int] = None,
+        after: int = 0,
+        limit: Optional[int] = None,
+        raw: bool = False,
+    ) -> Optional[dict]:
+        """
+        Targets or translations matching `query`, with the matches marked.
+
+        Args:
+            query: Words that must all occur, or with `raw` an FTS5 query
+                (phrases, OR, NOT, NEAR, column filters like `context1: word`)
+            scope: "targets" (target and contexts) or "translations"
+            model: Only translations of the model, or targets with one
+            min_evals, max_evals: Bounds of numEvals of the target or translation
+            after: Id of the last result of the previous page
+            limit: Page size, `search.page_size` by default
+
+        Returns:
+            {"results": [...], "next": id to pass as `after`, None on the last page},
+            None on database errors
+
+        Raises:
+            ValueError: For unknown scopes and invalid queries
+        """
+        if scope not in SEARCH_SCOPES:
+            raise ValueError(f"Unknown search scope: {scope}")
+        settings = self.config["search"]
+        limit = settings["page_size"] if limit is None else limit
+        index, table = SEARCH_SCOPES[scope]
+        mark = (settings["highlight"][0], settings["highlight"][1])
+        tokens = settings["snippet_tokens"]
+
+        if scope == "targets":
+            columns = f"""
+                Targets.id, Targets.numTranslations, Targets.numEvals, Targets.retired,
+                highlight({index}, 0, ?, ?),
+                snippet({index}, 1, ?, ?, '…', ?),
+                snippet({index}, 2, ?, ?, '…', ?)
+            """
+            column_parameters = [*mark, *mark, tokens, *mark, tokens]
+        else:
+            columns = f"""
+                Translations.id, Translations.targetId, Translations.model, Translations.numEvals,
+                highlight({index}, 0, ?, ?)
+            """
+            column_parameters = [*mark]
+
+        filters = []
+        filter_parameters = []
+        if min_evals is not None:
+            filters.append(f"{table}.numEvals >= ?")
+            filter_parameters.append(min_evals)
+        if max_evals is not None:
+            filters.append(f"{table}.numEvals <= ?")
+            filter_parameters.append(max_evals)
+        if model is not None:
+            if scope == "targets":
+                filters.append(
+                    "EXISTS (SELECT 1 FROM Translations WHERE targetId = Targets.id AND model = ?)"
+                )
+            else:
+                filters.append("Translations.model = ?")
+            filter_parameters.append(model)
+
+        expression = query if raw else match_expression(query)
+        select = f"""
+            SELECT {columns}
+            FROM {index}
+            JOIN {table} ON {table}.id = {index}.rowid
+            WHERE {index} MATCH ? AND {index}.rowid > ? AND {index}.rowid <= ?
+                {"".join(" AND " + condition for condition in filters)}
+            ORDER BY {index}.rowid
+            LIMIT ?
+        """
+        try:
+            with self.read_only() as cursor:
+                if not filters:
+                    # One extra row tells whether there is a next page
+                    cursor.execute(
+                        select, [*column_parameters, expression, after, MAX_ROWID, limit + 1]
+                    )
+                    rows = cursor.fetchall()
+                    next_after = rows[limit - 1][0] if len(rows) > limit else None
+                else:
+                    rows, next_after = self._scan_filtered(
+                        cursor, index, select, column_parameters, filter_parameters,
+                        expression, after, limit,
+                    )
+
+        except sqlite3.Error as e:
+            # Syntax errors of the query, e.g. "fts5: syntax error near ..."
+            if "fts5" in str(e):
+                raise ValueError(f"Invalid search query: {query}") from e
+            logger.error("Error searching %s: %s", scope, e)
+            return None
+        except Exception as e:
+            logger.error("Error searching %s: %s", scope, e)
+            return None
+
+        if scope == "targets":
+            results = [
+                {
+                    "id": target_id,
+                    "numTranslations": translations,
+                    "numEvals": evals,
+                    "retired": bool(retired),
+                    "target": target,
+                    "context1": context1,
+                    "context2": context2,
+                }
+                for target_id, translations, evals, retired, target, context1, context2 in rows[:limit]
+            ]
+        else:
+            results = [
+                {
+                    "id": translation_id,
+                    "targetId": target_id,
+                    "model": model_name,
+                    "numEvals": evals,
+                    "translation": translation,
+                }
+                for translation_id, target_id, model_name, evals, translation in rows[:limit]
+            ]
+        return {"results": results, "next": next_after}
+
+    def _scan_filtered(
+        self,
+        cursor: sqlite3.Cursor,
+        index: str,
+        select: str,
+        column_parameters: list,
+        filter_parameters: list,
+        expression: str,
+        after: int,
+        limit: int,
+    ) -> tuple[list[tuple], Optional[int]]:
+        """
+        Rows of a filtered page and the `after` of the next one. Matches are
+        filtered in growing id ranges, up to `search.max_scan` matches in all.
+        """
+        max_scan = self.config["search"]["max_scan"]
+        rows: list[tuple] = []
+        scanned = 0
+        step = min(SCAN_STEP, max_scan)
+        while scanned < max_scan:
+            # Last id of the next `step` matches
+            cursor.execute(
+                f"""
+                SELECT COUNT(*), MAX(rowid) FROM (
+                    SELECT rowid FROM {index}
+                    WHERE {index} MATCH ? AND rowid > ?
+                    ORDER BY rowid
+                    LIMIT ?
+                )
+                """,
+                (expression, after, step),
+            )
+            count, bound = cursor.fetchone()
+            if not count:
+                return rows, None
+
+            cursor.execute(
+                select,
+                [*column_parameters, expression, after, bound, *filter_parameters, limit + 1 - len(rows)],
+            )
+            rows += cursor.fetchall()
+            if len(rows) > limit:
+                return rows, rows[limit - 1][0]
+            if count < step:
+                # Every match has been looked at
+                return rows, None
+            scanned += count
+            after = bound
+            step = min(step * 8, max_scan - scanned)
+        # Out of scan, the next page continues behind it
+        return rows, after
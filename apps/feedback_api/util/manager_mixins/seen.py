@@ -0,0 +1,135 @@
+import logging
+import sqlite3
+import time
+from typing import Optional
+from util.seen_targets import SeenTargets, TargetBitmap
+
+logger = logging.getLogger(__name__)
+
+
+class SeenMixin:
+    """
+    Mixin for the targets each evaluator has already evaluated, which
+    assignment never serves to them again.
+
+    Evaluations record their evaluator (migration 6). The targets of each
+    evaluator are kept in memory, a compact TargetBitmap per evaluator
+    (see SeenTargets), so assignment checks a candidate target with one
+    lookup instead of an anti-join against the evaluations.
+
+    The bitmaps of evaluators with new targets are saved to SeenTargets
+    every `seen.checkpoint_targets` new targets, along with the last
+    evaluation they cover. Loading reads the saved bitmaps and then only
+    the evaluations after that one. Those evaluations are also read before
+    each assignment by the "sql" backend, so evaluations submitted to other
+    processes are seen as well; the "index" backend is single-process.
+
+    Requires host class to provide:
+    - config: dict: Database configuration
+    - write(operation) -> Any: Run operation(cursor) in a (possibly group-committed) write transaction
+    - read_only() -> Generator[sqlite3.Cursor, None, None]: Context manager for read-only DB access
+    """
+
+    @property
+    def seen_targets(self) -> SeenTargets:
+        """Targets per evaluator, loaded from the DB on first use."""
+        if getattr(self, "_seen_targets", None) is None:
+            self.load_seen_targets()
+        return self._seen_targets
+
+    def load_seen_targets(self) -> None:
+        """(Re)load the saved bitmaps, then the evaluations after them."""
+        start = time.perf_counter()
+        with self.read_only() as cursor:
+            cursor.execute("SELECT COALESCE(MAX(evalId), 0) FROM SeenTargets")
+            seen = SeenTargets(cursor.fetchone()[0])
+            cursor.execute("SELECT evaluator, targets FROM SeenTargets")
+            for evaluator, data in cursor:
+                seen.load(evaluator, data)
+            saved = seen.eval_id
+            self._read_new_evaluations(cursor, seen)
+        self._seen_targets = seen
+        logger.info(
+            "Seen targets of %d evaluators loaded, %d evaluations replayed, in %.2fs",
+            len(seen),
+            seen.eval_id - saved,
+            time.perf_counter() - start,
+        )
+
+    def invalidate_seen_targets(self) -> None:
+        # Reloaded lazily on next use
+        self._seen_targets = None
+
+    def seen_by(
+        self, evaluator: Optional[str], cursor: Optional[sqlite3.Cursor] = None
+    ) -> Optional[TargetBitmap]:
+        """
+        Targets `evaluator` has evaluated, None for anonymous callers and
+        evaluators without evaluations. With a cursor, evaluations committed
+        since the last look are read first.
+        """
+        if evaluator is None:
+            return None
+        seen = self.seen_targets
+        if cursor is not None:
+            self._read_new_evaluations(cursor, seen)
+        return seen.get(evaluator)
+
+    def checkpoint_seen_targets(self) -> bool:
+        """Save the bitmaps of the evaluators with new targets since the last checkpoint."""
+        seen = self.seen_targets
+
+        def operation(cursor: sqlite3.Cursor) -> int:
+            self._read_new_evaluations(cursor, seen)
+            changed = seen.take_changed()
+            cursor.executemany(
+                """
+                INSERT INTO SeenTargets(evaluator, targets, evalId) VALUES (?, ?, ?)
+                ON CONFLICT(evaluator) DO UPDATE SET targets = excluded.targets, evalId = excluded.evalId
+                """,
+                [(evaluator, data, seen.eval_id) for evaluator, data in changed],
+            )
+            return len(changed)
+
+        try:
+            saved = self.write(operation)
+            logger.debug("Saved the seen targets of %d evaluators", saved)
+            return True
+
+        except Exception as e:
+            # The unsaved changes are read again from the evaluations
+            self.invalidate_seen_targets()
+            logger.error("Error saving seen targets: %s", e)
+            return False
+
+    def _record_seen(self, evaluated: list[tuple[str, int]]) -> None:
+        """Add committed (evaluator, targetId) evaluations, saving them when enough are pending."""
+        if not evaluated:
+            return
+        try:
+            seen = self.seen_targets
+            for evaluator, target_id in evaluated:
+                seen.add(evaluator, target_id)
+            if seen.pending >= self.config["seen"]["checkpoint_targets"]:
+                self.checkpoint_seen_targets()
+
+        except Exception as e:
+            # The evaluations are committed, they are read again on the next load
+            self.invalidate_seen_targets()
+            logger.error("Error recording seen targets: %s", e)
+
+    @staticmethod
+    def _read_new_evaluations(cursor: sqlite3.Cursor, seen: SeenTargets) -> None:
+        """Apply the evaluations after `seen.eval_id`; one primary key lookup when there are none."""
+        cursor.execute("SELECT MAX(id) FROM Evaluations")
+        last_id = cursor.fetchone()[0]
+        if last_id is None or last_id <= seen.eval_id:
+            return
+        cursor.execute(
+            """
+            SELECT evaluator, targetId FROM Evaluations
+            WHERE id > ? AND id <= ? AND evaluator IS NOT NULL
+            """,
+            (seen.eval_id, last_id),
+        )
+        seen.apply(cursor.fetchall(), last_id)
@@ -0,0 +1,213 @@
+import logging
+import os
+import sqlite3
+import stat
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Name of the newest snapshot in open_snapshot() and restore_snapshot()
+LATEST_SNAPSHOT = "latest"
+
+# Suffix of a snapshot being written, renamed away once it is complete
+PARTIAL_SUFFIX = ".partial"
+
+
+class _TooManyRestarts(Exception):
+    """Stops a stepped backup that keeps restarting, see _copy_database()."""
+
+
+class SnapshotMixin:
+    """
+    Mixin for point-in-time snapshots of the database with SQLite's online
+    backup API.
+
+    A snapshot is a complete copy in its own file,
+    `<folder>/<snapshots.folder>/<database name>/<UTC time>.db`, in rollback
+    journal mode and without write permission, so it opens read-only
+    without the live database's WAL. Pages are copied `pages_per_step` at a
+    time with a pause in between. Every step is a short read transaction:
+    in WAL mode it never blocks writers, and between steps checkpoints run.
+
+    A write from another connection restarts a stepped backup from the
+    first page. After `max_restarts` restarts the copy is finished in one
+    step, a single read transaction, which still does not block writers;
+    the WAL just grows until it ends.
+
+    Requires host class to provide:
+    - config: dict: Database configuration
+    - data_dir: str: Path to directory where database should be stored
+    - db_name: str: Database file name, relative to data_dir
+    - db_path: str: Path to the database file
+    - migrate(target=None) -> bool: Apply pending schema migrations
+    - invalidate_assignment_index() -> None: Drop the in-process assignment index
+    - invalidate_payload_cache(target_ids=None) -> None: Drop cached target payloads
+    - invalidate_seen_targets() -> None: Drop the in-process seen targets
+    """
+
+    @property
+    def snapshot_dir(self) -> str:
+        return os.path.join(
+            self.data_dir, self.config["snapshots"]["folder"], os.path.splitext(self.db_name)[0]
+        )
+
+    def create_snapshot(self) -> Optional[dict]:
+        """
+        Copy the database into a new snapshot.
+
+        Returns:
+            The snapshot, as in list_snapshots(), with the copy's "seconds",
+            "steps" and "restarts"; None on errors
+        """
+        try:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            name = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ") + ".db"
+            path = os.path.join(self.snapshot_dir, name)
+            partial = path + PARTIAL_SUFFIX
+
+            start = time.perf_counter()
+            try:
+                copy = self._copy_database(partial)
+                os.chmod(partial, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                os.replace(partial, path)
+            finally:
+                if os.path.exists(partial):
+                    os.remove(partial)
+
+            snapshot = {
+                "name": name,
+                "path": path,
+                "bytes": os.path.getsize(path),
+                "seconds": time.perf_counter() - start,
+                **copy,
+            }
+            logger.info(
+                "Snapshot %s of %s: %d bytes in %.2fs, %d steps, %d restarts",
+                name,
+                self.db_name,
+                snapshot["bytes"],
+                snapshot["seconds"],
+                snapshot["steps"],
+                snapshot["restarts"],
+            )
+            return snapshot
+
+        except Exception as e:
+            logger.error("Error creating snapshot: %s", e)
+            return None
+
+    def list_snapshots(self) -> list[dict]:
+        """Complete snapshots of the database, oldest first."""
+        if not os.path.isdir(self.snapshot_dir):
+            return []
+        snapshots = []
+        for name in sorted(os.listdir(self.snapshot_dir)):
+            if not name.endswith(".db"):
+                continue
+            path = os.path.join(self.snapshot_dir, name)
+            snapshots.append({"name": name, "path": path, "bytes": os.path.getsize(path)})
+        return snapshots
+
+    def prune_snapshots(self, keep: Optional[int] = None) -> int:
+        """Delete all but the newest `keep` snapshots (default: `snapshots.keep`), returning how many."""
+        keep = self.config["snapshots"]["keep"] if keep is None else keep
+        snapshots = self.list_snapshots()
+        expired = snapshots[: max(0, len(snapshots) - keep)]
+        for snapshot in expired:
+            os.remove(snapshot["path"])
+        if expired:
+            logger.info("Pruned %d snapshots of %s", len(expired), self.db_name)
+        return len(expired)
+
+    def open_snapshot(self, name: str = LATEST_SNAPSHOT):
+        """
+        A read-only manager of the same class on a snapshot, e.g. to run
+        exports and statistics without competing with live traffic.
+
+        Raises:
+            FileNotFoundError: For unknown snapshots
+        """
+        path = self._snapshot_path(name)
+        return type(self)(os.path.relpath(path, self.data_dir), read_only=True)
+
+    def restore_snapshot(self, name: str = LATEST_SNAPSHOT) -> bool:
+        """
+        Replace the content of the database by a snapshot, in one step that
+        holds the write lock until it is done, and migrate it to the
+        current schema. Connections stay open and see the restored data.
+        Take a snapshot first to keep the current state.
+        """
+        try:
+            path = self._snapshot_path(name)
+            start = time.perf_counter()
+            source = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            target = sqlite3.connect(self.db_path, timeout=self.config["pool"]["timeout"])
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+
+            self.invalidate_assignment_index()
+            self.invalidate_payload_cache()
+            self.invalidate_seen_targets()
+            if not self.migrate():
+                return False
+            logger.info(
+                "Restored %s from snapshot %s in %.2fs",
+                self.db_name,
+                os.path.basename(path),
+                time.perf_counter() - start,
+            )
+            return True
+
+        except Exception as e:
+            logger.error("Error restoring snapshot %s: %s", name, e)
+            return False
+
+    def _snapshot_path(self, name: str) -> str:
+        if name == LATEST_SNAPSHOT:
+            snapshots = self.list_snapshots()
+            if not snapshots:
+                raise FileNotFoundError(f"No snapshots of {self.db_name}")
+            return snapshots[-1]["path"]
+        path = os.path.join(self.snapshot_dir, os.path.basename(name))
+        if not path.endswith(".db") or not os.path.exists(path):
+            raise FileNotFoundError(f"Unknown snapshot of {self.db_name}: {name}")
+        return path
+
+    def _copy_database(self, path: str) -> dict:
+        """Back the database up into a new file at `path`, see the class docstring."""
+        settings = self.config["snapshots"]
+        progress = {"steps": 0, "restarts": 0, "remaining": None}
+
+        def step(status: int, remaining: int, total: int) -> None:
+            progress["steps"] += 1
+            if progress["remaining"] is not None and remaining > progress["remaining"]:
+                # Another connection wrote, the backup starts over from page 1
+                progress["restarts"] += 1
+                if progress["restarts"] > settings["max_restarts"]:
+                    raise _TooManyRestarts()
+            progress["remaining"] = remaining
+
+        source = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        target = sqlite3.connect(path)
+        try:
+            try:
+                source.backup(
+                    target,
+                    pages=settings["pages_per_step"],
+                    progress=step,
+                    sleep=settings["pause_ms"] / 1000,
+                )
+            except _TooManyRestarts:
+                source.backup(target)
+                progress["steps"] += 1
+            # A self-contained file: no WAL to open next to it
+            target.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            target.close()
+            source.close()
+        return {"steps": progress["steps"], "restarts": progress["restarts"]}
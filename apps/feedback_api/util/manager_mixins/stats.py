@@ -0,0 +1,272 @@
+import logging
+import sqlite3
+from collections import Counter
+from typing import Hashable, Iterable, Optional
+from util.metrics import timed_query
+
+logger = logging.getLogger(__name__)
+
+# Pseudo-wins added in both directions of every compared pair, keeps
+# Bradley-Terry strengths finite for models that never (or always) win
+BT_PRIOR = 0.5
+BT_ITERATIONS = 200
+BT_TOLERANCE = 1e-9
+
+# Sort key of discarded translations: behind every ranked one
+DISCARDED_KEY = 1 << 30
+
+
+def leaderboard(
+    rows: list[tuple[str, int, int, int, int]], wins: list[tuple[str, str, int]]
+) -> dict:
+    """
+    Leaderboard response from ModelStats rows (model, numShown, numRanked,
+    numDiscarded, rankSum) and ModelWins rows (winner, loser, wins).
+    """
+    strengths = bradley_terry([row[0] for row in rows], wins)
+    models = [
+        {
+            "model": model,
+            "numShown": shown,
+            "numRanked": ranked,
+            "numDiscarded": discarded,
+            "meanRank": rank_sum / ranked if ranked else None,
+            "discardRate": discarded / shown if shown else None,
+            "strength": strengths.get(model),
+        }
+        for model, shown, ranked, discarded, rank_sum in rows
+    ]
+    models.sort(key=lambda m: m["strength"] or 0.0, reverse=True)
+
+    matrix: dict[str, dict[str, int]] = {}
+    for winner, loser, count in wins:
+        matrix.setdefault(winner, {})[loser] = count
+
+    return {"models": models, "wins": matrix}
+
+
+def pairwise_wins(rankings: Iterable[tuple[Hashable, int, bool]]) -> Counter:
+    """
+    (winner, loser) counts of one evaluation given as (item, rank, discarded)
+    rows: lower ranks beat higher ones, ranked items beat discarded ones.
+    Ties and pairs of the same item count for neither.
+    """
+    keys = [(item, DISCARDED_KEY if discarded else int(rank)) for item, rank, discarded in rankings]
+    wins: Counter = Counter()
+    for i, (item_a, key_a) in enumerate(keys):
+        for item_b, key_b in keys[i + 1:]:
+            if item_a == item_b or key_a == key_b:
+                continue
+            wins[(item_a, item_b) if key_a < key_b else (item_b, item_a)] += 1
+    return wins
+
+
+def bradley_terry(models: list[str], wins: list[tuple[str, str, int]]) -> dict[str, float]:
+    """Fit Bradley-Terry strengths (summing to 1) with the MM algorithm."""
+    won: Counter = Counter()
+    games: Counter = Counter()  # unordered pair -> number of comparisons
+    for winner, loser, count in wins:
+        won[winner] += count
+        games[frozenset((winner, loser))] += count
+    for pair in games:
+        games[pair] += 2 * BT_PRIOR
+        for model in pair:
+            won[model] += BT_PRIOR
+
+    strength = {model: 1.0 / len(models) for model in models}
+    for _ in range(BT_ITERATIONS):
+        updated = {}
+        for model in models:
+            denominator = sum(
+                count / (strength[model] + strength[other])
+                for pair, count in games.items()
+                if model in pair
+                for other in pair - {model}
+            )
+            updated[model] = won[model] / denominator if denominator else strength[model]
+        total = sum(updated.values()) or 1.0
+        updated = {model: value / total for model, value in updated.items()}
+        converged = max(
+            (abs(updated[m] - strength[m]) for m in models), default=0.0
+        ) < BT_TOLERANCE
+        strength = updated
+        if converged:
+            break
+    return strength
+
+
+class StatsMixin:
+    """
+    Mixin for the model leaderboard.
+
+    Per-model counters (ModelStats) and the pairwise win matrix (ModelWins)
+    are summary tables updated incrementally with every evaluation, so
+    reading the leaderboard never scans Rankings. Within an evaluation a
+    ranked translation beats every translation with a higher rank and every
+    discarded one. Bradley-Terry strengths are fitted on the win matrix when
+    the leaderboard is read.
+
+    Requires host class to provide:
+    - transaction() -> Generator[sqlite3.Cursor, None, None]: Context manager for DB transactions
+    - read_only() -> Generator[sqlite3.Cursor, None, None]: Context manager for read-only DB access
+    """
+
+    @timed_query()
+    def get_model_stats(self) -> Optional[dict]:
+        try:
+            with self.read_only() as cursor:
+                cursor.execute(
+                    "SELECT model, numShown, numRanked, numDiscarded, rankSum FROM ModelStats"
+                )
+                rows = cursor.fetchall()
+                cursor.execute("SELECT winner, loser, wins FROM ModelWins")
+                wins = cursor.fetchall()
+
+            return leaderboard(rows, wins)
+
+        except Exception as e:
+            logger.error("Error getting model stats: %s", e)
+            return None
+
+    def rebuild_model_stats(self, fetch_size: int = 1_000_000) -> bool:
+        """
+        Recompute ModelStats and ModelWins from the whole Rankings table.
+
+        Runs vectorized with NumPy (optional dependency) inside one write
+        transaction, so submissions wait for the rebuild instead of being
+        counted twice or lost.
+        """
+        try:
+            import numpy as np
+        except ImportError:
+            logger.error("Error rebuilding model stats: NumPy is required (pip install numpy)")
+            return False
+
+        try:
+            with self.transaction() as cursor:
+                cursor.execute("SELECT id, model FROM Translations")
+                translation_models = cursor.fetchall()
+                models = sorted({model for _, model in translation_models})
+                codes = {model: code for code, model in enumerate(models)}
+                num_models = len(models)
+
+                # translationId -> model code
+                max_id = max((tr for tr, _ in translation_models), default=0)
+                model_of = np.full(max_id + 1, -1, dtype=np.int32)
+                if translation_models:
+                    ids, names = zip(*translation_models)
+                    model_of[np.fromiter(ids, dtype=np.int64)] = [codes[n] for n in names]
+
+                # Plain table scan, sorting by evalId is left to NumPy
+                cursor.execute(
+                    """
+                    SELECT evalId, translationId, COALESCE(rank, 0), COALESCE(discarded, 0)
+                    FROM Rankings
+                    """
+                )
+                chunks = []
+                while rows := cursor.fetchmany(fetch_size):
+                    chunks.append(np.array(rows, dtype=np.int64))
+                data = np.concatenate(chunks) if chunks else np.zeros((0, 4), np.int64)
+
+                eval_ids = data[:, 0]
+                translation_ids = data[:, 1]
+                known = (translation_ids <= max_id) & (translation_ids >= 0)
+                model = np.full(len(data), -1, dtype=np.int64)
+                model[known] = model_of[translation_ids[known]]
+                known &= model >= 0
+
+                eval_ids, model = eval_ids[known], model[known]
+                rank, discarded = data[known, 2], data[known, 3] != 0
+
+                shown = np.bincount(model, minlength=num_models)
+                num_discarded = np.bincount(model[discarded], minlength=num_models)
+                rank_sum = np.bincount(
+                    model[~discarded], weights=rank[~discarded], minlength=num_models
+                )
+
+                order = np.argsort(eval_ids, kind="stable")
+                eval_ids, model = eval_ids[order], model[order]
+                key = np.where(discarded, DISCARDED_KEY, rank)[order]
+
+                # Rankings of one evaluation are contiguous after sorting, so
+                # comparing rows d apart for growing d visits every pair once
+                wins = np.zeros(num_models * num_models, dtype=np.int64)
+                d = 1
+                while d < len(eval_ids):
+                    same = eval_ids[:-d] == eval_ids[d:]
+                    if not same.any():
+                        break
+                    a, b = model[:-d][same], model[d:][same]
+                    key_a, key_b = key[:-d][same], key[d:][same]
+                    a_wins = (key_a < key_b) & (a != b)
+                    b_wins = (key_b < key_a) & (a != b)
+                    wins += np.bincount(a[a_wins] * num_models + b[a_wins], minlength=wins.size)
+                    wins += np.bincount(b[b_wins] * num_models + a[b_wins], minlength=wins.size)
+                    d += 1
+
+                cursor.execute("DELETE FROM ModelStats")
+                cursor.execute("DELETE FROM ModelWins")
+                cursor.executemany(
+                    "INSERT INTO ModelStats(model, numShown, numRanked, numDiscarded, rankSum) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (
+                            models[i],
+                            int(shown[i]),
+                            int(shown[i] - num_discarded[i]),
+                            int(num_discarded[i]),
+                            int(rank_sum[i]),
+                        )
+                        for i in range(num_models)
+                        if shown[i]
+                    ],
+                )
+                cursor.executemany(
+                    "INSERT INTO ModelWins(winner, loser, wins) VALUES (?, ?, ?)",
+                    [
+                        (models[i // num_models], models[i % num_models], int(wins[i]))
+                        for i in np.flatnonzero(wins)
+                    ],
+                )
+
+            logger.info("Model stats rebuilt from %d rankings", len(eval_ids))
+            return True
+
+        except Exception as e:
+            logger.error("Error rebuilding model stats: %s", e)
+            return False
+
+    def _update_model_stats(
+        self, cursor: sqlite3.Cursor, rankings: list[tuple[str, int, bool]]
+    ) -> None:
+        """Add one evaluation, given as (model, rank, discarded) rows, to the summary tables."""
+        counters: dict[str, list[int]] = {}
+        for model, rank, discarded in rankings:
+            shown, ranked, num_discarded, rank_sum = counters.get(model, (0, 0, 0, 0))
+            if discarded:
+                counters[model] = [shown + 1, ranked, num_discarded + 1, rank_sum]
+            else:
+                counters[model] = [shown + 1, ranked + 1, num_discarded, rank_sum + int(rank)]
+
+        cursor.executemany(
+            """
+            INSERT INTO ModelStats(model, numShown, numRanked, numDiscarded, rankSum)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(model) DO UPDATE SET
+                numShown = numShown + excluded.numShown,
+                numRanked = numRanked + excluded.numRanked,
+                numDiscarded = numDiscarded + excluded.numDiscarded,
+                rankSum = rankSum + excluded.rankSum
+            """,
+            [(model, *values) for model, values in counters.items()],
+        )
+
+        wins = pairwise_wins(rankings)
+
+        cursor.executemany(
+            """
+            INSERT INTO ModelWins(winner, loser, wins) VALUES (?, ?, ?)
+            ON CONFLICT(winner, loser) DO UPDATE SET wins = wins + excluded.wins
+            """,
+            [(winner, loser, count) for (winner, loser), count in wins.items()],
+        )
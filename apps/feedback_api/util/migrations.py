@@ -0,0 +1,639 @@
+import logging
+import sqlite3
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TableRebuild:
+    """
+    Online rebuild of a table with a rowid, e.g. to change its indexes or
+    columns without holding the write lock for the whole table.
+
+    The new table is created next to the old one (as `<table>_rebuild`),
+    with its indexes, and filled in rowid batches of short transactions.
+    Triggers on the old table mirror concurrent writes into the copy. The
+    migration then swaps the tables in its final transaction, which only
+    drops the old table and renames the copy; triggers on the table are
+    carried over.
+
+    `definition` and `indexes` are CREATE statements with a `{table}`
+    placeholder. Index names must differ from those of the old table,
+    which are dropped with it. Columns are copied by name, new columns
+    need a default.
+
+    Progress is kept in schema_rebuilds, an interrupted rebuild resumes
+    where it stopped.
+    """
+
+    def __init__(self, table: str, definition: str, indexes: tuple[str, ...] = ()):
+        self.table = table
+        self.definition = definition
+        self.indexes = indexes
+
+    @property
+    def shadow(self) -> str:
+        return f"{self.table}_rebuild"
+
+    def prepare(self, cursor: sqlite3.Cursor) -> None:
+        """Create the copy and the mirroring triggers; run in a write transaction."""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (self.shadow,))
+        if cursor.fetchone() is None:
+            cursor.execute(self.definition.format(table=self.shadow))
+            for index in self.indexes:
+                cursor.execute(index.format(table=self.shadow))
+
+        columns = self._columns(cursor)
+        names = ", ".join(columns)
+        copy_row = f"INSERT OR REPLACE INTO {self.shadow}({names}) SELECT {names} FROM {self.table} WHERE rowid = NEW.rowid;"
+        delete_row = f"DELETE FROM {self.shadow} WHERE rowid = OLD.rowid;"
+        for event, body in (
+            ("INSERT", copy_row),
+            ("UPDATE", delete_row + copy_row),
+            ("DELETE", delete_row),
+        ):
+            cursor.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS {self.shadow}_{event.lower()}
+                AFTER {event} ON {self.table}
+                BEGIN
+                    {body}
+                END
+                """
+            )
+        cursor.execute(
+            "INSERT OR IGNORE INTO schema_rebuilds(tableName, lastRowid) VALUES (?, 0)",
+            (self.table,),
+        )
+
+    def copy_batch(self, cursor: sqlite3.Cursor, batch_size: int) -> int:
+        """Copy the next `batch_size` rows; run in a write transaction. Returns the rows copied."""
+        cursor.execute("SELECT lastRowid FROM schema_rebuilds WHERE tableName = ?", (self.table,))
+        last = cursor.fetchone()[0]
+        cursor.execute(
+            f"""
+            SELECT COUNT(*), MAX(rowid) FROM (
+                SELECT rowid FROM {self.table} WHERE rowid > ? ORDER BY rowid LIMIT ?
+            )
+            """,
+            (last, batch_size),
+        )
+        count, upper = cursor.fetchone()
+        if not count:
+            return 0
+
+        names = ", ".join(self._columns(cursor))
+        cursor.execute(
+            f"""
+            INSERT OR REPLACE INTO {self.shadow}({names})
+            SELECT {names} FROM {self.table} WHERE rowid > ? AND rowid <= ?
+            """,
+            (last, upper),
+        )
+        cursor.execute(
+            "UPDATE schema_rebuilds SET lastRowid = ? WHERE tableName = ?", (upper, self.table)
+        )
+        return count
+
+    def swap(self, cursor: sqlite3.Cursor) -> None:
+        """Replace the old table by the complete copy; run in the migration's final transaction."""
+        cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ? AND name NOT LIKE ?",
+            (self.table, f"{self.shadow}%"),
+        )
+        triggers = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (self.table,))
+        sequence = cursor.fetchone()
+
+        cursor.execute(f"DROP TABLE {self.table}")
+        # Triggers of other tables may name the table, which is missing until the rename
+        cursor.execute("PRAGMA legacy_alter_table=ON")
+        try:
+            cursor.execute(f"ALTER TABLE {self.shadow} RENAME TO {self.table}")
+        finally:
+            cursor.execute("PRAGMA legacy_alter_table=OFF")
+        for trigger in triggers:
+            cursor.execute(trigger)
+        # AUTOINCREMENT never goes back below ids handed out before the rebuild
+        if sequence is not None:
+            cursor.execute(
+                "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?",
+                (sequence[0], self.table),
+            )
+        cursor.execute("DELETE FROM schema_rebuilds WHERE tableName = ?", (self.table,))
+
+    def _columns(self, cursor: sqlite3.Cursor) -> list[str]:
+        """Columns of the copy that the old table has too."""
+        cursor.execute(f"SELECT name FROM pragma_table_info('{self.table}')")
+        old = {row[0] for row in cursor.fetchall()}
+        cursor.execute(f"SELECT name FROM pragma_table_info('{self.shadow}')")
+        return [row[0] for row in cursor.fetchall() if row[0] in old]
+
+
+class SearchIndex:
+    """
+    Online build of an FTS5 index over text columns of a table. Follows the
+    protocol of TableRebuild.
+
+    The index is an external content table (`content=<table>`): it stores
+    only the inverted index, the text is read from the table by rowid.
+    Existing rows are indexed in rowid batches of short transactions;
+    meanwhile triggers index the writes to rows at or below the batch
+    cursor, the batches pick up the rest.
+
+    Once built, triggers keep it in sync with updates and deletes. Inserts
+    are indexed by the code that inserts, one statement per transaction
+    (see index_search_rows()): FTS5 flushes its pending terms whenever a
+    trigger writes to it, so indexing every inserted row from a trigger
+    costs a segment write and merge work per row.
+
+    Progress is kept in schema_rebuilds under the index name.
+    """
+
+    def __init__(self, table: str, index: str, columns: tuple[str, ...], tokenize: str):
+        self.table = index
+        self.source = table
+        self.columns = columns
+        self.tokenize = tokenize
+
+    def prepare(self, cursor: sqlite3.Cursor) -> None:
+        """Create the index and the triggers for writes during the build; run in a write transaction."""
+        cursor.execute(
+            f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5(
+                {", ".join(self.columns)},
+                content='{self.source}',
+                content_rowid='id',
+                tokenize='{self.tokenize}'
+            )
+            """
+        )
+        cursor.execute(
+            "INSERT OR IGNORE INTO schema_rebuilds(tableName, lastRowid) VALUES (?, 0)",
+            (self.table,),
+        )
+        indexed = f"(SELECT lastRowid FROM schema_rebuilds WHERE tableName = '{self.table}')"
+        self._create_triggers(
+            cursor, "build", ("INSERT", "UPDATE", "DELETE"), "NEW.id <= " + indexed, "OLD.id <= " + indexed
+        )
+
+    def copy_batch(self, cursor: sqlite3.Cursor, batch_size: int) -> int:
+        """Index the next `batch_size` rows; run in a write transaction. Returns the rows indexed."""
+        cursor.execute("SELECT lastRowid FROM schema_rebuilds WHERE tableName = ?", (self.table,))
+        last = cursor.fetchone()[0]
+        cursor.execute(
+            f"""
+            SELECT COUNT(*), MAX(id) FROM (
+                SELECT id FROM {self.source} WHERE id > ? ORDER BY id LIMIT ?
+            )
+            """,
+            (last, batch_size),
+        )
+        count, upper = cursor.fetchone()
+        if not count:
+            return 0
+
+        names = ", ".join(self.columns)
+        cursor.execute(
+            f"""
+            INSERT INTO {self.table}(rowid, {names})
+            SELECT id, {names} FROM {self.source} WHERE id > ? AND id <= ?
+            """,
+            (last, upper),
+        )
+        cursor.execute(
+            "UPDATE schema_rebuilds SET lastRowid = ? WHERE tableName = ?", (upper, self.table)
+        )
+        return count
+
+    def swap(self, cursor: sqlite3.Cursor) -> None:
+        """Index the rows written since the last batch and create the permanent triggers; run in the migration's final transaction."""
+        while self.copy_batch(cursor, 10_000):
+            pass
+        for event in ("insert", "update", "delete"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {self.table}_build_{event}")
+        self._create_triggers(cursor, "sync", ("UPDATE", "DELETE"))
+        cursor.execute("DELETE FROM schema_rebuilds WHERE tableName = ?", (self.table,))
+
+    def _create_triggers(
+        self,
+        cursor: sqlite3.Cursor,
+        name: str,
+        events: tuple[str, ...],
+        new_when: str = "",
+        old_when: str = "",
+    ) -> None:
+        names = ", ".join(self.columns)
+        new = ", ".join(f"NEW.{column}" for column in self.columns)
+        old = ", ".join(f"OLD.{column}" for column in self.columns)
+        add = f"INSERT INTO {self.table}(rowid, {names}) VALUES (NEW.id, {new});"
+        # External content: an entry is removed by passing the text it was indexed with
+        remove = f"INSERT INTO {self.table}({self.table}, rowid, {names}) VALUES ('delete', OLD.id, {old});"
+        triggers = {
+            "INSERT": ("INSERT", new_when, add),
+            # Only text changes touch the index, counter updates do not fire
+            "UPDATE": (f"UPDATE OF {names}", old_when, remove + add),
+            "DELETE": ("DELETE", old_when, remove),
+        }
+        for event in events:
+            clause, when, body = triggers[event]
+            cursor.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS {self.table}_{name}_{event.lower()}
+                AFTER {clause} ON {self.source}
+                FOR EACH ROW
+                {"WHEN " + when if when else ""}
+                BEGIN
+                    {body}
+                END
+                """
+            )
+
+
+class Migration:
+    """
+    One schema version.
+
+    `rebuilds` run first, online (see TableRebuild and SearchIndex). Their
+    swaps, then `statements`, then `backfills`, then the version bump run in
+    one transaction, so a migration is applied completely or not at all.
+
+    `backfills` name methods of the manager that take the cursor, for data
+    that SQL alone cannot derive (e.g. it depends on the configuration).
+    """
+
+    def __init__(
+        self,
+        version: int,
+        description: str,
+        statements: tuple[str, ...] = (),
+        rebuilds: tuple[TableRebuild | SearchIndex, ...] = (),
+        backfills: tuple[str, ...] = (),
+    ):
+        self.version = version
+        self.description = description
+        self.statements = statements
+        self.rebuilds = rebuilds
+        self.backfills = backfills
+
+
+def _baseline() -> tuple[str, ...]:
+    """
+    Schema of initialize_schema() from before versioning. Every statement is
+    IF NOT EXISTS, so databases it created are adopted as is and upgraded by
+    the next migrations.
+    """
+    return (
+        """
+        CREATE TABLE IF NOT EXISTS Targets (
+            id INTEGER PRIMARY KEY,
+            target TEXT NOT NULL,
+            context1 TEXT NOT NULL,
+            context2 TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS Translations (
+            id INTEGER PRIMARY KEY,
+            targetId INTEGER NOT NULL,
+            translation TEXT NOT NULL,
+            model TEXT NOT NULL,
+            numEvals INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY(targetId) REFERENCES Targets(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS Rankings (
+            id INTEGER PRIMARY KEY,
+            translationId INTEGER NOT NULL,
+            evalId INTEGER NOT NULL,
+            rank INTEGER,
+            discarded BOOLEAN,
+            FOREIGN KEY(translationId) REFERENCES Translations(id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_translations_target_id ON Translations(targetId)",
+        "CREATE INDEX IF NOT EXISTS idx_translations_num_evals ON Translations(numEvals, id)",
+        "CREATE INDEX IF NOT EXISTS idx_rankings_translation_id ON Rankings(translationId)",
+        "CREATE INDEX IF NOT EXISTS idx_rankings_eval_id ON Rankings(evalId)",
+        "CREATE INDEX IF NOT EXISTS idx_translations_evals_target ON Translations(numEvals, targetId, id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_unique_ranks_per_eval ON Rankings(evalId, rank) WHERE discarded = FALSE",
+        """
+        CREATE TRIGGER IF NOT EXISTS update_translation_evals_insert
+        AFTER INSERT ON Rankings
+        FOR EACH ROW
+        BEGIN
+            UPDATE Translations
+            SET numEvals = (
+                SELECT COUNT(*)
+                FROM Rankings
+                WHERE translationId = NEW.translationId
+            )
+            WHERE id = NEW.translationId;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS update_translation_evals_delete
+        AFTER DELETE ON Rankings
+        FOR EACH ROW
+        BEGIN
+            UPDATE Translations
+            SET numEvals = (
+                SELECT COUNT(*)
+                FROM Rankings
+                WHERE translationId = OLD.translationId
+            )
+            WHERE id = OLD.translationId;
+        END
+        """,
+    )
+
+
+def _evaluations_and_counters() -> tuple[str, ...]:
+    """
+    Tables and counters added before versioning: Evaluations, Leases, the
+    leaderboard summary tables, the Targets counters and external keys, and
+    incremental triggers instead of the COUNT(*) ones. Evaluations, counters
+    and summary tables are filled from the existing rankings.
+    """
+    return (
+        # Links imported translations to their target, see DataLoader
+        "ALTER TABLE Targets ADD COLUMN externalKey TEXT",
+        "ALTER TABLE Targets ADD COLUMN numTranslations INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE Targets ADD COLUMN numEvals INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE Targets ADD COLUMN numRanked INTEGER NOT NULL DEFAULT 0",
+        # AUTOINCREMENT: evalIds are never reused, even after deletes
+        """
+        CREATE TABLE Evaluations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            targetId INTEGER NOT NULL,
+            numRankings INTEGER NOT NULL,
+            numRanked INTEGER NOT NULL,
+            submittedAt TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(targetId) REFERENCES Targets(id)
+        )
+        """,
+        # Targets reserved for an evaluator until expiresAt (unix time)
+        """
+        CREATE TABLE Leases (
+            targetId INTEGER PRIMARY KEY,
+            evaluator TEXT,
+            expiresAt REAL NOT NULL,
+            FOREIGN KEY(targetId) REFERENCES Targets(id)
+        )
+        """,
+        # Leaderboard summary tables, see StatsMixin
+        """
+        CREATE TABLE ModelStats (
+            model TEXT PRIMARY KEY,
+            numShown INTEGER NOT NULL DEFAULT 0,
+            numRanked INTEGER NOT NULL DEFAULT 0,
+            numDiscarded INTEGER NOT NULL DEFAULT 0,
+            rankSum INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE ModelWins (
+            winner TEXT NOT NULL,
+            loser TEXT NOT NULL,
+            wins INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (winner, loser)
+        ) WITHOUT ROWID
+        """,
+        # Existing evaluations, submittedAt is the time of the upgrade
+        """
+        INSERT INTO Evaluations(id, targetId, numRankings, numRanked)
+        SELECT
+            Rankings.evalId,
+            MIN(Translations.targetId),
+            COUNT(*),
+            SUM(NOT COALESCE(Rankings.discarded, FALSE))
+        FROM Rankings
+        JOIN Translations ON Translations.id = Rankings.translationId
+        GROUP BY Rankings.evalId
+        """,
+        """
+        WITH counts AS (
+            SELECT
+                Targets.id AS id,
+                (SELECT COUNT(*) FROM Translations WHERE targetId = Targets.id) AS numTranslations,
+                COUNT(Evaluations.id) AS numEvals,
+                COALESCE(SUM(Evaluations.numRanked), 0) AS numRanked
+            FROM Targets
+            LEFT JOIN Evaluations ON Evaluations.targetId = Targets.id
+            GROUP BY Targets.id
+        )
+        UPDATE Targets
+        SET
+            numTranslations = counts.numTranslations,
+            numEvals = counts.numEvals,
+            numRanked = counts.numRanked
+        FROM counts
+        WHERE counts.id = Targets.id
+        """,
+        # The same counts as StatsMixin._update_model_stats() and pairwise_wins()
+        """
+        INSERT INTO ModelStats(model, numShown, numRanked, numDiscarded, rankSum)
+        SELECT
+            Translations.model,
+            COUNT(*),
+            SUM(CASE WHEN Rankings.discarded THEN 0 ELSE 1 END),
+            SUM(CASE WHEN Rankings.discarded THEN 1 ELSE 0 END),
+            COALESCE(SUM(CASE WHEN Rankings.discarded THEN 0 ELSE Rankings.rank END), 0)
+        FROM Rankings
+        JOIN Translations ON Translations.id = Rankings.translationId
+        GROUP BY Translations.model
+        """,
+        """
+        INSERT INTO ModelWins(winner, loser, wins)
+        WITH keyed AS (
+            SELECT
+                Rankings.evalId AS evalId,
+                Translations.model AS model,
+                CASE WHEN Rankings.discarded THEN 1073741824 ELSE Rankings.rank END AS sortKey
+            FROM Rankings
+            JOIN Translations ON Translations.id = Rankings.translationId
+        )
+        SELECT a.model, b.model, COUNT(*)
+        FROM keyed AS a
+        JOIN keyed AS b ON b.evalId = a.evalId AND a.sortKey < b.sortKey AND a.model != b.model
+        GROUP BY a.model, b.model
+        """,
+        "CREATE INDEX idx_evaluations_target_id ON Evaluations(targetId)",
+        "CREATE UNIQUE INDEX idx_targets_external_key ON Targets(externalKey) WHERE externalKey IS NOT NULL",
+        # Target selection, only targets that have translations can be served
+        "CREATE INDEX idx_targets_num_evals ON Targets(numEvals, id) WHERE numTranslations > 0",
+        "CREATE INDEX idx_targets_num_ranked ON Targets(numRanked, numEvals, id) WHERE numTranslations > 0",
+        "CREATE INDEX idx_leases_expires_at ON Leases(expiresAt)",
+        "CREATE INDEX idx_leases_evaluator ON Leases(evaluator)",
+        # Triggers keep numEvals incremental, recount_num_evals() repairs drift
+        "DROP TRIGGER update_translation_evals_insert",
+        "DROP TRIGGER update_translation_evals_delete",
+        """
+        CREATE TRIGGER update_translation_evals_insert
+        AFTER INSERT ON Rankings
+        FOR EACH ROW
+        BEGIN
+            UPDATE Translations
+            SET numEvals = numEvals + 1
+            WHERE id = NEW.translationId;
+        END
+        """,
+        """
+        CREATE TRIGGER update_translation_evals_delete
+        AFTER DELETE ON Rankings
+        FOR EACH ROW
+        BEGIN
+            UPDATE Translations
+            SET numEvals = numEvals - 1
+            WHERE id = OLD.translationId;
+        END
+        """,
+        # Target counters change once per evaluation, not once per ranking
+        """
+        CREATE TRIGGER update_target_evals_insert
+        AFTER INSERT ON Evaluations
+        FOR EACH ROW
+        BEGIN
+            UPDATE Targets
+            SET numEvals = numEvals + 1, numRanked = numRanked + NEW.numRanked
+            WHERE id = NEW.targetId;
+        END
+        """,
+        """
+        CREATE TRIGGER update_target_evals_delete
+        AFTER DELETE ON Evaluations
+        FOR EACH ROW
+        BEGIN
+            UPDATE Targets
+            SET numEvals = numEvals - 1, numRanked = numRanked - OLD.numRanked
+            WHERE id = OLD.targetId;
+        END
+        """,
+        """
+        CREATE TRIGGER update_target_translations_insert
+        AFTER INSERT ON Translations
+        FOR EACH ROW
+        BEGIN
+            UPDATE Targets
+            SET numTranslations = numTranslations + 1
+            WHERE id = NEW.targetId;
+        END
+        """,
+        """
+        CREATE TRIGGER update_target_translations_delete
+        AFTER DELETE ON Translations
+        FOR EACH ROW
+        BEGIN
+            UPDATE Targets
+            SET numTranslations = numTranslations - 1
+            WHERE id = OLD.targetId;
+        END
+        """,
+    )
+
+
+# Case and accent insensitive words of any script, see SearchMixin
+SEARCH_TOKENIZER = "unicode61 remove_diacritics 2"
+
+# Append only: a released migration is never edited, the next version fixes it
+MIGRATIONS = (
+    Migration(1, "Initial schema", statements=_baseline()),
+    Migration(
+        2,
+        "Evaluations, leases, leaderboard tables and incremental counters",
+        statements=_evaluations_and_counters(),
+    ),
+    Migration(
+        3,
+        "Drop unused Translations indexes, cover recount sums on Evaluations",
+        statements=(
+            "DROP INDEX IF EXISTS idx_translations_num_evals",
+            "DROP INDEX IF EXISTS idx_translations_evals_target",
+        ),
+        rebuilds=(
+            TableRebuild(
+                "Evaluations",
+                """
+                CREATE TABLE {table} (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    targetId INTEGER NOT NULL,
+                    numRankings INTEGER NOT NULL,
+                    numRanked INTEGER NOT NULL,
+                    submittedAt TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY(targetId) REFERENCES Targets(id)
+                )
+                """,
+                indexes=(
+                    "CREATE INDEX idx_evaluations_target_ranked ON {table}(targetId, numRanked)",
+                ),
+            ),
+        ),
+    ),
+    Migration(
+        4,
+        "Track agreement per target, keep retired targets out of the selection indexes",
+        statements=(
+            # Kendall's W of the target's evaluations, see AgreementMixin
+            "ALTER TABLE Targets ADD COLUMN agreement REAL",
+            "ALTER TABLE Targets ADD COLUMN agreementEvals INTEGER NOT NULL DEFAULT 0",
+            "ALTER TABLE Targets ADD COLUMN retired BOOLEAN NOT NULL DEFAULT FALSE",
+            "ALTER TABLE Translations ADD COLUMN rankSum REAL NOT NULL DEFAULT 0",
+            "DROP INDEX IF EXISTS idx_targets_num_evals",
+            "DROP INDEX IF EXISTS idx_targets_num_ranked",
+            "CREATE INDEX idx_targets_num_evals ON Targets(numEvals, id) WHERE numTranslations > 0 AND retired = FALSE",
+            "CREATE INDEX idx_targets_num_ranked ON Targets(numRanked, numEvals, id) WHERE numTranslations > 0 AND retired = FALSE",
+            # A new translation needs evaluations: agreement restarts and the target is active again.
+            # WHEN keeps bulk loads of new targets (agreementEvals = 0) to one primary key lookup.
+            """
+            CREATE TRIGGER reset_target_agreement
+            AFTER INSERT ON Translations
+            FOR EACH ROW
+            WHEN (SELECT agreementEvals FROM Targets WHERE id = NEW.targetId) > 0
+            BEGIN
+                UPDATE Targets
+                SET agreement = NULL, agreementEvals = 0, retired = FALSE
+                WHERE id = NEW.targetId;
+                UPDATE Translations
+                SET rankSum = 0
+                WHERE targetId = NEW.targetId;
+            END
+            """,
+        ),
+        # Agreement of the evaluations submitted before the upgrade
+        backfills=("_rebuild_agreement",),
+    ),
+    Migration(
+        5,
+        "Full-text search over targets, contexts and translations",
+        rebuilds=(
+            SearchIndex("Targets", "TargetsSearch", ("target", "context1", "context2"), SEARCH_TOKENIZER),
+            SearchIndex("Translations", "TranslationsSearch", ("translation",), SEARCH_TOKENIZER),
+        ),
+    ),
+    Migration(
+        6,
+        "Record who submitted evaluations, save the targets each evaluator has seen",
+        statements=(
+            "ALTER TABLE Evaluations ADD COLUMN evaluator TEXT",
+            # Serialized TargetBitmap per evaluator, covering the evaluations up to evalId
+            """
+            CREATE TABLE SeenTargets (
+                evaluator TEXT PRIMARY KEY,
+                targets BLOB NOT NULL,
+                evalId INTEGER NOT NULL
+            )
+            """,
+        ),
+    ),
+)
+
+
+def latest_version() -> int:
+    return MIGRATIONS[-1].version
+
+
+def pending(current: int, target: Optional[int] = None) -> list[Migration]:
+    """Migrations after version `current`, up to `target` (default: all)."""
+    target = latest_version() if target is None else target
+    return [m for m in MIGRATIONS if current < m.version <= target]
@@ -0,0 +1,69 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+class PayloadCache:
+    """
+    LRU cache of target payloads, pre-encoded as JSON bytes, keyed by targetId.
+
+    Every entry carries an ETag derived from its bytes, so clients can
+    revalidate with If-None-Match. Entries are invalidated when their target
+    changes; a payload read before an invalidation of its target is not
+    stored (see token()), so a slow reader cannot put a stale entry back.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[int, tuple[str, bytes]] = OrderedDict()
+        # targetId -> epoch of its last invalidation, for the latest max_size invalidations
+        self._invalidated: OrderedDict[int, int] = OrderedDict()
+        self._epoch = 0
+        self._forgotten_epoch = 0  # newest epoch no longer in _invalidated
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def token(self) -> int:
+        """Take before reading a payload from the DB, pass to put()."""
+        return self._epoch
+
+    def get(self, target_id: int) -> Optional[tuple[str, bytes]]:
+        """(ETag, JSON bytes) of a cached target, or None."""
+        with self._lock:
+            entry = self._entries.get(target_id)
+            if entry is not None:
+                self._entries.move_to_end(target_id)
+            return entry
+
+    def put(self, target_id: int, payload: dict, token: int) -> tuple[str, bytes]:
+        """Encode a payload, cache it unless its target was invalidated since `token`."""
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+        entry = (hashlib.blake2b(body, digest_size=8).hexdigest(), body)
+        with self._lock:
+            if token < self._forgotten_epoch or self._invalidated.get(target_id, 0) > token:
+                return entry
+            self._entries[target_id] = entry
+            self._entries.move_to_end(target_id)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, target_ids: Optional[list[int]] = None) -> None:
+        """Drop the given targets, or everything."""
+        with self._lock:
+            self._epoch += 1
+            if target_ids is None:
+                self._entries.clear()
+                self._invalidated.clear()
+                self._forgotten_epoch = self._epoch
+                return
+            for target_id in target_ids:
+                self._entries.pop(target_id, None)
+                self._invalidated[target_id] = self._epoch
+                self._invalidated.move_to_end(target_id)
+                if len(self._invalidated) > self.max_size:
+                    _, self._forgotten_epoch = self._invalidated.popitem(last=False)
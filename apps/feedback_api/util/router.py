@@ -0,0 +1,280 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from contextlib import closing, contextmanager
+from typing import Generator, Iterator, Optional
+from util.config import get_config_db
+from util.manager import DBManager
+from util.manager_mixins.export import EXPORT_COLUMNS, EXPORT_QUERY, format_rankings
+from util.manager_mixins.stats import leaderboard
+from util.snapshots import SnapshotScheduler
+
+logger = logging.getLogger(__name__)
+
+# Key of the configured database (`name`), used when a request names no project
+DEFAULT_SHARD = "default"
+
+# Project or language-pair keys, also the shard file names: "en-fr", "acme_books"
+SHARD_KEY = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+
+class UnknownShardError(KeyError):
+    """A key that is not a valid shard key, or has no shard."""
+
+
+class ShardRouter:
+    """
+    Routes project (or language-pair) keys to their own SQLite database.
+
+    Every shard is a database file `<shards.folder>/<key>.db` in the data
+    folder with its own DBManager: its own connection pool, writer thread,
+    assignment index and payload cache. Writes to different projects take
+    different locks and run in parallel. The configured database is the
+    shard of DEFAULT_SHARD, so single-project setups work unchanged.
+
+    Managers are opened lazily on the first request for a shard, which
+    also applies pending migrations to it. Only create=True (e.g. the
+    importer) makes new shards, requests for unknown keys are refused.
+
+    Cross-project reads ATTACH the shards to a read-only connection, as
+    many at a time as SQLite allows (10 by default), and merge the results
+    of the groups, see attached() and attach_groups().
+    """
+
+    def __init__(self):
+        self.config = get_config_db()
+        self.folder = os.path.join(self.config["folder"], self.config["shards"]["folder"])
+        self._managers: dict[str, DBManager] = {}
+        self._writers_started = False
+        self._snapshots: Optional[SnapshotScheduler] = None
+        self._lock = threading.Lock()
+
+    @property
+    def default(self) -> DBManager:
+        return self.get(DEFAULT_SHARD)
+
+    def get(self, key: Optional[str], create: bool = False) -> DBManager:
+        """
+        The manager of a shard, opened on first use.
+
+        Raises:
+            UnknownShardError: For invalid keys, or unknown ones without `create`
+        """
+        key = key or DEFAULT_SHARD
+        manager = self._managers.get(key)
+        if manager is not None:
+            return manager
+
+        with self._lock:
+            manager = self._managers.get(key)
+            if manager is not None:
+                return manager
+            if key != DEFAULT_SHARD:
+                if not SHARD_KEY.match(key):
+                    raise UnknownShardError(f"Invalid project key: {key!r}")
+                if not create and not os.path.exists(self._path(key)):
+                    raise UnknownShardError(f"Unknown project: {key}")
+                os.makedirs(self.folder, exist_ok=True)
+
+            manager = DBManager(self.db_name(key))
+            if not manager.migrate():
+                manager.close()
+                raise RuntimeError(f"Could not migrate the database of project {key}")
+            if self._writers_started:
+                manager.start_writer()
+            self._managers[key] = manager
+            logger.info("Opened shard %s (%s)", key, manager.db_path)
+            return manager
+
+    def keys(self) -> list[str]:
+        """Every shard: the default one, then those in the shards folder."""
+        keys = [DEFAULT_SHARD]
+        if os.path.isdir(self.folder):
+            keys += sorted(
+                name[:-3]
+                for name in os.listdir(self.folder)
+                if name.endswith(".db") and SHARD_KEY.match(name[:-3])
+            )
+        return keys
+
+    def start_writers(self) -> None:
+        """Start the writer thread of every open shard, and of those opened later."""
+        with self._lock:
+            self._writers_started = True
+            managers = list(self._managers.values())
+        for manager in managers:
+            manager.start_writer()
+
+    def start_snapshots(self) -> None:
+        """
+        Snapshot every shard each `snapshots.interval` seconds in a
+        background thread, keeping the newest `snapshots.keep` of each. Off
+        with an interval of 0.
+        """
+        settings = self.config["snapshots"]
+        if self._snapshots is None and settings["interval"] > 0:
+            self._snapshots = SnapshotScheduler(
+                lambda: [self.get(key) for key in self.keys()],
+                interval=settings["interval"],
+                keep=settings["keep"],
+            )
+
+    def close(self) -> None:
+        if self._snapshots is not None:
+            self._snapshots.close()
+            self._snapshots = None
+        with self._lock:
+            managers = list(self._managers.values())
+            self._managers.clear()
+        for manager in managers:
+            manager.close()
+
+    @contextmanager
+    def attached(
+        self, keys: Optional[list[str]] = None
+    ) -> Generator[tuple[sqlite3.Cursor, dict[str, str]], None, None]:
+        """
+        A read-only connection with the shards of `keys` (default: all)
+        ATTACHed, yielded as (cursor, {key: schema name}).
+
+        Everything runs in one read transaction, so the shards are read as
+        of the same point in time, each one as of its first read.
+
+        Raises:
+            UnknownShardError: For unknown keys
+            sqlite3.OperationalError: For more shards than SQLite can attach,
+                see attach_groups()
+        """
+        keys = self.keys() if keys is None else keys
+        paths = {}
+        for key in keys:
+            if key != DEFAULT_SHARD and not SHARD_KEY.match(key):
+                raise UnknownShardError(f"Invalid project key: {key!r}")
+            paths[key] = self._path(key)
+            if not os.path.exists(paths[key]):
+                raise UnknownShardError(f"Unknown project: {key}")
+
+        conn = sqlite3.connect(":memory:", uri=True, isolation_level=None, check_same_thread=False)
+        try:
+            limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+            if len(paths) > limit:
+                raise sqlite3.OperationalError(
+                    f"Cannot attach {len(paths)} shards, SQLite allows {limit}"
+                )
+            schemas = {}
+            for i, (key, path) in enumerate(paths.items()):
+                schemas[key] = f"shard_{i}"
+                conn.execute(f"ATTACH DATABASE ? AS {schemas[key]}", (f"file:{path}?mode=ro",))
+            conn.execute("BEGIN")
+            cursor = conn.cursor()
+            try:
+                yield cursor, schemas
+            finally:
+                cursor.close()
+                conn.rollback()
+        finally:
+            conn.close()
+
+    def attach_groups(self, keys: Optional[list[str]] = None) -> list[list[str]]:
+        """`keys` (default: all) in groups small enough for attached(), in order."""
+        keys = self.keys() if keys is None else keys
+        with closing(sqlite3.connect(":memory:")) as conn:
+            limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        return [keys[i:i + limit] for i in range(0, len(keys), limit)]
+
+    def get_model_stats(self, keys: Optional[list[str]] = None) -> Optional[dict]:
+        """The leaderboard over the summary tables of several shards (default: all)."""
+        try:
+            totals: dict[str, list[int]] = {}
+            wins: Counter = Counter()
+            for group in self.attach_groups(keys):
+                with self.attached(group) as (cursor, schemas):
+                    stats = " UNION ALL ".join(
+                        f"SELECT model, numShown, numRanked, numDiscarded, rankSum FROM {schema}.ModelStats"
+                        for schema in schemas.values()
+                    )
+                    cursor.execute(
+                        f"""
+                        SELECT model, SUM(numShown), SUM(numRanked), SUM(numDiscarded), SUM(rankSum)
+                        FROM ({stats})
+                        GROUP BY model
+                        """
+                    )
+                    for model, *counts in cursor.fetchall():
+                        total = totals.setdefault(model, [0, 0, 0, 0])
+                        for i, count in enumerate(counts):
+                            total[i] += count
+
+                    group_wins = " UNION ALL ".join(
+                        f"SELECT winner, loser, wins FROM {schema}.ModelWins" for schema in schemas.values()
+                    )
+                    cursor.execute(
+                        f"SELECT winner, loser, SUM(wins) FROM ({group_wins}) GROUP BY winner, loser"
+                    )
+                    for winner, loser, count in cursor.fetchall():
+                        wins[(winner, loser)] += count
+
+            return leaderboard(
+                [(model, *total) for model, total in sorted(totals.items())],
+                [(winner, loser, count) for (winner, loser), count in sorted(wins.items())],
+            )
+
+        except Exception as e:
+            logger.error("Error getting cross-project model stats: %s", e)
+            return None
+
+    def get_export_watermarks(self, keys: Optional[list[str]] = None) -> dict[str, int]:
+        """Highest evalId per shard, the `until` of a cross-project export started now."""
+        watermarks = {}
+        for group in self.attach_groups(keys):
+            with self.attached(group) as (cursor, schemas):
+                for key, schema in schemas.items():
+                    cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {schema}.Evaluations")
+                    watermarks[key] = cursor.fetchone()[0]
+        return watermarks
+
+    def export_rankings(
+        self,
+        file_format: str = "jsonl",
+        since: Optional[dict[str, int]] = None,
+        until: Optional[dict[str, int]] = None,
+        keys: Optional[list[str]] = None,
+    ) -> Iterator[str]:
+        """
+        Stream the rankings of several shards (default: all) as one export,
+        project by project, with a leading "project" column. See
+        format_rankings() for the formats.
+
+        `since` and `until` map keys to evalId watermarks, as for a single
+        shard (see ExportMixin.iter_rankings); missing keys export from the
+        start, up to the evaluations stored when the export starts.
+        """
+        since = since or {}
+        until = until or {}
+        groups = self.attach_groups(keys)
+
+        def batches() -> Iterator[list[tuple]]:
+            for group in groups:
+                with self.attached(group) as (cursor, schemas):
+                    for key, schema in schemas.items():
+                        upper = until.get(key)
+                        if upper is None:
+                            cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {schema}.Evaluations")
+                            upper = cursor.fetchone()[0]
+                        cursor.execute(EXPORT_QUERY.format(schema=f"{schema}."), (since.get(key, 0), upper))
+                        while rows := cursor.fetchmany(1000):
+                            yield [(key, *row) for row in rows]
+
+        return format_rankings(batches(), file_format, ["project", *EXPORT_COLUMNS])
+
+    def db_name(self, key: str) -> str:
+        """File name of a shard, relative to the data folder."""
+        if key == DEFAULT_SHARD:
+            return self.config["name"]
+        return os.path.join(self.config["shards"]["folder"], f"{key}.db")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.config["folder"], self.db_name(key))
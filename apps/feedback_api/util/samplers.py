@@ -0,0 +1,265 @@
+import functools
+import heapq
+import math
+import random
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional
+from util.manager_mixins.stats import pairwise_wins
+
+
+class Sampler(ABC):
+    """
+    Order in which an AssignmentIndex hands out the targets it has queued.
+
+    The index pushes a target when it becomes available (added, evaluated,
+    lease expired) and removes it when it is leased or deleted; peek()
+    returns the next target to assign. Rankings of every evaluation are
+    passed to observe(), leased targets included, so samplers can keep
+    per-target state up to date.
+
+    Calls are serialized by the index lock.
+    """
+
+    # Whether observe() is used, i.e. the index must replay past rankings when built
+    uses_rankings = False
+
+    @abstractmethod
+    def push(self, target_id: int, count: int) -> None:
+        """Queue a target, or requeue it with a new count."""
+
+    @abstractmethod
+    def remove(self, target_id: int) -> None:
+        """Take a target out of the queue; unknown targets are ignored."""
+
+    @abstractmethod
+    def peek(self) -> Optional[int]:
+        """Next target to assign, left in the queue."""
+
+    @abstractmethod
+    def peek_many(self, n: int) -> list[int]:
+        """Up to n distinct targets, in assignment order, left in the queue."""
+
+    def set_translations(self, target_id: int, translation_ids: list[int]) -> None:
+        """Current translations of a target."""
+
+    def observe(self, target_id: int, rankings: list[tuple[int, int, bool]]) -> None:
+        """An evaluation of a target, as (translationId, rank, discarded) rows."""
+
+    def forget(self, target_id: int) -> None:
+        """Dequeue a deleted target and drop all its state."""
+        self.remove(target_id)
+
+
+class CountSampler(Sampler):
+    """
+    Least evaluated first (by the priority counter of the index), oldest
+    first among equal counts.
+
+    A bucket queue: count -> targets with that count, so pushing, removing
+    and peeking are O(1) amortized.
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        self._counts: dict[int, int] = {}
+        # Insertion ordered sets; OrderedDict, as a dict that had its first keys
+        # deleted scans past their slots to find the next one
+        self._buckets: dict[int, OrderedDict[int, None]] = {}
+        self._min_count = 0
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def push(self, target_id: int, count: int) -> None:
+        self.remove(target_id)
+        self._counts[target_id] = count
+        self._buckets.setdefault(count, OrderedDict())[target_id] = None
+        # _min_count is a lower bound, peek() moves it up to the first bucket
+        self._min_count = min(self._min_count, count)
+
+    def remove(self, target_id: int) -> None:
+        count = self._counts.pop(target_id, None)
+        if count is None:
+            return
+        bucket = self._buckets[count]
+        del bucket[target_id]
+        if not bucket:
+            del self._buckets[count]
+
+    def peek(self) -> Optional[int]:
+        if not self._buckets:
+            return None
+        while self._min_count not in self._buckets:
+            self._min_count += 1
+        return next(iter(self._buckets[self._min_count]))
+
+    def peek_many(self, n: int) -> list[int]:
+        target_ids = []
+        for count in sorted(self._buckets):
+            for target_id in self._buckets[count]:
+                if len(target_ids) == n:
+                    return target_ids
+                target_ids.append(target_id)
+        return target_ids
+
+
+class PosteriorSampler(Sampler):
+    """
+    Base of the adaptive samplers: keeps a posterior over the ordering of
+    every pair of translations of a target and serves the target with the
+    highest score() first, least evaluated first among equal scores.
+
+    The posterior of "a is ranked above b" is Beta(1 + wins of a, 1 + wins
+    of b), updated with each observed evaluation. Scores are computed when
+    a target is pushed, so they only change when the target does; the
+    queue is a heap, so every operation is O(log n) in the number of
+    queued targets and independent of the evaluation history.
+    """
+
+    uses_rankings = True
+
+    def __init__(self, seed: Optional[int] = None):
+        # targetId -> (translationId a, translationId b) with a < b -> [wins of a, wins of b]
+        self._pairs: dict[int, dict[tuple[int, int], list[int]]] = {}
+        self._heap: list[tuple[float, int, int]] = []
+        # targetId -> its valid heap entry; others are stale and skipped lazily
+        self._queued: dict[int, tuple[float, int, int]] = {}
+        self._random = random.Random(seed)
+
+    def __len__(self) -> int:
+        return len(self._queued)
+
+    @abstractmethod
+    def score(self, target_id: int) -> float:
+        """Priority of a queued target, the highest is served first."""
+
+    def push(self, target_id: int, count: int) -> None:
+        entry = (-self.score(target_id), count, target_id)
+        self._queued[target_id] = entry
+        heapq.heappush(self._heap, entry)
+        if len(self._heap) > 2 * len(self._queued) + 64:
+            # Mostly stale entries, rebuilding is O(n) every O(n) pushes
+            self._heap = list(self._queued.values())
+            heapq.heapify(self._heap)
+
+    def remove(self, target_id: int) -> None:
+        self._queued.pop(target_id, None)
+
+    def peek(self) -> Optional[int]:
+        while self._heap and self._queued.get(self._heap[0][2]) is not self._heap[0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][2] if self._heap else None
+
+    def peek_many(self, n: int) -> list[int]:
+        entries = []
+        while len(entries) < n and self.peek() is not None:
+            entries.append(heapq.heappop(self._heap))
+        for entry in entries:
+            heapq.heappush(self._heap, entry)
+        return [entry[2] for entry in entries]
+
+    def set_translations(self, target_id: int, translation_ids: list[int]) -> None:
+        pairs = self._pairs.setdefault(target_id, {})
+        ids = sorted(translation_ids)
+        for i, a in enumerate(ids):
+            for b in ids[i + 1:]:
+                pairs.setdefault((a, b), [0, 0])
+
+    def observe(self, target_id: int, rankings: list[tuple[int, int, bool]]) -> None:
+        pairs = self._pairs.setdefault(target_id, {})
+        for (winner, loser), count in pairwise_wins(rankings).items():
+            if winner < loser:
+                pairs.setdefault((winner, loser), [0, 0])[0] += count
+            else:
+                pairs.setdefault((loser, winner), [0, 0])[1] += count
+
+    def forget(self, target_id: int) -> None:
+        self._pairs.pop(target_id, None)
+        self.remove(target_id)
+
+
+class UncertaintySampler(PosteriorSampler):
+    """
+    Serves the target where one more ranking is expected to remove the most
+    uncertainty: the largest expected drop, over its pairs of translations,
+    in the posterior probability that the pair is in the wrong order.
+
+    Never compared pairs come first; pairs that stay close calls after many
+    rankings fall behind, as each further ranking tells little about them.
+    """
+
+    def score(self, target_id: int) -> float:
+        return max(
+            (expected_gain(1 + a, 1 + b) for a, b in self._pairs.get(target_id, {}).values()),
+            default=0.0,
+        )
+
+
+class ThompsonSampler(PosteriorSampler):
+    """
+    Thompson sampling: draws each pair's preference from its posterior and
+    serves the target whose draw is closest to a coin flip. Draws are taken
+    when a target is pushed, so uncertain targets are explored at random
+    instead of in a fixed order.
+    """
+
+    def score(self, target_id: int) -> float:
+        return max(
+            (
+                1.0 - abs(2.0 * self._random.betavariate(1 + a, 1 + b) - 1.0)
+                for a, b in self._pairs.get(target_id, {}).values()
+            ),
+            default=0.0,
+        )
+
+
+# Beyond this many pseudo-comparisons the normal approximation of the Beta is used
+EXACT_COMPARISONS = 200
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def preference_probability(alpha: int, beta: int) -> float:
+    """
+    P(p > 1/2) for a preference p ~ Beta(alpha, beta): exact for small
+    integer parameters (a binomial tail), normal approximation beyond.
+    """
+    total = alpha + beta
+    if total <= EXACT_COMPARISONS:
+        n = total - 1
+        return sum(math.comb(n, k) for k in range(alpha)) / 2**n
+    mean = alpha / total
+    sd = math.sqrt(alpha * beta / (total * total * (total + 1)))
+    return 0.5 * math.erfc((0.5 - mean) / sd / math.sqrt(2))
+
+
+def misorder_probability(alpha: int, beta: int) -> float:
+    """Probability that a Beta(alpha, beta) preference lies on the other side of 1/2 than its mean."""
+    p = preference_probability(alpha, beta)
+    return min(p, 1.0 - p)
+
+
+def expected_gain(alpha: int, beta: int) -> float:
+    """Expected drop of misorder_probability() after one more comparison of the pair."""
+    mean = alpha / (alpha + beta)
+    return (
+        misorder_probability(alpha, beta)
+        - mean * misorder_probability(alpha + 1, beta)
+        - (1 - mean) * misorder_probability(alpha, beta + 1)
+    )
+
+
+SAMPLERS: dict[str, type[Sampler]] = {
+    "count": CountSampler,
+    "uncertainty": UncertaintySampler,
+    "thompson": ThompsonSampler,
+}
+
+
+def make_sampler(name: str, seed: Optional[int] = None) -> Sampler:
+    """
+    Raises:
+        ValueError: For unknown sampler names
+    """
+    if name not in SAMPLERS:
+        raise ValueError(f"Unknown sampler: {name}")
+    return SAMPLERS[name](seed)
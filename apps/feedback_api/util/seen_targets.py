@@ -0,0 +1,217 @@
+import bisect
+import struct
+import sys
+import threading
+from array import array
+from typing import Iterable, Optional
+
+# Ids are grouped in chunks of 2**CHUNK_BITS by their high bits
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+# A chunk of up to ARRAY_MAX ids is a sorted array of their low bits (2 bytes per id),
+# a fuller one a bitmap of BITMAP_BYTES; the two take the same space at ARRAY_MAX
+ARRAY_MAX = 4096
+BITMAP_BYTES = (1 << CHUNK_BITS) // 8
+
+# Up to SMALL_MAX ids are kept in one sorted array of whole ids (8 bytes per id),
+# which is smaller than their chunks as long as they spread over several chunks
+SMALL_MAX = 256
+
+# Serialized chunk header: chunk key, number of ids - 1
+_HEADER = struct.Struct("<QH")
+
+
+class TargetBitmap:
+    """
+    Set of target ids in the layout of a roaring bitmap: one container per
+    chunk of 65536 ids, a sorted array of 16-bit values while the chunk is
+    sparse and a plain bitmap once it is dense. Takes at most 2 bytes per
+    id, and at most 8 KiB per chunk however many of its ids are in. The
+    first SMALL_MAX ids are kept in a single sorted array instead, most
+    evaluators never see more targets than that.
+
+    Lookups are a binary search in at most SMALL_MAX ids, or a dict lookup
+    and a binary search in at most ARRAY_MAX values or a bit test, so
+    constant time.
+    """
+
+    __slots__ = ("_small", "_chunks", "_size")
+
+    def __init__(self, target_ids: Iterable[int] = ()):
+        # Sorted ids until there are more than SMALL_MAX, then None
+        self._small: Optional[array] = array("q")
+        self._chunks: dict[int, array | bytearray] = {}
+        self._size = 0
+        for target_id in target_ids:
+            self.add(target_id)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, target_id: int) -> bool:
+        small = self._small
+        if small is not None:
+            i = bisect.bisect_left(small, target_id)
+            return i < len(small) and small[i] == target_id
+        chunk = self._chunks.get(target_id >> CHUNK_BITS)
+        if chunk is None:
+            return False
+        low = target_id & CHUNK_MASK
+        if isinstance(chunk, bytearray):
+            return bool(chunk[low >> 3] & (1 << (low & 7)))
+        i = bisect.bisect_left(chunk, low)
+        return i < len(chunk) and chunk[i] == low
+
+    def add(self, target_id: int) -> bool:
+        """Add an id, returning whether it was not in yet."""
+        small = self._small
+        if small is not None:
+            i = bisect.bisect_left(small, target_id)
+            if i < len(small) and small[i] == target_id:
+                return False
+            if len(small) < SMALL_MAX:
+                small.insert(i, target_id)
+                self._size += 1
+                return True
+            for value in small:
+                self._add_to_chunk(value)
+            self._small = None
+        if self._add_to_chunk(target_id):
+            self._size += 1
+            return True
+        return False
+
+    def _add_to_chunk(self, target_id: int) -> bool:
+        key = target_id >> CHUNK_BITS
+        low = target_id & CHUNK_MASK
+        chunk = self._chunks.get(key)
+        if chunk is None:
+            self._chunks[key] = array("H", (low,))
+        elif isinstance(chunk, bytearray):
+            if chunk[low >> 3] & (1 << (low & 7)):
+                return False
+            chunk[low >> 3] |= 1 << (low & 7)
+        else:
+            i = bisect.bisect_left(chunk, low)
+            if i < len(chunk) and chunk[i] == low:
+                return False
+            if len(chunk) < ARRAY_MAX:
+                chunk.insert(i, low)
+            else:
+                bitmap = bytearray(BITMAP_BYTES)
+                for value in (*chunk, low):
+                    bitmap[value >> 3] |= 1 << (value & 7)
+                self._chunks[key] = bitmap
+        return True
+
+    def to_bytes(self) -> bytes:
+        """Chunks in key order, each a header and its array or bitmap, little-endian."""
+        chunks = self._chunks
+        if self._small is not None:
+            chunks = {}
+            for target_id in self._small:
+                chunks.setdefault(target_id >> CHUNK_BITS, array("H")).append(target_id & CHUNK_MASK)
+        parts = []
+        for key in sorted(chunks):
+            chunk = chunks[key]
+            if isinstance(chunk, bytearray):
+                count = int.from_bytes(chunk, "little").bit_count()
+                data = bytes(chunk)
+            else:
+                count = len(chunk)
+                if sys.byteorder == "big":
+                    chunk = array("H", chunk)
+                    chunk.byteswap()
+                data = chunk.tobytes()
+            parts.append(_HEADER.pack(key, count - 1))
+            parts.append(data)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "TargetBitmap":
+        bitmap = cls()
+        offset = 0
+        while offset < len(data):
+            key, count = _HEADER.unpack_from(data, offset)
+            count += 1
+            offset += _HEADER.size
+            if count > ARRAY_MAX:
+                chunk = bytearray(data[offset:offset + BITMAP_BYTES])
+                offset += BITMAP_BYTES
+            else:
+                chunk = array("H")
+                chunk.frombytes(data[offset:offset + 2 * count])
+                if sys.byteorder == "big":
+                    chunk.byteswap()
+                offset += 2 * count
+            bitmap._chunks[key] = chunk
+            bitmap._size += count
+        if bitmap._size <= SMALL_MAX:
+            bitmap._small.extend(
+                key << CHUNK_BITS | low for key in sorted(bitmap._chunks) for low in bitmap._chunks[key]
+            )
+            bitmap._chunks = {}
+        else:
+            bitmap._small = None
+        return bitmap
+
+
+class SeenTargets:
+    """
+    Targets each evaluator has evaluated, a TargetBitmap per evaluator.
+
+    Covers every evaluation up to `eval_id`, later ones are added with
+    apply() (or add(), which leaves `eval_id` alone). Evaluators whose
+    bitmap changed since take_changed() are tracked, so only those are
+    saved again.
+
+    Writes are serialized by a lock; lookups are not, a bitmap is only
+    ever extended.
+    """
+
+    def __init__(self, eval_id: int = 0):
+        self.eval_id = eval_id
+        # Targets added since the last take_changed()
+        self.pending = 0
+        self._bitmaps: dict[str, TargetBitmap] = {}
+        self._changed: set[str] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._bitmaps)
+
+    def get(self, evaluator: str) -> Optional[TargetBitmap]:
+        return self._bitmaps.get(evaluator)
+
+    def load(self, evaluator: str, data: bytes) -> None:
+        """Set the saved bitmap of an evaluator."""
+        with self._lock:
+            self._bitmaps[evaluator] = TargetBitmap.from_bytes(data)
+
+    def add(self, evaluator: str, target_id: int) -> None:
+        with self._lock:
+            self._add(evaluator, target_id)
+
+    def apply(self, evaluations: Iterable[tuple[str, int]], eval_id: int) -> None:
+        """Add (evaluator, targetId) pairs of the evaluations up to `eval_id`."""
+        with self._lock:
+            for evaluator, target_id in evaluations:
+                self._add(evaluator, target_id)
+            self.eval_id = max(self.eval_id, eval_id)
+
+    def take_changed(self) -> list[tuple[str, bytes]]:
+        """Serialized bitmaps of the evaluators changed since the last call."""
+        with self._lock:
+            changed = [(evaluator, self._bitmaps[evaluator].to_bytes()) for evaluator in sorted(self._changed)]
+            self._changed.clear()
+            self.pending = 0
+            return changed
+
+    def _add(self, evaluator: str, target_id: int) -> None:
+        bitmap = self._bitmaps.get(evaluator)
+        if bitmap is None:
+            bitmap = self._bitmaps[evaluator] = TargetBitmap()
+        if bitmap.add(target_id):
+            self._changed.add(evaluator)
+            self.pending += 1
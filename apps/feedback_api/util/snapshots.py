@@ -0,0 +1,65 @@
+import logging
+import threading
+from typing import Callable
+from util.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_SECONDS = REGISTRY.histogram(
+    "feedback_db_snapshot_seconds",
+    "Duration of scheduled snapshots, per database",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+SNAPSHOT_FAILURES = REGISTRY.counter(
+    "feedback_db_snapshot_failures_total",
+    "Scheduled snapshots that could not be taken",
+)
+
+
+class SnapshotScheduler:
+    """
+    Background thread that snapshots databases every `interval` seconds and
+    keeps the newest `keep` snapshots of each, see SnapshotMixin.
+
+    `managers` is called at every run, so databases opened in the meantime
+    (e.g. new project shards) are included. Databases are copied one after
+    the other; a failure is logged and counted, and the next run tries again.
+
+    Usage:
+        scheduler = SnapshotScheduler(lambda: [db], interval=3600, keep=24)
+        scheduler.close()
+    """
+
+    def __init__(self, managers: Callable[[], list], interval: float, keep: int):
+        self.managers = managers
+        self.interval = interval
+        self.keep = keep
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sqlite-snapshots", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        """Stop the thread, after the snapshot in progress if any."""
+        self._stop.set()
+        self._thread.join()
+
+    def run_once(self) -> None:
+        for db in self.managers():
+            if self._stop.is_set():
+                return
+            snapshot = db.create_snapshot()
+            if snapshot is None:
+                SNAPSHOT_FAILURES.inc()
+                continue
+            SNAPSHOT_SECONDS.observe(snapshot["seconds"])
+            try:
+                db.prune_snapshots(self.keep)
+            except OSError as e:
+                logger.error("Error pruning snapshots of %s: %s", db.db_name, e)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error("Error in scheduled snapshots: %s", e)
@@ -0,0 +1,141 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional, TypeVar
+from util.metrics import REGISTRY
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = REGISTRY.histogram(
+    "feedback_db_write_batch_size",
+    "Writes group-committed per transaction",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024),
+)
+
+# Queue item that stops the writer thread
+_STOP = None
+
+
+class WriteQueue:
+    """
+    Single writer thread that group-commits write operations.
+
+    An operation is a function of a cursor. Once an operation arrives the
+    writer keeps collecting for `window` seconds or until `max_batch`
+    operations are queued, runs them back to back in one transaction, each
+    under its own savepoint, and commits once, so a burst of submissions
+    costs one fsync. A failing operation is rolled back alone. Every caller
+    blocks until its operation is committed and gets the operation's result,
+    or the exception it (or the commit) raised.
+
+    With window = 0 the writer does not wait, it takes what was queued while
+    the previous transaction ran.
+
+    Usage:
+        writer = WriteQueue(db_manager, window=0.002, max_batch=256)
+        eval_id = writer.submit(lambda cursor: insert(cursor, ranking))
+        writer.close()
+    """
+
+    def __init__(self, db, window: float = 0.0, max_batch: int = 256):
+        self.db = db
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: queue.Queue = queue.Queue()
+        # Set by close(); checked under the lock so nothing is queued after _STOP
+        self._closed = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, operation: Callable[[sqlite3.Cursor], T]) -> T:
+        """
+        Run `operation` in the writer thread and wait until it is committed.
+
+        Raises:
+            RuntimeError: Once the queue is closed
+        """
+        if threading.current_thread() is self._thread:
+            # Called from inside an operation, already in the transaction
+            raise RuntimeError("WriteQueue.submit() called from the writer thread")
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("WriteQueue is closed")
+            self._queue.put((operation, future))
+        return future.result()
+
+    def close(self) -> None:
+        """Commit what is queued and stop the writer thread; later submissions are refused."""
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        item = self._queue.get(timeout=remaining)
+                    else:
+                        item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+
+        # Nothing should follow _STOP, but a waiting caller must never be left behind
+        leftovers = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftovers.append(item)
+        for start in range(0, len(leftovers), self.max_batch):
+            self._commit(leftovers[start:start + self.max_batch])
+
+    def _commit(self, batch: list[tuple[Callable, Future]]) -> None:
+        BATCH_SIZE.observe(len(batch))
+        outcomes: list[tuple[Future, object, Optional[BaseException]]] = []
+        try:
+            with self.db.transaction() as cursor:
+                for operation, future in batch:
+                    cursor.execute("SAVEPOINT operation")
+                    try:
+                        outcomes.append((future, operation(cursor), None))
+                        cursor.execute("RELEASE operation")
+                    except Exception as e:
+                        cursor.execute("ROLLBACK TO operation")
+                        cursor.execute("RELEASE operation")
+                        outcomes.append((future, None, e))
+        except Exception as e:
+            # Commit failed, nothing of the batch was written
+            logger.error("Error committing %d queued writes: %s", len(batch), e)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)